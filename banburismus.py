@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+#finding messages in depth (enciphered with overlapping stretches of the same key), as in Banburismus
+#
+#when two messages are in depth at some offset, their ciphertexts have the same letter at an
+#aligned position about as often as plaintext does (around 1 / 15 for German); otherwise only
+#about 1 / 26 of aligned letters match
+#Banburismus counts these coincidences ("repeats") for a pair of messages at an offset, and scores
+#the alignment by its weight of evidence in decibans (10 * log10 of the likelihood ratio)
+#
+#the coincidence counts for every offset of a pair are found at once with a cross-correlation
+#instead of comparing the messages at each offset separately (which costs length^2 per pair)
+#the cross-correlation is done with integer multiplication rather than an FFT: for each letter,
+#each message is packed into an integer with a field per position (1 where the message has that
+#letter), so multiplying one message's integer by the other's reversed integer adds up the
+#coincidences of that letter at every offset in the fields of the product
+#fields are 1 byte wide if every message is shorter than 256 letters (so no count can overflow
+#into the next field) and 2 bytes otherwise; the cost of the multiplications grows with the square
+#of the field size, so long messages are much slower to compare
+#
+#offsets are the position in the first message of the second message's first letter, so they run
+#from -(len(second) - 1) to len(first) - 1
+#messages are normalized the same way as Enigma.encodeMessage
+
+import heapq
+import math
+import sys
+from array import array
+from operator import add
+
+from scrambler_table import messageToIndices
+
+#the chance that two aligned letters match in plaintext (German), and in unrelated ciphertext
+PLAIN_COINCIDENCE = 0.066
+RANDOM_COINCIDENCE = 1 / 26
+
+#messages can be at most this long, so that coincidence counts fit in 2-byte fields
+MAX_MESSAGE_LENGTH = 0xffff
+
+#array typecodes for the 1 and 2 byte field sizes
+_fieldTypecodes = {1: 'B', 2: 'H'}
+
+#_letterTables[letter] translates letter indices to 1 for that letter and 0 for the others
+_letterTables = tuple(bytes(int(index == letter) for index in range(256)) for letter in range(26))
+
+
+#returns the weight of evidence (in decibans) for a repeat and for a non-repeat
+def getDecibanWeights(plainCoincidence = PLAIN_COINCIDENCE, randomCoincidence = RANDOM_COINCIDENCE):
+    return (10 * math.log10(plainCoincidence / randomCoincidence),
+        10 * math.log10((1 - plainCoincidence) / (1 - randomCoincidence)))
+
+
+#returns the score (in decibans) of an alignment with overlap aligned letters, repeats of which match
+def getDecibans(overlap, repeats, plainCoincidence = PLAIN_COINCIDENCE, randomCoincidence = RANDOM_COINCIDENCE):
+    repeatWeight, nonRepeatWeight = getDecibanWeights(plainCoincidence, randomCoincidence)
+    return repeats * repeatWeight + (overlap - repeats) * nonRepeatWeight
+
+
+#returns the field size (in bytes) needed to compare messages up to maxLength letters long
+def _getFieldSize(maxLength):
+    return 1 if maxLength < 256 else 2
+
+
+#returns a message (letter indices) packed into one integer per letter, as described above
+#(0 for letters that are not in the message)
+#if reverse is True, the message is packed back to front
+def _packMessage(message, fieldSize, reverse = False):
+
+    if reverse:
+        message = message[::-1]
+
+    fields = bytearray(fieldSize * len(message))
+    packed = []
+    for table in _letterTables:
+        #the low byte of each little-endian field is 1 where the message has the letter
+        fields[0::fieldSize] = message.translate(table)
+        packed.append(int.from_bytes(fields, 'little'))
+    return packed
+
+
+#returns the number of coincidences at each offset of a pair of packed messages
+#(first packed forwards, second packed in reverse), as an array indexed by offset + secondLength - 1
+def _getPackedCoincidenceCounts(firstPacked, secondPacked, firstLength, secondLength, fieldSize):
+
+    product = 0
+    for firstLetter, secondLetter in zip(firstPacked, secondPacked):
+        if firstLetter and secondLetter:
+            product += firstLetter * secondLetter
+
+    counts = array(_fieldTypecodes[fieldSize])
+    counts.frombytes(product.to_bytes(fieldSize * (firstLength + secondLength - 1), 'little'))
+    if sys.byteorder != 'little':
+        counts.byteswap()
+    return counts
+
+
+#returns the number of coincidences at each offset of two messages,
+#as an array indexed by offset + len(second) - 1
+def getCoincidenceCounts(first, second):
+
+    first = messageToIndices(first)
+    second = messageToIndices(second)
+    _validateLengths((first, second))
+
+    fieldSize = _getFieldSize(max(len(first), len(second)))
+    return _getPackedCoincidenceCounts(_packMessage(first, fieldSize), _packMessage(second, fieldSize, reverse = True),
+        len(first), len(second), fieldSize)
+
+
+#raises a ValueError if any message (letter indices) is empty or too long
+def _validateLengths(messages):
+    for message in messages:
+        if not 0 < len(message) <= MAX_MESSAGE_LENGTH:
+            raise ValueError(f"Messages must be between 1 and {MAX_MESSAGE_LENGTH} letters long")
+
+
+#returns the number of aligned letters at each offset (indexed as getCoincidenceCounts)
+#the overlap rises by one per offset up to the shorter length, stays there, then falls again
+def _getOverlaps(firstLength, secondLength):
+    shorter = min(firstLength, secondLength)
+    plateau = abs(firstLength - secondLength) + 1
+    return list(range(1, shorter)) + [shorter] * plateau + list(range(shorter - 1, 0, -1))
+
+
+#returns the best alignment of a pair of packed messages (see _getPackedCoincidenceCounts)
+#as a tuple (score, offset, overlap, repeats), considering only offsets with at least minOverlap
+#aligned letters (None if there are none)
+def _getBestAlignment(firstPacked, secondPacked, firstLength, secondLength, fieldSize, minOverlap, weights):
+
+    if min(firstLength, secondLength) < minOverlap:
+        return None
+
+    counts = _getPackedCoincidenceCounts(firstPacked, secondPacked, firstLength, secondLength, fieldSize)
+    overlaps = _getOverlaps(firstLength, secondLength)
+
+    #only offsets with at least minOverlap aligned letters
+    start = minOverlap - 1
+    stop = len(counts) - start
+
+    #score = repeats * repeatWeight + (overlap - repeats) * nonRepeatWeight
+    repeatWeight, nonRepeatWeight = weights
+    scores = list(map(add,
+        map((repeatWeight - nonRepeatWeight).__mul__, counts[start:stop]),
+        map(nonRepeatWeight.__mul__, overlaps[start:stop])))
+
+    best = max(range(len(scores)), key = scores.__getitem__)
+    index = start + best
+    return (scores[best], index - (secondLength - 1), overlaps[index], counts[index])
+
+
+#the messages and settings used by each worker process in findDepths
+_workerMessages = None
+_workerPacked = None
+_workerSettings = None
+
+def _initWorker(messages, settings):
+    global _workerMessages, _workerPacked, _workerSettings
+    _workerMessages = messages
+    _workerSettings = settings
+    fieldSize = settings[0]
+    _workerPacked = [_packMessage(message, fieldSize) for message in messages]
+
+#compare one message with every later message, returning the best candidates found
+def _findDepthsInWorker(firstIndex):
+
+    fieldSize, minOverlap, minScore, candidateCount, weights = _workerSettings
+    first = _workerMessages[firstIndex]
+    firstReversed = _packMessage(first, fieldSize, reverse = True)
+
+    #compare the later messages against the first message reversed (which gives the offsets
+    #negated), so only one packing of each message has to be kept
+    candidates = []
+    for secondIndex in range(firstIndex + 1, len(_workerMessages)):
+        second = _workerMessages[secondIndex]
+        alignment = _getBestAlignment(_workerPacked[secondIndex], firstReversed, len(second), len(first),
+            fieldSize, minOverlap, weights)
+        if alignment == None:
+            continue
+
+        score, offset, overlap, repeats = alignment
+        if score >= minScore:
+            candidate = (score, firstIndex, secondIndex, -offset, overlap, repeats)
+            if len(candidates) < candidateCount:
+                heapq.heappush(candidates, candidate)
+            elif candidate > candidates[0]:
+                heapq.heapreplace(candidates, candidate)
+
+    return candidates
+
+
+#find the pairs of messages most likely to be in depth, by comparing every pair at every offset
+#returns the best candidateCount candidates (with scores of at least minScore decibans), best first,
+#as tuples (score, firstIndex, secondIndex, offset, overlap, repeats), where firstIndex < secondIndex
+#index the messages, and each candidate is the best offset of its pair
+#offsets with fewer than minOverlap aligned letters are not considered
+#pairs are compared by a pool of processes (processes defaults to the number of CPUs)
+def findDepths(messages, minOverlap = 20, minScore = 0, candidateCount = 20, processes = None,
+        plainCoincidence = PLAIN_COINCIDENCE, randomCoincidence = RANDOM_COINCIDENCE):
+
+    messages = [messageToIndices(message) for message in messages]
+    _validateLengths(messages)
+
+    settings = (_getFieldSize(max(map(len, messages), default = 0)), minOverlap, minScore, candidateCount,
+        getDecibanWeights(plainCoincidence, randomCoincidence))
+
+    if processes == 1:
+        _initWorker(messages, settings)
+        results = map(_findDepthsInWorker, range(len(messages)))
+        return heapq.nlargest(candidateCount, (candidate for result in results for candidate in result))
+
+    from multiprocessing import Pool
+    with Pool(processes, initializer = _initWorker, initargs = (messages, settings)) as pool:
+        #rows get shorter towards the end, so they are handed out one at a time
+        results = pool.imap_unordered(_findDepthsInWorker, range(len(messages)))
+        return heapq.nlargest(candidateCount, (candidate for result in results for candidate in result))
+
+
+if __name__ == '__main__':
+
+    #hide two messages in depth (the second starts 9 letters later in the same key) among others
+    #(depths only stand out reliably over a few hundred aligned letters)
+
+    import random
+    from enigma import Enigma
+    from traffic_generator import TrafficGenerator
+
+    _, traffic = TrafficGenerator(seed = 1941, messagesPerDay = 8, minLength = 800, maxLength = 1000).generateDay(0)
+    plaintexts = [plaintext for _, _, plaintext, _ in traffic]
+
+    #the left rotors are kept 3 letters apart, as long messages with nearby rotor positions
+    #often really are in depth
+    rng = random.Random(1941)
+    messages = []
+    for index, plaintext in enumerate(plaintexts):
+        enigma = Enigma.getDefaultEnigma()
+        enigma.setRotorPositions((3 * index, rng.randrange(26), rng.randrange(26)))
+        messages.append(enigma.encodeMessage(plaintext))
+
+    #message 7 uses the same key as message 3, 9 letters later
+    enigma = Enigma.getDefaultEnigma()
+    enigma.setRotorPositions(('j', 'e', 'v'))
+    messages[3] = enigma.encodeMessage(plaintexts[3])
+    enigma.setRotorPositions(('j', 'e', 'v'))
+    enigma.encodeMessage('x' * 9)
+    messages[7] = enigma.encodeMessage(plaintexts[7])
+
+    score, firstIndex, secondIndex, offset, overlap, repeats = findDepths(messages, processes = 2)[0]
+    print(firstIndex, secondIndex, offset, '(expected 3 7 9)')
+    print(f'{repeats} repeats in {overlap} letters, {score:.1f} decibans')
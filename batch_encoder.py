@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+#encoding (or decoding) many messages in one call, where every message has its own full key
+#
+#each message comes with its key as a packed state record (see packedstate and Enigma.toBytes):
+#reflector, rotor order, ring settings, plugboard and the starting rotor positions
+#no Enigma is created for any message; instead, messages are grouped by their configuration
+#(everything but the rotor positions), each distinct configuration is compiled once into a
+#MachineConfig, and every message in the group is encoded from its own MachineState
+#archives often hold many messages per daily key, so most messages share a compiled configuration
+#
+#messages are normalized the same way as Enigma.encodeMessage
+
+import packedstate
+from machine_config import MachineConfig, MachineState, encodeIndices
+from scrambler_table import messageToIndices, indicesToMessage
+
+
+#returns the part of a packed state record that identifies its configuration
+#(the record without its rotor positions)
+def _getConfigKey(record):
+    return (bytes(record[:packedstate.ROTOR_POSITIONS_OFFSET]) +
+        bytes(record[packedstate.PLUGBOARD_OFFSET:packedstate.RECORD_SIZE]))
+
+
+#encode a list of (record, message) pairs, where record is the packed key of message
+#returns a list of the encoded messages, in the same order
+#raises a ValueError if a record or message is invalid
+def encodeBatch(pairs):
+
+    pairs = list(pairs)
+    for record, _ in pairs:
+        if len(record) != packedstate.RECORD_SIZE:
+            raise ValueError(f"Packed state records must be {packedstate.RECORD_SIZE} bytes long")
+
+    configKeys = [_getConfigKey(record) for record, _ in pairs]
+    encodedMessages = [None] * len(pairs)
+
+    #visit the messages grouped by configuration, so each configuration is compiled once
+    #and only one compiled configuration is kept at a time
+    config = None
+    configKey = None
+    for index in sorted(range(len(pairs)), key = configKeys.__getitem__):
+
+        record, message = pairs[index]
+        if configKeys[index] != configKey:
+            configKey = configKeys[index]
+            config = MachineConfig.fromBytes(record)
+
+        encoded = encodeIndices(config, MachineState.fromBytes(record), messageToIndices(message))
+        encodedMessages[index] = indicesToMessage(encoded)
+
+    return encodedMessages
+
+
+#like encodeBatch, but the pairs are split between a pool of worker processes
+#(processes defaults to the number of CPUs)
+#pairs with the same configuration are kept together, so each worker compiles as few
+#configurations as possible
+def encodeBatchParallel(pairs, processes = None, chunkSize = 1024):
+
+    from multiprocessing import Pool
+
+    pairs = list(pairs)
+    order = sorted(range(len(pairs)), key = lambda index: _getConfigKey(pairs[index][0]))
+    chunks = [[pairs[index] for index in order[start:start + chunkSize]]
+        for start in range(0, len(order), chunkSize)]
+
+    with Pool(processes) as pool:
+        results = pool.map(encodeBatch, chunks)
+
+    encodedMessages = [None] * len(pairs)
+    for index, encoded in zip(order, (encoded for chunk in results for encoded in chunk)):
+        encodedMessages[index] = encoded
+    return encodedMessages
+
+
+if __name__ == '__main__':
+
+    #encode messages under several keys and check them against Enigma.encodeMessage
+
+    from enigma import Enigma
+
+    keys = []
+    for ringSettings, plug, rotorPositions in ((('a', 'a', 'a'), ('h', 'z'), ('k', 'd', 'o')),
+            (('b', 'u', 'l'), ('a', 'q'), ('w', 'z', 'a')), (('b', 'u', 'l'), ('a', 'q'), ('s', 'x', 't'))):
+        enigma = Enigma.getDefaultEnigma()
+        enigma.setRingSettings(ringSettings)
+        enigma.plugboard.addPlug(*plug)
+        enigma.setRotorPositions(rotorPositions)
+        keys.append(enigma.toBytes())
+
+    messages = ['hello world', 'attack at dawn', 'the quick brown fox']
+    pairs = [(key, message) for key in keys for message in messages]
+
+    encodedMessages = encodeBatch(pairs)
+    expected = [Enigma.fromBytes(key).encodeMessage(message) for key, message in pairs]
+    print(encodedMessages == expected, '(expected True)')
+    print(encodeBatch((key, encoded) for (key, _), encoded in zip(pairs, encodedMessages))[:3], "(expected ['helloworld', 'attackatdawn', 'thequickbrownfox'])")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+#simple benchmarks for the performance-sensitive parts of py-enigma
+#run this file directly to print the results of every benchmark
+
+import sys
+import timeit
+import subprocess
+
+
+#measure how long it takes to import a module in a fresh interpreter
+#a fresh interpreter is used so the result is not affected by modules
+#that have already been imported (or compiled) by this process
+#returns the import time in seconds (the best of several runs)
+def timeImport(moduleName = 'enigma', runs = 5):
+
+    #the timing is done inside the child process, so interpreter startup is not included
+    code = ("import time; start = time.perf_counter(); "
+        f"import {moduleName}; "
+        "print(time.perf_counter() - start)")
+
+    times = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', code],
+            capture_output = True, text = True, check = True,
+            cwd = sys.path[0] or None)
+        times.append(float(output.stdout))
+
+    return min(times)
+
+
+#measure how long it takes to create a fully configured Enigma with getDefaultEnigma
+#returns the time per machine in seconds
+def timeMachineCreation(count = 10000):
+    from enigma import Enigma
+
+    totalTime = min(timeit.repeat(Enigma.getDefaultEnigma, number = count, repeat = 3))
+    return totalTime / count
+
+
+#returns an Enigma with a non-default configuration (including plugs) to benchmark with
+def getBenchmarkEnigma():
+    from enigma import Enigma
+
+    enigma = Enigma.getDoubleStepEnigma()
+    enigma.setRingSettings(('b', 'x', 'f'))
+    for plugA, plugB in (('a', 'm'), ('f', 'i'), ('n', 'v'), ('p', 's'), ('t', 'u'), ('w', 'z')):
+        enigma.plugboard.addPlug(plugA, plugB)
+    return enigma
+
+
+#measure a snapshot and restore of a machine's state using the dictionary from getMachineState
+#returns the time per round trip in seconds
+def timeDictStateRoundTrip(count = 2000):
+
+    enigma = getBenchmarkEnigma()
+    restored = getBenchmarkEnigma()
+
+    def roundTrip():
+        state = enigma.getMachineState()
+
+        restored.setReflector(state['reflectorType'])
+        restored.setLeftRotor(state['leftRotor']['rotorType'])
+        restored.setMiddleRotor(state['middleRotor']['rotorType'])
+        restored.setRightRotor(state['rightRotor']['rotorType'])
+        rotorNames = ('leftRotor', 'middleRotor', 'rightRotor')
+        restored.setRingSettings(tuple(state[name]['ringSetting'] for name in rotorNames))
+        restored.setRotorPositions(tuple(state[name]['rotorPosition'] for name in rotorNames))
+        restored.plugboard.clearPlugs()
+        for plugA, plugB in state['plugs'].items():
+            restored.plugboard.addPlug(plugA, plugB)
+
+    totalTime = min(timeit.repeat(roundTrip, number = count, repeat = 3))
+    return totalTime / count
+
+
+#measure a snapshot and restore of a machine's state using toBytes and setPackedState
+#returns the time per round trip in seconds
+def timePackedStateRoundTrip(count = 20000):
+
+    enigma = getBenchmarkEnigma()
+    restored = getBenchmarkEnigma()
+
+    def roundTrip():
+        restored.setPackedState(enigma.toBytes(), validate = False)
+
+    totalTime = min(timeit.repeat(roundTrip, number = count, repeat = 3))
+    return totalTime / count
+
+
+#measure reading back many packed states with packedstate.iterRecordFields
+#returns the time per record in seconds
+def timePackedStateBulkRead(count = 100000):
+    import packedstate
+
+    data = packedstate.joinRecords([getBenchmarkEnigma().toBytes()] * count)
+
+    def readAll():
+        for fields in packedstate.iterRecordFields(data):
+            pass
+
+    totalTime = min(timeit.repeat(readAll, number = 1, repeat = 3))
+    return totalTime / count
+
+
+#measure copying a machine with Enigma.clone
+#returns the time per copy in seconds
+def timeClone(count = 100000):
+
+    enigma = getBenchmarkEnigma()
+    enigma.encodeLetter('a')
+
+    totalTime = min(timeit.repeat(enigma.clone, number = count, repeat = 3))
+    return totalTime / count
+
+
+#measure copying a machine with copy.deepcopy, for comparison with timeClone
+#returns the time per copy in seconds
+def timeDeepcopy(count = 2000):
+    import copy
+
+    enigma = getBenchmarkEnigma()
+    enigma.encodeLetter('a')
+
+    totalTime = min(timeit.repeat(lambda: copy.deepcopy(enigma), number = count, repeat = 3))
+    return totalTime / count
+
+
+#returns a ciphertext, a crib at its start, and candidate keys (packed state records) for every
+#rotor position of the benchmark Enigma's configuration, to benchmark crib testing with
+def getCribBenchmark():
+
+    enigma = getBenchmarkEnigma()
+    enigma.setRotorPositions(('w', 'z', 'a'))
+    ciphertext = enigma.encodeMessage('keinebesonderenvorkommnisse')
+
+    record = enigma.toBytes()
+    candidates = [record[:7] + bytes((left, middle, right)) + record[10:]
+        for left in range(26) for middle in range(26) for right in range(26)]
+    return (ciphertext, 'keinebesonderen', candidates)
+
+
+#measure testing a crib against every rotor position at once with BitslicedEngine
+#returns the time per candidate key in seconds
+def timeBitslicedCrib():
+    from bitsliced_engine import BitslicedEngine
+
+    ciphertext, crib, candidates = getCribBenchmark()
+    engine = BitslicedEngine(candidates)
+
+    totalTime = min(timeit.repeat(lambda: engine.testCrib(ciphertext, crib), number = 1, repeat = 3))
+    return totalTime / len(candidates)
+
+
+#measure testing a crib against candidate keys one at a time with Enigma.encodeMessage,
+#for comparison with timeBitslicedCrib (only the first count candidates are tested)
+#returns the time per candidate key in seconds
+def timeScalarCrib(count = 2000):
+    from enigma import Enigma
+
+    ciphertext, crib, candidates = getCribBenchmark()
+    candidates = candidates[:count]
+    enigma = Enigma.fromBytes(candidates[0])
+
+    def testAll():
+        matching = []
+        for candidate in candidates:
+            enigma.setPackedState(candidate, validate = False)
+            if enigma.encodeMessage(ciphertext[:len(crib)]) == crib:
+                matching.append(candidate)
+        return matching
+
+    totalTime = min(timeit.repeat(testAll, number = 1, repeat = 3))
+    return totalTime / len(candidates)
+
+
+#print a single benchmark result in a consistent format
+def printResult(name, seconds):
+    print(f"{name:40}{seconds * 1e6:12.2f} us")
+
+
+if __name__ == '__main__':
+
+    printResult('import enigma', timeImport('enigma'))
+    printResult('Enigma.getDefaultEnigma()', timeMachineCreation())
+    printResult('state round trip (dict)', timeDictStateRoundTrip())
+    printResult('state round trip (packed)', timePackedStateRoundTrip())
+    printResult('packed state bulk read (per record)', timePackedStateBulkRead())
+    printResult('crib test, bit-sliced (per key)', timeBitslicedCrib())
+    printResult('crib test, encodeMessage (per key)', timeScalarCrib())
+    printResult('Enigma.clone()', timeClone())
+    printResult('copy.deepcopy(enigma)', timeDeepcopy())
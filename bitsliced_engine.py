@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+#a bit-sliced Enigma for testing a crib against many candidate keys at once
+#
+#every candidate key is one bit position in a set of integers (Python integers have no fixed width,
+#so there is no limit of 64 candidates per word: bit i of every mask below belongs to candidate i)
+#
+#   letter planes   planes[letter] has a bit set for every candidate whose signal is currently at that
+#                   letter (each candidate's bit is set in exactly one plane)
+#   offset masks    offsetMasks[rotor][offset] has a bit set for every candidate whose rotor is turned
+#                   to that internal offset (window position minus ring setting, see Rotor.switchLetter)
+#   window masks    windowMasks[rotor][position] likewise, for the letter in the window (for stepping)
+#   plug masks      plugMasks[a][b] has a bit set for every candidate whose plugboard switches a to b
+#
+#a rotor is applied to every candidate by moving the bits of each plane to the plane the rotor's
+#wiring sends them to, one offset at a time (offsets no candidate uses are skipped), and the rotors of
+#every candidate are stepped by shifting the masks, using the notch masks to find which ones turn
+#the reflector is the same for every candidate, so it just reorders the planes
+#
+#all candidates must use the same reflector and rotor order; ring settings, rotor positions and
+#plugboards can all differ
+
+from permutation import Permutation
+from rotor import Rotor
+from reflector import Reflector
+from scrambler_table import messageToIndices
+import packedstate
+
+
+#returns the 26 shifted versions of a rotor wiring (one for each internal offset), as bytes
+def _getShiftedTables(wiring):
+    permutation = Permutation(wiring)
+    return tuple(permutation.rotate(offset).toBytes() for offset in range(26))
+
+
+#moves the bits in masks one place up (mod 26) for the candidates in moving
+#(used to turn rotors: masks is a list of 26 masks indexed by position or offset)
+def _stepMasks(masks, moving):
+
+    if moving == 0:
+        return masks
+
+    staying = ~moving
+    return [(masks[index] & staying) | (masks[index - 1] & moving) for index in range(26)]
+
+
+#apply a rotor (given by its shifted tables and offset masks) to letter planes
+def _applyRotor(planes, shiftedTables, offsetMasks):
+
+    switched = [0] * 26
+    for offset, offsetMask in enumerate(offsetMasks):
+        if offsetMask == 0:
+            continue
+
+        table = shiftedTables[offset]
+        for letter, plane in enumerate(planes):
+            bits = plane & offsetMask
+            if bits:
+                switched[table[letter]] |= bits
+
+    return switched
+
+
+class BitslicedEngine():
+
+    #candidates is a sequence of packed state records (see packedstate), all with the same
+    #reflector and rotor order
+    #raises a ValueError if there are no candidates or they do not share a reflector and rotor order
+    def __init__(self, candidates):
+
+        candidates = [bytes(candidate) for candidate in candidates]
+        if len(candidates) == 0:
+            raise ValueError("At least one candidate key is needed")
+
+        for candidate in candidates:
+            packedstate.validateRecord(candidate)
+
+        reflectorType, rotorTypes, _, _, _ = packedstate.unpackRecord(candidates[0])
+        typesEnd = packedstate.RING_SETTINGS_OFFSET
+        if any(candidate[:typesEnd] != candidates[0][:typesEnd] for candidate in candidates):
+            raise ValueError("Every candidate must use the same reflector and rotor order")
+
+        self.candidates = candidates
+        self.candidateCount = len(candidates)
+
+        self.notchPositions = tuple(Rotor.getRotorNotchPos(rotorType) for rotorType in rotorTypes)
+        self._reflector = Reflector.getReflectorWiring(reflectorType)
+        self._forwardTables = tuple(_getShiftedTables(Rotor.getRotorWiring(rotorType)) for rotorType in rotorTypes)
+        self._reverseTables = tuple(_getShiftedTables(Rotor.getRotorReverseWiring(rotorType)) for rotorType in rotorTypes)
+
+        #build the starting masks, one candidate at a time
+        #(rotors are indexed 0, 1, 2 for left, middle, right)
+        self._windowMasks = [[0] * 26 for _ in range(3)]
+        self._offsetMasks = [[0] * 26 for _ in range(3)]
+        self._plugMasks = [[0] * 26 for _ in range(26)]
+
+        ringStart = packedstate.RING_SETTINGS_OFFSET
+        positionStart = packedstate.ROTOR_POSITIONS_OFFSET
+        plugStart = packedstate.PLUGBOARD_OFFSET
+
+        for index, candidate in enumerate(candidates):
+            bit = 1 << index
+            for rotor in range(3):
+                ringSetting = candidate[ringStart + rotor]
+                position = candidate[positionStart + rotor]
+                self._windowMasks[rotor][position] |= bit
+                self._offsetMasks[rotor][(position - ringSetting) % 26] |= bit
+            for letter, pluggedLetter in enumerate(candidate[plugStart:]):
+                self._plugMasks[letter][pluggedLetter] |= bit
+
+    #returns the mask of candidates for which ciphertext decrypts to crib at cribOffset
+    #ciphertext and crib are letter indices (see scrambler_table.messageToIndices)
+    #stops early once no candidate is left
+    def _testCribIndices(self, ciphertext, crib, cribOffset):
+
+        _, middleNotch, rightNotch = self.notchPositions
+        reflector = self._reflector
+        plugMasks = self._plugMasks
+        leftForward, middleForward, rightForward = self._forwardTables
+        leftReverse, middleReverse, rightReverse = self._reverseTables
+
+        leftWindows, middleWindows, rightWindows = self._windowMasks
+        leftOffsets, middleOffsets, rightOffsets = self._offsetMasks
+
+        alive = (1 << self.candidateCount) - 1
+
+        for step in range(cribOffset + len(crib)):
+
+            #step the rotors of every candidate (see Enigma.incrementRotors)
+            #the right rotor always turns; the middle rotor turns if the right rotor is at its notch,
+            #or if the middle rotor is at its own notch (the double step), which also turns the left rotor
+            doubleStep = middleWindows[middleNotch]
+            middleTurns = rightWindows[rightNotch] | doubleStep
+
+            rightWindows = rightWindows[-1:] + rightWindows[:-1]
+            rightOffsets = rightOffsets[-1:] + rightOffsets[:-1]
+            middleWindows = _stepMasks(middleWindows, middleTurns)
+            middleOffsets = _stepMasks(middleOffsets, middleTurns)
+            leftWindows = _stepMasks(leftWindows, doubleStep)
+            leftOffsets = _stepMasks(leftOffsets, doubleStep)
+
+            if step < cribOffset:
+                continue
+
+            #only keep candidates that are still alive, so later steps have less to do
+            planes = [mask & alive for mask in plugMasks[ciphertext[step]]]
+
+            planes = _applyRotor(planes, rightForward, rightOffsets)
+            planes = _applyRotor(planes, middleForward, middleOffsets)
+            planes = _applyRotor(planes, leftForward, leftOffsets)
+
+            reflected = [0] * 26
+            for letter, plane in enumerate(planes):
+                reflected[reflector[letter]] = plane
+            planes = reflected
+
+            planes = _applyRotor(planes, leftReverse, leftOffsets)
+            planes = _applyRotor(planes, middleReverse, middleOffsets)
+            planes = _applyRotor(planes, rightReverse, rightOffsets)
+
+            #a candidate matches if its plugboard switches the signal to the crib letter
+            cribPlugs = plugMasks[crib[step - cribOffset]]
+            matches = 0
+            for letter, plane in enumerate(planes):
+                matches |= plane & cribPlugs[letter]
+
+            alive &= matches
+            if alive == 0:
+                break
+
+        return alive
+
+    #returns the candidates (as packed state records) for which ciphertext decrypts to crib,
+    #starting at cribOffset letters into the message
+    #ciphertext and crib are normalized the same way as Enigma.encodeMessage
+    def testCrib(self, ciphertext, crib, cribOffset = 0):
+
+        ciphertext = messageToIndices(ciphertext)
+        crib = messageToIndices(crib)
+        if len(ciphertext) < cribOffset + len(crib):
+            raise ValueError("The crib must fit within the ciphertext")
+
+        alive = self._testCribIndices(ciphertext, crib, cribOffset)
+
+        matching = []
+        while alive:
+            lowestBit = alive & -alive
+            matching.append(self.candidates[lowestBit.bit_length() - 1])
+            alive ^= lowestBit
+        return matching
+
+
+if __name__ == '__main__':
+
+    #test every rotor position of a key at once
+
+    from enigma import Enigma
+
+    key = Enigma.getDefaultEnigma()
+    key.setRingSettings(('b', 'u', 'l'))
+    key.plugboard.addPlug('a', 'q')
+    key.setRotorPositions(('w', 'z', 'a'))
+    ciphertext = key.encodeMessage('keinebesonderenvorkommnisse')
+
+    key.setRotorPositions(('a', 'a', 'a'))
+    candidates = [key.toBytes()[:7] + positions + key.toBytes()[10:]
+        for positions in (bytes((left, middle, right)) for left in range(26) for middle in range(26) for right in range(26))]
+
+    engine = BitslicedEngine(candidates)
+    print([Enigma.fromBytes(record).getRotorPositions() for record in engine.testCrib(ciphertext, 'keinebesonderen')])
+    #expected output: [('w', 'z', 'a')]
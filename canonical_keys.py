@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+#canonical forms of keys, so exhaustive searches can skip keys that are equivalent to others
+#
+#the wiring a rotor applies only depends on its offset (window position minus ring setting, see
+#Rotor.switchLetter); the window position only matters for stepping, through the notches
+#so over a message of messageLength letters, two keys with the same reflector, rotor order,
+#plugboard and rotor offsets encrypt every letter the same way if they step the same way:
+#   left rotor      nothing turns on its notch, so only its offset matters: every one of the
+#                   26 ring settings (with the window moved to match) is equivalent
+#   right rotor     its window only sets the step at which the middle rotor first turns over
+#                   (then every 26 steps after); every window that turns it over after the end
+#                   of the message is equivalent
+#   middle rotor    its window only sets when it reaches its own notch (the double step, which
+#                   also turns the left rotor); every window that gets there after the end of
+#                   the message is equivalent
+#
+#the canonical form of a key keeps its offsets and the steps at which the rotors turn during the
+#message, with the left ring setting at A-01, and the right and middle windows as far as possible
+#from their notches when they do not turn anything during the message
+#(keys with different canonical forms can still encrypt the same way by coincidence, but this is
+#rare and not worth looking for)
+#
+#keys are represented as packed state records (see packedstate)
+
+from rotor import Rotor
+import packedstate
+
+
+#returns the canonical form of a key (a packed state record) for a message of messageLength letters
+def canonicalizeKey(record, messageLength):
+
+    if messageLength < 1:
+        raise ValueError("messageLength must be at least 1")
+
+    (reflectorType, rotorTypes, ringSettings,
+        rotorPositions, plugboardWiring) = packedstate.unpackRecord(record)
+
+    offsets = tuple((position - ringSetting) % 26 for position, ringSetting in zip(rotorPositions, ringSettings))
+    _, middleNotch, rightNotch = (Rotor.getRotorNotchPos(rotorType) for rotorType in rotorTypes)
+
+    middleWindow, rightWindow = _canonicalizeWindows(rotorPositions[1], rotorPositions[2],
+        middleNotch, rightNotch, messageLength)
+
+    return _packCanonicalKey(reflectorType, rotorTypes, offsets, middleWindow, rightWindow, plugboardWiring)
+
+
+#returns the canonical (middle, right) windows for a key's middle and right windows
+#(the left window always follows from the left offset, see _packCanonicalKey)
+def _canonicalizeWindows(middleWindow, rightWindow, middleNotch, rightNotch, messageLength):
+
+    #the step at which the middle rotor first turns over (Enigma.incrementRotors steps it when the
+    #right rotor is at its notch before stepping)
+    rightTurnover = (rightNotch - rightWindow) % 26 + 1
+    middleTurns = (middleNotch - middleWindow) % 26
+
+    #if the middle rotor starts at its notch, it double steps on the first step anyway, so a
+    #turnover on the first step changes nothing (the middle rotor only turns once per step)
+    firstTurnover = rightTurnover
+    if middleTurns == 0 and rightTurnover == 1:
+        firstTurnover += 26
+
+    #the replacement window turns the middle rotor over at step 26, so it is only used for
+    #messages shorter than that; for longer messages, only the window whose turnover on the first
+    #step is absorbed gets here, and no other window turns over first at step 27, so it is kept
+    if firstTurnover > messageLength:
+        if messageLength < 26:
+            rightWindow = (rightNotch + 1) % 26
+        rightTurnover = None
+
+    #the step of the first double step: the step after the middle rotor reaches its notch
+    if middleTurns == 0:
+        doubleStep = 1
+    elif rightTurnover == None:
+        doubleStep = None
+    else:
+        doubleStep = rightTurnover + 26 * (middleTurns - 1) + 1
+
+    if doubleStep == None or doubleStep > messageLength:
+        middleWindow = (middleNotch + 1) % 26
+
+    return (middleWindow, rightWindow)
+
+
+#returns the packed state record of a canonical key, given its offsets and windows
+#(the left ring setting is A-01, and the other ring settings follow from the offsets)
+def _packCanonicalKey(reflectorType, rotorTypes, offsets, middleWindow, rightWindow, plugboardWiring):
+
+    leftOffset, middleOffset, rightOffset = offsets
+    return packedstate.packRecord(reflectorType, rotorTypes,
+        (0, (middleWindow - middleOffset) % 26, (rightWindow - rightOffset) % 26),
+        (leftOffset, middleWindow, rightWindow),
+        plugboardWiring)
+
+
+#returns every canonical (middle window, right window) pair for a rotor order and message length
+#(the pairs do not depend on the offsets)
+def getCanonicalWindows(rotorOrder, messageLength):
+
+    _, middleNotch, rightNotch = (Rotor.getRotorNotchPos(rotorType) for rotorType in rotorOrder)
+    return sorted(set(_canonicalizeWindows(middleWindow, rightWindow, middleNotch, rightNotch, messageLength)
+        for middleWindow in range(26) for rightWindow in range(26)))
+
+
+#iterate over the canonical keys (as packed state records) for a reflector, rotor order and plugboard
+#wiring, so every key is equivalent to exactly one of them over a message of messageLength letters
+#(in order of left, middle and right offset, then middle and right window)
+def iterCanonicalKeys(reflectorType, rotorOrder, messageLength, plugboardWiring = packedstate.NO_PLUGS):
+
+    if messageLength < 1:
+        raise ValueError("messageLength must be at least 1")
+
+    reflectorType = int(reflectorType)
+    rotorOrder = tuple(Rotor.validateRotorType(rotorType) for rotorType in rotorOrder)
+    windows = getCanonicalWindows(rotorOrder, messageLength)
+
+    for leftOffset in range(26):
+        for middleOffset in range(26):
+            for rightOffset in range(26):
+                offsets = (leftOffset, middleOffset, rightOffset)
+                for middleWindow, rightWindow in windows:
+                    yield _packCanonicalKey(reflectorType, rotorOrder, offsets, middleWindow, rightWindow, plugboardWiring)
+
+
+#returns the number of canonical keys for each choice of reflector and plugboard wiring
+#(out of 26^6 ring settings and rotor positions)
+def countCanonicalKeys(rotorOrder, messageLength):
+    return 26 ** 3 * len(getCanonicalWindows(rotorOrder, messageLength))
+
+
+#returns the factor by which searching only canonical keys shrinks a search over every
+#ring setting and rotor position
+def getReductionFactor(rotorOrder, messageLength):
+    return 26 ** 6 / countCanonicalKeys(rotorOrder, messageLength)
+
+
+#returns a report of the reduction factor for every rotor order of rotorTypes
+#(defaults to every supported rotor), one line per rotor order
+def getReductionReport(messageLength, rotorTypes = None):
+
+    from itertools import permutations
+
+    if rotorTypes == None:
+        rotorTypes = range(len(Rotor._rotorWirings))
+
+    lines = []
+    for rotorOrder in permutations(rotorTypes, 3):
+        lines.append(f"{rotorOrder}: {countCanonicalKeys(rotorOrder, messageLength)} canonical keys, "
+            f"reduction factor {getReductionFactor(rotorOrder, messageLength):.1f}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+
+    #check that a key and its canonical form encrypt a message the same way, and report the reductions
+
+    from enigma import Enigma
+
+    key = Enigma.getDefaultEnigma()
+    key.setRingSettings(('q', 'k', 'c'))
+    key.plugboard.addPlug('a', 'q')
+    key.setRotorPositions(('m', 'a', 'x'))
+
+    message = 'keinebesonderenvorkommnisse' * 4
+    canonicalKey = Enigma.fromBytes(canonicalizeKey(key.toBytes(), len(message)))
+    print(canonicalKey.getRotorPositions(), canonicalKey.getMachineState()['leftRotor']['ringSetting'],
+        "(expected ('w', 'a', 'x') a)")
+    print(canonicalKey.encodeMessage(message) == key.encodeMessage(message), '(expected True)')
+
+    #check every middle and right window of the key at the lengths where turnovers start or stop
+    #falling inside the message (including the double step on the first letter at length 26)
+    mismatches = 0
+    for length in (1, 25, 26, 27, 51, 52, 53):
+        for middleWindow in range(26):
+            for rightWindow in range(26):
+                key.setRotorPositions(('m', middleWindow, rightWindow))
+                record = key.toBytes()
+                canonicalKey = Enigma.fromBytes(canonicalizeKey(record, length))
+                if canonicalKey.encodeMessage(message[:length]) != Enigma.fromBytes(record).encodeMessage(message[:length]):
+                    mismatches += 1
+    print(mismatches, 'mismatches (expected 0)')
+
+    print(getReductionReport(len(message), rotorTypes = (0, 1, 2)))
+    #expected output: the same reduction factor for every rotor order
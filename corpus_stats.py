@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+#streaming statistics for large corpora of messages (e.g. intercepted ciphertext)
+#
+#collects letter (unigram) and bigram counts and the index of coincidence (IC) of the corpus
+#as a whole, of each message and of each period (the IC of every period-th letter of each message,
+#which stands out at the period of a periodic cipher)
+#the IC is the chance that two letters picked at random are the same: about 0.066 for German
+#or English plaintext and 1 / 26 = 0.0385 for random letters (and good Enigma ciphertext)
+#
+#messages (str or bytes) are normalized with scrambler_table.messageToIndices, the same way as
+#Enigma.encodeMessage (spaces are removed and letters are converted to lowercase; anything else
+#raises a ValueError), except in files, where everything other than letters (punctuation, digits,
+#non-ascii bytes) is removed from each line, so a corpus of real text can be read without
+#cleaning it first
+#files are read in large chunks with one message per line, and counting is done with C-level
+#bulk operations (bytes.count, collections.Counter) rather than letter by letter
+#the letter and bigram counts are done over whole chunks, but the per-message and periodic ICs
+#need a pass over each message for each period, so they cost roughly one extra pass over the
+#data per period (a smaller maxPeriod makes collecting the statistics faster)
+#
+#statistics collected separately (e.g. from different files in different processes) can be merged
+
+import sys
+from array import array
+from collections import Counter
+from operator import mul
+
+from scrambler_table import messageToIndices
+
+_letterBytes = b'abcdefghijklmnopqrstuvwxyz'
+
+#placed between messages when they are counted together, so no bigram crosses two messages
+_separator = 26
+
+#_columnTables[column] maps each letter index to column * 26 + letter, so the letters of up to
+#_columnBatchSize columns can be counted together (as distinct bytes) in one pass
+_columnBatchSize = 256 // 26
+_columnTables = tuple(bytes(column * 26 + letter for letter in range(26)) + bytes(230)
+    for column in range(_columnBatchSize))
+
+
+#returns the number of ordered pairs of equal letters (the numerator of the IC)
+#given the count of each letter
+#(the sum of count * (count - 1), worked out as the sum of the squares minus the sum)
+def _getCoincidences(counts):
+    counts = list(counts)
+    return sum(map(mul, counts, counts)) - sum(counts)
+
+
+class CorpusStatistics():
+
+    #maxPeriod is the longest period for which the periodic IC is collected
+    def __init__(self, maxPeriod = 12):
+
+        self.maxPeriod = maxPeriod
+
+        self.messageCount = 0
+        self.letterCounts = array('Q', bytes(8 * 26))
+
+        #bigramCounts[first * 26 + second] is the number of times second follows first in a message
+        self.bigramCounts = array('Q', bytes(8 * 676))
+
+        #the length and coincidences of each message, for the per-message IC
+        self.messageLengths = array('Q')
+        self.messageCoincidences = array('Q')
+
+        #periodCoincidences[period - 1] and periodPairs[period - 1] are the numerator and denominator
+        #of the periodic IC: coincidences within each column of each message, and the possible pairs
+        self.periodCoincidences = array('Q', bytes(8 * maxPeriod))
+        self.periodPairs = array('Q', bytes(8 * maxPeriod))
+
+    #add a single message (see the top of this file)
+    def addMessage(self, message):
+        self.addMessages((message,))
+
+    #add every message in an iterable of messages
+    #empty messages (after normalization) are skipped
+    def addMessages(self, messages):
+        self._addIndices(map(messageToIndices, messages))
+
+    #add every message in an iterable of messages already normalized to letter indices
+    #empty messages are skipped
+    def _addIndices(self, messages):
+
+        messages = [message for message in messages if len(message)]
+        if len(messages) == 0:
+            return
+
+        self.messageCount += len(messages)
+
+        joined = bytes((_separator,)).join(messages)
+        self._countLetters(joined)
+        self._countBigrams(joined)
+
+        periodCoincidences = self.periodCoincidences
+        periodPairs = self.periodPairs
+        for message in messages:
+
+            coincidences = _getCoincidences(Counter(message).values())
+            self.messageLengths.append(len(message))
+            self.messageCoincidences.append(coincidences)
+
+            periodCoincidences[0] += coincidences
+            periodPairs[0] += len(message) * (len(message) - 1)
+            for period in range(2, min(self.maxPeriod, len(message)) + 1):
+
+                #count the letters of several columns at once, with each letter tagged by its column
+                for firstColumn in range(0, period, _columnBatchSize):
+                    columns = [message[column::period] for column in range(firstColumn, min(firstColumn + _columnBatchSize, period))]
+                    tagged = b''.join(letters.translate(table) for letters, table in zip(columns, _columnTables))
+                    periodCoincidences[period - 1] += _getCoincidences(Counter(tagged).values())
+                    periodPairs[period - 1] += sum(len(letters) * (len(letters) - 1) for letters in columns)
+
+    #add the letter counts of joined messages
+    def _countLetters(self, joined):
+
+        letterCounts = self.letterCounts
+        for letter in range(26):
+            letterCounts[letter] += joined.count(letter)
+
+    #add the bigram counts of joined messages
+    #every 2 bytes are read as a single 16-bit integer, so Counter counts the bigrams at even offsets
+    #in one pass over the data, then the bigrams at odd offsets in another
+    def _countBigrams(self, joined):
+
+        bigrams = Counter()
+        for start in (0, 1):
+            data = joined[start:]
+            if len(data) % 2:
+                data += bytes((_separator,))
+            bigrams.update(memoryview(data).cast('H'))
+
+        bigramCounts = self.bigramCounts
+        for value, count in bigrams.items():
+            if sys.byteorder == 'little':
+                first, second = value & 0xff, value >> 8
+            else:
+                first, second = value >> 8, value & 0xff
+            if first != _separator and second != _separator:
+                bigramCounts[first * 26 + second] += count
+
+    #add every message in a binary file object, one message per line
+    #anything other than letters is removed from each line (see the top of this file)
+    #the file is read chunkSize bytes (roughly) at a time
+    def addFile(self, file, chunkSize = 1 << 20):
+
+        while True:
+            lines = file.readlines(chunkSize)
+            if len(lines) == 0:
+                break
+            self._addIndices(messageToIndices(line, dropNonLetters = True) for line in lines)
+
+    #add the statistics collected by another CorpusStatistics to this one
+    #both must have the same maxPeriod
+    #returns self, so results can be merged with functools.reduce
+    def merge(self, other):
+
+        if other.maxPeriod != self.maxPeriod:
+            raise ValueError("Cannot merge statistics collected with different maximum periods")
+
+        self.messageCount += other.messageCount
+        for index, count in enumerate(other.letterCounts):
+            self.letterCounts[index] += count
+        for index, count in enumerate(other.bigramCounts):
+            self.bigramCounts[index] += count
+        self.messageLengths.extend(other.messageLengths)
+        self.messageCoincidences.extend(other.messageCoincidences)
+        for index in range(self.maxPeriod):
+            self.periodCoincidences[index] += other.periodCoincidences[index]
+            self.periodPairs[index] += other.periodPairs[index]
+
+        return self
+
+    #returns the total number of letters
+    def getLetterTotal(self):
+        return sum(self.letterCounts)
+
+    #returns the number of times a letter appears
+    def getLetterCount(self, letter):
+        return self.letterCounts[_letterBytes.index(letter.encode('ascii'))]
+
+    #returns the number of times the bigram (first, second) appears
+    def getBigramCount(self, first, second):
+        return self.bigramCounts[_letterBytes.index(first.encode('ascii')) * 26 + _letterBytes.index(second.encode('ascii'))]
+
+    #returns the IC of the corpus as a whole (None if there are fewer than 2 letters)
+    def getIndexOfCoincidence(self):
+
+        total = self.getLetterTotal()
+        if total < 2:
+            return None
+        return _getCoincidences(self.letterCounts) / (total * (total - 1))
+
+    #returns the IC of each message, in the order they were added
+    #(None for messages with fewer than 2 letters)
+    def getMessageIndicesOfCoincidence(self):
+        return [coincidences / (length * (length - 1)) if length > 1 else None
+            for length, coincidences in zip(self.messageLengths, self.messageCoincidences)]
+
+    #returns a dictionary of the IC for each period from 1 to maxPeriod
+    #(None for periods where no column has 2 or more letters)
+    def getPeriodicIndicesOfCoincidence(self):
+        return {period: self.periodCoincidences[period - 1] / self.periodPairs[period - 1]
+            if self.periodPairs[period - 1] else None
+            for period in range(1, self.maxPeriod + 1)}
+
+
+#collect the statistics for a single file (see CorpusStatistics.addFile)
+def getFileStatistics(path, maxPeriod = 12):
+
+    statistics = CorpusStatistics(maxPeriod)
+    with open(path, 'rb') as file:
+        statistics.addFile(file)
+    return statistics
+
+
+#collect the statistics for several files in parallel, one file per task,
+#and merge the results (processes defaults to the number of CPUs)
+def getCorpusStatistics(paths, maxPeriod = 12, processes = None):
+
+    from functools import partial, reduce
+
+    if processes == 1:
+        results = [getFileStatistics(path, maxPeriod) for path in paths]
+    else:
+        from multiprocessing import Pool
+        with Pool(processes) as pool:
+            results = pool.map(partial(getFileStatistics, maxPeriod = maxPeriod), paths)
+
+    return reduce(CorpusStatistics.merge, results, CorpusStatistics(maxPeriod))
+
+
+if __name__ == '__main__':
+
+    #compare the statistics of some plaintext with its encryption
+
+    from enigma import Enigma
+
+    plaintext = ('the quick brown fox jumps over the lazy dog and then the dog chases the fox '
+        'back over the hill to where the quick brown fox started') * 20
+
+    plainStatistics = CorpusStatistics()
+    plainStatistics.addMessage(plaintext)
+
+    cipherStatistics = CorpusStatistics()
+    cipherStatistics.addMessage(Enigma.getDefaultEnigma().encodeMessage(plaintext))
+
+    print(round(plainStatistics.getIndexOfCoincidence(), 3), '(expected around 0.07)')
+    print(round(cipherStatistics.getIndexOfCoincidence(), 3), '(expected around 0.038)')
+    print(plainStatistics.getBigramCount('t', 'h'), '(expected 140)')
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+#an index from (plaintext letter, ciphertext letter) pairs to the rotor positions that produce them,
+#for crib matching without simulating every start position
+#
+#for a fixed configuration (reflector, rotor order and ring settings; the plugboard is ignored),
+#the scrambler at each of the 17,576 rotor positions switches 13 pairs of letters
+#the index lists, for each pair of letters, the positions at which the scrambler switches them
+#(as a sorted array of position indices, see scrambler_table.py); as the scrambler is its own
+#inverse, (a, b) and (b, a) share the same positions, so each pair is only stored once
+#
+#a crib is matched by taking the positions of its first letter pair and following each of them
+#through the stepping to the positions of the later letters, keeping those that are in the later
+#letters' position sets; the start positions are then found by stepping the survivors back
+#this gives exact results when no crib letter (or the ciphertext letter under it) is plugged
+#
+#the index is stored on disk in the following format (all integers unsigned, native order):
+#   8 bytes     MAGIC
+#   4 bytes     byte order check (BYTE_ORDER_CHECK)
+#   36 bytes    the packed state record of the configuration (rotor positions AAA, no plugs)
+#   offsets     PAIR_COUNT + 1 integers (4 bytes); the positions of pair p are
+#               entries[offsets[p]:offsets[p + 1]], where p = smaller letter * 26 + larger letter
+#   entries     position indices (2 bytes), sorted within each pair
+
+from array import array
+
+from enigma import Enigma
+from rotor import Rotor
+import packedstate
+from scrambler_table import ScramblerTable, POSITION_COUNT, getNextPositions, getRotorPositions, messageToIndices
+
+MAGIC = b'ENIGCRB1'
+BYTE_ORDER_CHECK = 0x01020304
+
+#number of pair slots in the offsets table (pairs with the same letter twice, or with the larger
+#letter first, are never used)
+PAIR_COUNT = 26 * 26
+
+
+#returns the slot of a letter pair (letter indices) in the offsets table
+def _getPairIndex(first, second):
+    if first > second:
+        first, second = second, first
+    return first * 26 + second
+
+
+#build the index for the configuration of an Enigma and write it to the file at path
+#(the reflector, rotors and ring settings are used; the rotor positions and plugboard are not)
+def buildCribIndex(enigma, path):
+
+    #build the scrambler table without the plugboard
+    enigma.validateEnigmaSetup()
+    record = bytearray(enigma.toBytes())
+    record[packedstate.ROTOR_POSITIONS_OFFSET:packedstate.PLUGBOARD_OFFSET] = bytes(3)
+    record[packedstate.PLUGBOARD_OFFSET:] = packedstate.NO_PLUGS
+    record = bytes(record)
+
+    permutations = ScramblerTable(Enigma.fromBytes(record)).permutations
+
+    #group the positions by pair with a counting sort
+    #(every position switches 13 pairs, and positions are visited in order, so each pair's
+    #positions end up sorted)
+    counts = array('I', bytes(4 * (PAIR_COUNT + 1)))
+    pairs = array('H')
+    for position in range(POSITION_COUNT):
+        permutation = permutations[position * 26:position * 26 + 26]
+        for letter, switched in enumerate(permutation):
+            if letter < switched:
+                pairIndex = letter * 26 + switched
+                pairs.append(pairIndex)
+                counts[pairIndex + 1] += 1
+
+    offsets = counts
+    for index in range(1, PAIR_COUNT + 1):
+        offsets[index] += offsets[index - 1]
+
+    nextSlot = array('I', offsets)
+    entries = array('H', bytes(2 * offsets[-1]))
+    for index, pairIndex in enumerate(pairs):
+        entries[nextSlot[pairIndex]] = index // 13
+        nextSlot[pairIndex] += 1
+
+    with open(path, 'wb') as indexFile:
+        indexFile.write(MAGIC)
+        indexFile.write(array('I', (BYTE_ORDER_CHECK,)).tobytes())
+        indexFile.write(record)
+        indexFile.write(offsets.tobytes())
+        indexFile.write(entries.tobytes())
+
+
+#an index written by buildCribIndex
+#the file is memory-mapped, so only the pairs that are looked up are ever read from disk
+class CribIndex():
+
+    def __init__(self, path):
+        import mmap
+
+        with open(path, 'rb') as indexFile:
+            self._map = mmap.mmap(indexFile.fileno(), 0, access = mmap.ACCESS_READ)
+
+        view = memoryview(self._map)
+        if bytes(view[0:8]) != MAGIC:
+            raise ValueError(f"{path} is not a crib index")
+
+        byteOrderCheck, = view[8:12].cast('I')
+        if byteOrderCheck != BYTE_ORDER_CHECK:
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+
+        offset = 12
+        self.configRecord = bytes(view[offset:offset + packedstate.RECORD_SIZE])
+        offset += packedstate.RECORD_SIZE
+
+        offsetsSize = 4 * (PAIR_COUNT + 1)
+        self._offsets = view[offset:offset + offsetsSize].cast('I')
+        self._entries = view[offset + offsetsSize:].cast('H')
+
+        #the window letter at which each rotor turns the next one, for stepping
+        rotorTypes = self.configRecord[packedstate.ROTOR_TYPES_OFFSET:packedstate.RING_SETTINGS_OFFSET]
+        self.notchPositions = tuple(Rotor.getRotorNotchPos(rotorType) for rotorType in rotorTypes)
+
+        #built when first needed
+        self._nextPositions = None
+        self._previousPositions = None
+        self._positionMasks = {}
+
+    #returns the position indices at which plain is switched with cipher (letter indices),
+    #as a sorted sequence of integers (empty if the letters are the same)
+    def lookup(self, plain, cipher):
+
+        if plain == cipher:
+            return ()
+
+        pairIndex = _getPairIndex(plain, cipher)
+        return self._entries[self._offsets[pairIndex]:self._offsets[pairIndex + 1]]
+
+    #returns a bytearray with a 1 for each position index in a pair's positions
+    #these are kept, as the same pairs come up again and again in cribs
+    def _getPositionMask(self, plain, cipher):
+
+        pairIndex = _getPairIndex(plain, cipher)
+        mask = self._positionMasks.get(pairIndex)
+        if mask == None:
+            mask = bytearray(POSITION_COUNT)
+            for position in self.lookup(plain, cipher):
+                mask[position] = 1
+            self._positionMasks[pairIndex] = mask
+        return mask
+
+    #returns the position indices that step to each position index (none, one or, because of
+    #the double step, two), as a list of tuples
+    def _getPreviousPositions(self):
+
+        if self._previousPositions == None:
+            self._nextPositions = getNextPositions(self.notchPositions)
+            previousPositions = [() for _ in range(POSITION_COUNT)]
+            for position, nextPosition in enumerate(self._nextPositions):
+                previousPositions[nextPosition] += (position,)
+            self._previousPositions = previousPositions
+
+        return self._previousPositions
+
+    #returns the start positions (rotor positions before the first letter, as with
+    #Enigma.setRotorPositions) at which ciphertext decrypts to crib at cribOffset letters in,
+    #as a sorted list of 3-tuples of letters (as returned by Enigma.getRotorPositions)
+    #ciphertext and crib are normalized the same way as Enigma.encodeMessage
+    #the plugboard is ignored (see the top of this file)
+    def matchCrib(self, ciphertext, crib, cribOffset = 0):
+
+        ciphertext = messageToIndices(ciphertext)
+        crib = messageToIndices(crib)
+        if len(crib) == 0 or len(ciphertext) < cribOffset + len(crib):
+            raise ValueError("The crib must fit within the ciphertext")
+
+        previousPositions = self._getPreviousPositions()
+        nextPositions = self._nextPositions
+
+        pairs = list(zip(crib, ciphertext[cribOffset:]))
+        masks = [self._getPositionMask(plain, cipher) for plain, cipher in pairs[1:]]
+
+        #follow every position of the first crib letter through the rest of the crib
+        matches = []
+        for firstPosition in self.lookup(*pairs[0]):
+            position = firstPosition
+            for mask in masks:
+                position = nextPositions[position]
+                if not mask[position]:
+                    break
+            else:
+                matches.append(firstPosition)
+
+        #step the matching positions back to before the first letter of the message
+        startPositions = set()
+        for position in matches:
+            positions = (position,)
+            for _ in range(cribOffset + 1):
+                positions = tuple(previous for position in positions for previous in previousPositions[position])
+            startPositions.update(positions)
+
+        return [getRotorPositions(position) for position in sorted(startPositions)]
+
+    #release the memory map
+    def close(self):
+        self._offsets.release()
+        self._entries.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+
+if __name__ == '__main__':
+
+    #find the start position of a message from a crib
+
+    import os
+    import tempfile
+
+    key = Enigma.getDefaultEnigma()
+    key.setRingSettings(('b', 'u', 'l'))
+
+    path = os.path.join(tempfile.mkdtemp(), 'cribs.bin')
+    buildCribIndex(key, path)
+
+    key.setRotorPositions(('q', 'd', 'v'))
+    ciphertext = key.encodeMessage('anxoberkommandoderwehrmacht')
+
+    with CribIndex(path) as index:
+        print(index.matchCrib(ciphertext, 'oberkommando', cribOffset = 3), "(expected [('q', 'd', 'v')])")
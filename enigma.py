@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
 
-from typing import Type
 from rotor import Rotor, RotorType
 from reflector import Reflector, ReflectorType
 from plugboard import Plugboard
+import packedstate
 
 
 
@@ -38,6 +38,11 @@ class Enigma():
         #(i.e. Plugboard supports changing its lettermap after it is initially set)
         self.plugboard = Plugboard()
 
+        #caches used by encodeLetter (see _getMiddleLayer)
+        #each is a tuple (key, table), where key identifies the rotors and positions the table was built for
+        self._innerLayerCache = None
+        self._middleLayerCache = None
+
     #define methods for setting up each configurable piece of the machine
     def setRightRotor(self, rotorType):
         self.rightRotor = Rotor(rotorType)
@@ -180,13 +185,19 @@ class Enigma():
 
     #decrements the rotors
     #uses the same rules as incrementRotors, but in reverse
-    def decrementRotors(self):
+    #stepping is not always reversible from the rotor positions alone (because of the double step,
+    #some positions can be reached in two ways), so if it is known which rotors moved on
+    #the matching incrementRotors call, this can be passed in with middleRotated and leftRotated
+    #to undo exactly that step; otherwise it is inferred from the notch positions
+    def decrementRotors(self, middleRotated = None, leftRotated = None):
 
-        middleRotated = self.rightRotor.notchInReversePosition()
+        if middleRotated == None:
+            middleRotated = self.rightRotor.notchInReversePosition()
 
         self.rightRotor.decementRotor()
 
-        leftRotated = self.middleRotor.notchInReversePosition()
+        if leftRotated == None:
+            leftRotated = self.middleRotor.notchInReversePosition()
 
         if leftRotated:
             self.leftRotor.decementRotor()
@@ -194,8 +205,47 @@ class Enigma():
         elif middleRotated:
             self.middleRotor.decementRotor()   
     
+    #returns the switching of the left rotor, the reflector and the left rotor in reverse
+    #at the current rotor position, as a Permutation
+    #this only changes when the left rotor moves, so it is cached until it does
+    def _getInnerLayer(self):
+
+        leftRotor = self.leftRotor
+        key = (leftRotor, leftRotor.rotorPosition, self.reflector)
+
+        cache = self._innerLayerCache
+        if cache == None or cache[0] != key:
+            innerLayer = (leftRotor.getPermutation()
+                .compose(self.reflector.getPermutation())
+                .compose(leftRotor.getReversePermutation()))
+            cache = self._innerLayerCache = (key, innerLayer)
+
+        return cache[1]
+
+    #returns the switching of everything between the right rotor and the reflector and back
+    #(the middle rotor, the inner layer from _getInnerLayer and the middle rotor in reverse),
+    #as 26 bytes of letter indices
+    #this only changes when the middle or left rotor moves, so it is cached until it does
+    def _getMiddleLayer(self):
+
+        innerLayer = self._getInnerLayer()
+        middleRotor = self.middleRotor
+        key = (middleRotor, middleRotor.rotorPosition, innerLayer)
+
+        cache = self._middleLayerCache
+        if cache == None or cache[0] != key:
+            middleLayer = (middleRotor.getPermutation()
+                .compose(innerLayer)
+                .compose(middleRotor.getReversePermutation()))
+            cache = self._middleLayerCache = (key, middleLayer.toBytes())
+
+        return cache[1]
+
     #takes a letter as input, runs it through the Enigma process, and returns the result
     #increments rotors as needed
+    #the middle rotor, left rotor and reflector are applied as one cached layer (see _getMiddleLayer),
+    #which is only rebuilt when stepping moves the middle or left rotor, so most letters only
+    #pass through the plugboard, the right rotor (both ways) and a single lookup
     def encodeLetter(self, letter):
 
         #validate the letter before doing anything else
@@ -204,30 +254,23 @@ class Enigma():
         #increment the rotors
         self.incrementRotors()
 
-        #run the letter through the plugboard
-        letter = self.plugboard.switchLetter(letter)
+        rightRotor = self.rightRotor
+        rightPosition = rightRotor.rotorPosition
+        plugboardWiring = self.plugboard._wiring
 
-        #run the letter through each rotor from right to left
-        letter = self.rightRotor.switchLetter(letter)
-        letter = self.middleRotor.switchLetter(letter)
-        letter = self.leftRotor.switchLetter(letter)
-        
-        #run the letter through the reflector
-        letter = self.reflector.switchLetter(letter)
-        
-        #run the letter back through the rotors,
-        #this time from left to right
-        letter = self.leftRotor.switchLetterReverse(letter)
-        letter = self.middleRotor.switchLetterReverse(letter)
-        letter = self.rightRotor.switchLetterReverse(letter)
-        
-        #run the letter back through the plugboard
-        letter = self.plugboard.switchLetter(letter)
-        
-        
+        #run the letter through the plugboard and the right rotor
+        index = plugboardWiring[Rotor._letterIndices[letter]]
+        index = (rightRotor._wiring[(index + rightPosition) % 26] - rightPosition) % 26
+
+        #run the letter through the middle rotor, left rotor and reflector and back
+        index = self._getMiddleLayer()[index]
+
+        #run the letter back through the right rotor and the plugboard
+        index = (rightRotor._reverseWiring[(index + rightPosition) % 26] - rightPosition) % 26
+        index = plugboardWiring[index]
 
         #return the letter
-        return letter
+        return Rotor.alphabet[index]
 
     #reset rotors to AAA position
     def resetRotors(self):
@@ -242,19 +285,41 @@ class Enigma():
     #the configurations of the encoder and decoder machines are identical
     def encodeMessage(self, message):
         
-        encodedMessage = ""
+        #collect encoded letters in a list and join them once at the end,
+        #rather than growing a string one letter at a time
+        encodedLetters = []
         
         for letter in message:
             #skip spaces
             if letter == ' ':
                 continue
             
-            encodedLetter = self.encodeLetter(letter.lower())
-            encodedMessage += encodedLetter
+            encodedLetters.append(self.encodeLetter(letter.lower()))
+
+        return ''.join(encodedLetters)
+
+    #returns the permutation the whole machine applies at the current rotor positions
+    #as a Permutation (see permutation.py), without stepping the rotors
+    #note that encodeLetter steps the rotors first, so the next letter typed
+    #uses the permutation at the positions after incrementRotors
+    def getPermutation(self):
+
+        self.validateEnigmaSetup()
+
+        plugboard = self.plugboard.getPermutation()
+
+        #the path through the plugboard, the rotors from right to left and the reflector...
+        permutation = plugboard
+        for rotor in (self.rightRotor, self.middleRotor, self.leftRotor):
+            permutation = permutation.compose(rotor.getPermutation())
+        permutation = permutation.compose(self.reflector.getPermutation())
+
+        #...then back through the rotors from left to right and the plugboard
+        for rotor in (self.leftRotor, self.middleRotor, self.rightRotor):
+            permutation = permutation.compose(rotor.getReversePermutation())
+        return permutation.compose(plugboard)
 
-        return encodedMessage
 
-    
     #define a method that will return the machine's state as a dictionary
     #this includes the reflector type, rotor types, 
     #rotor positions, ring settings, and plugboard settings
@@ -291,6 +356,112 @@ class Enigma():
             }
         return outputDict
 
+    #returns the machine's complete state as a compact, fixed-size bytes record
+    #(see packedstate for the format)
+    #this is much faster than getMachineState, and is meant for storing large numbers of states
+    def toBytes(self):
+
+        self.validateEnigmaSetup()
+
+        leftRotor = self.leftRotor
+        middleRotor = self.middleRotor
+        rightRotor = self.rightRotor
+
+        return bytes((
+            self.reflector.reflectorType,
+            leftRotor.rotorTypeIndex,
+            middleRotor.rotorTypeIndex,
+            rightRotor.rotorTypeIndex,
+            leftRotor.ringSetting,
+            middleRotor.ringSetting,
+            rightRotor.ringSetting,
+            (leftRotor.rotorPosition + leftRotor.ringSetting) % 26,
+            (middleRotor.rotorPosition + middleRotor.ringSetting) % 26,
+            (rightRotor.rotorPosition + rightRotor.ringSetting) % 26
+            )) + self.plugboard._wiring
+
+    #restores the machine to a state returned by toBytes
+    #rotors and the reflector are only replaced if their type changed
+    #raises a ValueError if the record is invalid
+    #(validate can be set to False to skip this check for records that are known to be valid)
+    def setPackedState(self, record, validate = True):
+
+        if validate:
+            packedstate.validateRecord(record)
+
+        (reflectorType,
+            leftType, middleType, rightType,
+            leftRing, middleRing, rightRing,
+            leftPos, middlePos, rightPos,
+            plugboardWiring) = packedstate.RECORD_STRUCT.unpack(record)
+
+        if self.reflector == None or self.reflector.reflectorType != reflectorType:
+            self.setReflector(reflectorType)
+
+        if self.leftRotor == None or self.leftRotor.rotorTypeIndex != leftType:
+            self.setLeftRotor(leftType)
+        if self.middleRotor == None or self.middleRotor.rotorTypeIndex != middleType:
+            self.setMiddleRotor(middleType)
+        if self.rightRotor == None or self.rightRotor.rotorTypeIndex != rightType:
+            self.setRightRotor(rightType)
+
+        #set ring settings and positions directly, as they have already been validated
+        #the position stored in the record is the window letter, which includes the ring setting
+        for rotor, ringSetting, rotorPosition in (
+                (self.leftRotor, leftRing, leftPos),
+                (self.middleRotor, middleRing, middlePos),
+                (self.rightRotor, rightRing, rightPos)):
+            rotor.ringSetting = ringSetting
+            rotor.rotorPosition = (rotorPosition - ringSetting) % 26
+
+        if plugboardWiring != self.plugboard._wiring:
+            self.plugboard._setTrustedWiring(plugboardWiring)
+
+    #creates an Enigma from a record returned by toBytes
+    #supports modifying a pre-existing Enigma instance as well as creating a new instance
+    @staticmethod
+    def fromBytes(record, preexistingEnigma = None):
+        if preexistingEnigma == None:
+            enigma = Enigma()
+        elif isinstance(preexistingEnigma, Enigma):
+            enigma = preexistingEnigma
+        else:
+            raise TypeError("preexistingEnigma must be an Enigma instance")
+        enigma.setPackedState(record)
+        return enigma
+
+    #returns a copy of this machine (always a plain Enigma, even for subclasses), for searches
+    #that try many small changes to the same machine
+    #only the mutable state is copied: each rotor's type, ring setting and position, and the
+    #plugboard (which is copy-on-write, see Plugboard.clone); the reflector, wiring tables and
+    #the layers cached by encodeLetter are shared, as they are never modified
+    def clone(self):
+
+        self.validateEnigmaSetup()
+
+        enigma = Enigma.__new__(Enigma)
+        enigma.reflector = reflector = self.reflector
+        enigma.leftRotor = leftRotor = self.leftRotor.clone()
+        enigma.middleRotor = middleRotor = self.middleRotor.clone()
+        enigma.rightRotor = self.rightRotor.clone()
+        enigma.plugboard = self.plugboard.clone()
+
+        #the cache keys name the rotors, so they are rewritten for the clone's rotors
+        #(only if they are up to date, otherwise the clone builds its own)
+        enigma._innerLayerCache = None
+        enigma._middleLayerCache = None
+
+        innerCache = self._innerLayerCache
+        if innerCache != None and innerCache[0] == (self.leftRotor, leftRotor.rotorPosition, reflector):
+            innerLayer = innerCache[1]
+            enigma._innerLayerCache = ((leftRotor, leftRotor.rotorPosition, reflector), innerLayer)
+
+            middleCache = self._middleLayerCache
+            if middleCache != None and middleCache[0] == (self.middleRotor, middleRotor.rotorPosition, innerLayer):
+                enigma._middleLayerCache = ((middleRotor, middleRotor.rotorPosition, innerLayer), middleCache[1])
+
+        return enigma
+
     #given a ring setting as a letter or integer,
     #return the (what I assume to be) official name of that setting
     @staticmethod
@@ -389,3 +560,18 @@ if __name__ == "__main__":
     decMsg = enigma.encodeMessage(encMsg)
     print(decMsg)
     #expected output: helloworld
+
+    #try a change on a clone; the original machine is not affected
+    enigma.setRotorPositions(rotorPos)
+    branch = enigma.clone()
+    branch.plugboard.removePlug('h')
+    print(branch.encodeMessage(msg) != encMsg, enigma.encodeMessage(msg) == encMsg)
+    #expected output: True True
+
+    #machines can be pickled and deep-copied
+    import copy
+    import pickle
+    enigma.setRotorPositions(rotorPos)
+    for copied in (copy.deepcopy(enigma), pickle.loads(pickle.dumps(enigma))):
+        print(copied.toBytes() == enigma.toBytes(), copied.encodeMessage(msg) == encMsg)
+    #expected output: True True (twice)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+#a raw binary file object that transparently encrypts (and decrypts) an underlying file with an Enigma
+#
+#every byte of the file takes up one step of the rotors, starting from the key the EnigmaFile was
+#created with; the rotor positions for any offset are known without stepping through the file
+#(see RotorTrace), so the file can be read, written and seeked freely
+#letters (a - z and A - Z, keeping their case) are encrypted with the machine's permutation at that
+#step; every other byte is stored as it is
+#note that this means the rotors also step for spaces and other non-letters, unlike Enigma.encodeMessage
+#
+#as encryption and decryption are the same operation, reading an encrypted file gives the plaintext
+#and writing plaintext stores it encrypted
+#
+#EnigmaFile is a RawIOBase, so it can be wrapped in io.BufferedReader / io.BufferedWriter /
+#io.TextIOWrapper and passed to anything that reads file objects (gzip, csv, tarfile, ...)
+
+import io
+
+from scrambler_table import ScramblerTable
+from rotor_trace import RotorTrace
+
+
+class EnigmaFile(io.RawIOBase):
+
+    #file is a binary file object (opened in a mode that supports the operations that will be used)
+    #offset 0 of the file is the first step after the starting key
+    #enigma is an Enigma set up with the key, with its rotors at the starting positions
+    #the Enigma is not referenced after this, so changing it does not affect the file
+    #the underlying file is not closed when the EnigmaFile is closed (as with gzip.GzipFile)
+    #scramblerTable may be a ScramblerTable already built for the Enigma's configuration, to share
+    #it between EnigmaFiles with the same key (building one takes much longer than the rest)
+    #raises a ValueError if it was built for a different configuration
+    def __init__(self, file, enigma, scramblerTable = None):
+
+        super().__init__()
+
+        if scramblerTable == None:
+            scramblerTable = ScramblerTable(enigma)
+        else:
+            record = bytearray(enigma.toBytes())
+            record[7:10] = bytes(3)
+            if bytes(record) != scramblerTable.configRecord:
+                raise ValueError("The scrambler table was built for a different configuration")
+
+        self.file = file
+        self._scramblerTable = scramblerTable
+        self._trace = RotorTrace.fromEnigma(enigma)
+
+        #the current offset, kept so the rotor positions are known without asking the file
+        self._offset = file.tell() if file.seekable() else 0
+
+    #apply the Enigma to data (a writable bytes-like object) in place,
+    #where data[0] is at file offset offset
+    def _transform(self, data, offset):
+
+        permutations = self._scramblerTable.permutations
+        positionIndices = self._trace.getPositionIndexRange(offset, offset + len(data))
+
+        for index, byte in enumerate(data):
+            if 97 <= byte <= 122:
+                data[index] = 97 + permutations[positionIndices[index] * 26 + byte - 97]
+            elif 65 <= byte <= 90:
+                data[index] = 65 + permutations[positionIndices[index] * 26 + byte - 65]
+
+    def readable(self):
+        return self.file.readable()
+
+    def writable(self):
+        return self.file.writable()
+
+    def seekable(self):
+        return self.file.seekable()
+
+    #read into buffer, decrypting in place (the data is not copied)
+    #returns the number of bytes read, or None if the underlying file is non-blocking and has no data
+    def readinto(self, buffer):
+
+        self._checkClosed()
+
+        with memoryview(buffer) as view, view.cast('B') as bytesView:
+            count = self.file.readinto(bytesView)
+            if count:
+                self._transform(bytesView[:count], self._offset)
+                self._offset += count
+
+        return count
+
+    #encrypt data and write it
+    #returns the number of bytes written, which may be fewer than len(data) (see io.RawIOBase.write)
+    def write(self, data):
+
+        self._checkClosed()
+
+        encrypted = bytearray(data)
+        self._transform(encrypted, self._offset)
+        count = self.file.write(encrypted)
+
+        #some file objects return None when everything was written
+        if count == None:
+            count = len(encrypted)
+        self._offset += count
+        return count
+
+    #move to a new offset; the rotor positions follow automatically
+    def seek(self, offset, whence = io.SEEK_SET):
+
+        self._checkClosed()
+
+        self._offset = self.file.seek(offset, whence)
+        return self._offset
+
+    def tell(self):
+
+        self._checkClosed()
+
+        return self._offset
+
+    def truncate(self, size = None):
+
+        self._checkClosed()
+
+        return self.file.truncate(self._offset if size == None else size)
+
+    def flush(self):
+
+        if not self.closed:
+            self.file.flush()
+
+
+if __name__ == '__main__':
+
+    #test EnigmaFile with an in-memory file
+
+    from enigma import Enigma
+
+    key = Enigma.getDoubleStepEnigma()
+    key.plugboard.addPlug('h', 'z')
+
+    storage = io.BytesIO()
+    with EnigmaFile(storage, key) as encryptedFile:
+        encryptedFile.write(b'Hello, World!\n' * 3)
+
+    print(storage.getvalue())
+
+    #read the second line back through a text wrapper, after seeking to it
+    with EnigmaFile(storage, key) as encryptedFile:
+        encryptedFile.seek(14)
+        print(repr(io.TextIOWrapper(io.BufferedReader(encryptedFile), encoding = 'ascii').readline()),
+            "(expected 'Hello, World!\\n')")
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import re
 from enigma import Enigma
 from reflector import ReflectorType
 from rotor import Rotor, RotorType
@@ -12,33 +13,120 @@ class InteractiveEnigma(Enigma):
     #InteractiveEnigma
     def __init__(self):
 
-        #message is what the user has typed in so far
-        self.message = ""
+        #the message is stored as lists of single letters rather than strings,
+        #so adding or removing a letter is O(1) no matter how long the session gets
 
-        #encodedMessage is what the Enigma has output so far
-        self.encodedMessage = ""
+        #_messageLetters is what the user has typed in so far
+        self._messageLetters = []
+
+        #_encodedLetters is what the Enigma has output so far
+        self._encodedLetters = []
+
+        #the undo history; for every letter in the message, this records which rotors
+        #(besides the right rotor) moved when it was typed, as a bitmask of
+        #_middleRotatedFlag and _leftRotatedFlag
+        #this is used to undo the exact step with decrementRotors
+        self._stepHistory = bytearray()
 
         #run the standard Enigma constructor
         super().__init__()
 
+    #bit flags for _stepHistory entries
+    _middleRotatedFlag = 1
+    _leftRotatedFlag = 2
+
+    #message is what the user has typed in so far
+    #note that this builds a new string on every access
+    #use getMessageLength and getMessageWindow when only part of the message is needed
+    @property
+    def message(self):
+        return ''.join(self._messageLetters)
+
+    #encodedMessage is what the Enigma has output so far
+    @property
+    def encodedMessage(self):
+        return ''.join(self._encodedLetters)
+
+    #returns the number of letters typed in so far
+    def getMessageLength(self):
+        return len(self._messageLetters)
+
+    #returns the slice [start:end] of both the message and the encoded message
+    #as a tuple of strings (message, encodedMessage)
+    def getMessageWindow(self, start, end):
+        return (
+            ''.join(self._messageLetters[start:end]),
+            ''.join(self._encodedLetters[start:end])
+        )
+
+    #returns the most recently encoded letter, or None if nothing has been typed
+    def getLastEncodedLetter(self):
+        if len(self._encodedLetters):
+            return self._encodedLetters[-1]
+        return None
+
     #override encodeLetter to add letter to both message and plugboard
     def encodeLetter(self, letter):
         
         #validate letter
         Rotor.validateLetter(letter)
 
-        #if letter is valid, add it to the message
-        self.message += letter
-        
+        #note the positions of the middle and left rotors, so we can tell if they moved
+        middlePosition = self.middleRotor.rotorPosition
+        leftPosition = self.leftRotor.rotorPosition
+
         #encode the letter
         encodedLetter = super().encodeLetter(letter)
+
+        #record which rotors moved in the undo history
+        steps = 0
+        if self.middleRotor.rotorPosition != middlePosition:
+            steps |= self._middleRotatedFlag
+        if self.leftRotor.rotorPosition != leftPosition:
+            steps |= self._leftRotatedFlag
+        self._stepHistory.append(steps)
         
-        #add the encoded letter to the encodedMessage
-        self.encodedMessage += encodedLetter
+        #add the letter to the message and the encoded letter to the encodedMessage
+        self._messageLetters.append(letter)
+        self._encodedLetters.append(encodedLetter)
 
         #return the letter
         return encodedLetter
 
+    #remove the last letter from the message (and encrypted counterpart)
+    #and move the rotors back to where they were before it was typed
+    #each undo is paired with the decrementRotors call that reverses its exact step
+    #returns the removed letter, or None if the message is empty
+    def undoLetter(self):
+
+        if len(self._messageLetters) == 0:
+            return None
+
+        steps = self._stepHistory.pop()
+        self._encodedLetters.pop()
+        self.decrementRotors(
+            middleRotated = bool(steps & self._middleRotatedFlag),
+            leftRotated = bool(steps & self._leftRotatedFlag))
+
+        return self._messageLetters.pop()
+
+    #undo the specified number of letters (see undoLetter)
+    #stops early if the message becomes empty
+    #returns the number of letters that were undone
+    def undo(self, levels = 1):
+
+        undone = 0
+        while undone < levels and self.undoLetter() != None:
+            undone += 1
+        return undone
+
+    #clear the message and undo history
+    #rotors are left in their current positions
+    def clearMessage(self):
+        self._messageLetters.clear()
+        self._encodedLetters.clear()
+        self._stepHistory.clear()
+
 
     #override getDefaultEnigma to use an InteractiveEnigma instance
     #rather than a standard Enigma instance
@@ -236,33 +324,84 @@ class InteractiveEnigma(Enigma):
             return None
         
 
-    def inputLoop(self):
-        
-        #initialize offendingValue 
+    #handles a single typed character
+    #encodes the character if it is a letter, or removes the last letter on backspace
+    #returns None if successful and the offending input if it was invalid
+    def handleKey(self, newLetter):
+
+        #if a backspace was typed, remove the last char from the message (and encrypted counterpart)
+        #then decrement the rotors
+        #\b is used on windows, \x7f is used on unix-like systems
+        if newLetter == '\b' or newLetter == '\x7f':
+            self.undoLetter()
+            return None
+
+        try:
+            self.encodeLetter(newLetter)
+        except ValueError:
+            return newLetter
+        else:
+            return None
+
+    #handles a burst of typed (or pasted) characters, such as one returned by RawTerminal.readBurst
+    #runs of letters are passed to encodeMessage in one call, backspaces undo letters
+    #and anything else (including escape sequences from arrow keys etc.) is rejected
+    #returns None if every character was valid, otherwise the last offending input
+    def handleKeys(self, burst):
+
         offendingValue = None
 
-        #accept input forever (until keyboard interrupt)
-        while True:
-            
-            self.clearScreen()
-            #if a backspace was typed, remove the last char from the message (and encrypted counterpart)
-            #then decrement the rotors
-            #\b is used on windows, \x7f is used on unix-like systems
-            if (offendingValue == '\b' or offendingValue == '\x7f') and len(self.message) > 0:
-                self.message = self.message[:-1]
-                self.encodedMessage = self.encodedMessage[:-1]
-                self.decrementRotors()
-            #show error message if input was invalid
-            elif offendingValue != None:
-                print(f"Invalid Input: {repr(offendingValue)}")
-
-            #handle KeyboardInterrupt exceptions
-            try:
-                offendingValue = self.acceptInput()
-            except KeyboardInterrupt:
-                self.clearScreen()
-                print(self.getBoxStr())
-                break
+        for token in self._burstTokenPattern.findall(burst.lower()):
+            if token[0] in LetterSwitcher.alphabet:
+                self.encodeMessage(token)
+            else:
+                result = self.handleKey(token)
+                if result != None:
+                    offendingValue = result
+
+        return offendingValue
+
+    #splits a burst of input into runs of letters, escape sequences and single characters
+    _burstTokenPattern = re.compile(r'[a-z]+|\x1b(?:\[[0-9;?]*[a-z~]|o.)?|.', re.DOTALL)
+
+    #accept input forever (until keyboard interrupt)
+    #the terminal stays in raw mode for the whole session (see RawTerminal), and input is
+    #handled in bursts: everything typed or pasted since the last read is encoded in one go
+    #the screen is drawn once with ANSI escape sequences, after which only the
+    #parts that change are redrawn once per burst (see TerminalRenderer)
+    #the keypress-to-render latency is printed when the loop exits
+    def inputLoop(self):
+        from time import perf_counter
+        from terminal_renderer import TerminalRenderer
+        from raw_terminal import RawTerminal
+
+        renderer = TerminalRenderer(self)
+        renderer.drawFull()
+
+        try:
+            with RawTerminal() as terminal:
+                while True:
+                    burst = terminal.readBurst()
+                    keypressTime = perf_counter()
+
+                    offendingValue = self.handleKeys(burst)
+
+                    #show error message if input was invalid
+                    if offendingValue != None:
+                        status = f"Invalid Input: {repr(offendingValue)}"
+                    else:
+                        status = ""
+
+                    renderer.update(status, keypressTime)
+
+        #handle KeyboardInterrupt exceptions
+        #the terminal has already been restored by RawTerminal at this point
+        except KeyboardInterrupt:
+            pass
+        finally:
+            renderer.close()
+
+        print(renderer.getLatencyReport())
 
     #print the valid rotor types
     @staticmethod
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+#a key search split between worker processes (on one or more hosts) by a coordinator over TCP
+#
+#the search tries every key in a key space (see keyspace.py) on the start of a ciphertext and scores
+#each key by how many letters of a crib (known plaintext) it produces; the best keys are kept
+#
+#the coordinator splits the key space into ranges of ranks and hands them out to workers
+#workers report their progress after every batch of keys, along with their best candidates
+#when there are no unassigned ranges left, an idle worker steals the second half of whichever
+#range has the most keys left; the worker that owned it is told its new end of range in the reply
+#to its next progress report (workers wait for that reply before starting another batch, and
+#the batch they are busy with is never stolen, so a range is never searched twice)
+#when there is nothing left to hand out or steal but some keys have not been reported yet, idle
+#workers are told to wait and ask again, as a worker that disconnects puts the rest of its range
+#back; they are only told the search is done once every key has been reported (or run has returned)
+#a connection that sends anything other than hello first, or anything the coordinator does not
+#expect, is closed
+#
+#messages are JSON objects, one per line:
+#   worker -> coordinator   {"type": "hello", "worker": name, "batchSize": count}
+#                           {"type": "request"}
+#                           {"type": "progress", "position": rank, "keys": count, "candidates": [[score, rank], ...]}
+#   coordinator -> worker   {"type": "job", ...} (the search parameters, in reply to hello)
+#                           {"type": "work", "start": rank, "stop": rank}
+#                           {"type": "continue", "stop": rank} (in reply to progress)
+#                           {"type": "wait", "seconds": seconds} (ask again after that long)
+#                           {"type": "done"}
+
+import heapq
+import json
+import socket
+import socketserver
+import threading
+import time
+
+from keyspace import Keyspace
+from machine_config import MachineConfig, MachineState, encodeIndices
+from scrambler_table import messageToIndices
+import packedstate
+
+#how long idle workers wait before asking for work again, in seconds
+WAIT_SECONDS = 0.1
+
+#returns the best candidates (as [score, rank] lists, best first) among the keys with ranks
+#from start up to stop, keeping at most candidateCount of them
+#each key decrypts ciphertext (letter indices); its score is the number of letters at
+#cribOffset onwards that match crib (letter indices)
+#keys are visited in rank order, where only the rotor positions change between most keys,
+#so each configuration is compiled once (see MachineConfig)
+def searchRange(keyspace, start, stop, ciphertext, crib, cribOffset = 0, candidateCount = 10):
+
+    ciphertext = ciphertext[:cribOffset + len(crib)]
+    configStart = packedstate.ROTOR_POSITIONS_OFFSET
+    configEnd = packedstate.PLUGBOARD_OFFSET
+
+    candidates = []
+    config = None
+    configKey = None
+    rank = start
+
+    for record in keyspace.iterRange(start, stop):
+
+        key = record[:configStart] + record[configEnd:]
+        if key != configKey:
+            configKey = key
+            config = MachineConfig.fromBytes(record)
+
+        #the keyspace only makes valid records, so the state is built from the rotor positions
+        #directly rather than validating each record again with MachineState.fromBytes
+        decrypted = encodeIndices(config, MachineState(*record[configStart:configEnd]), ciphertext)
+        score = sum(map(int.__eq__, decrypted[cribOffset:], crib))
+
+        #keep the best candidates in a min-heap (lower ranks win ties)
+        candidate = (score, -rank)
+        if len(candidates) < candidateCount:
+            heapq.heappush(candidates, candidate)
+        elif candidate > candidates[0]:
+            heapq.heapreplace(candidates, candidate)
+
+        rank += 1
+
+    return [[score, -negativeRank] for score, negativeRank in sorted(candidates, reverse = True)]
+
+
+#sends and receives messages over a socket
+class _Connection():
+
+    def __init__(self, sock):
+        self.file = sock.makefile('rwb')
+
+    def send(self, message):
+        self.file.write(json.dumps(message).encode('utf-8') + b'\n')
+        self.file.flush()
+
+    #returns None if the connection was closed
+    def receive(self):
+        line = self.file.readline()
+        if len(line) == 0:
+            return None
+        return json.loads(line)
+
+
+#the TCP server used by SearchCoordinator; each worker connection is handled in its own thread
+class _CoordinatorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.coordinator._handleConnection(self.connection)
+
+
+class SearchCoordinator():
+
+    #the key space is described by the Keyspace arguments (reflectorTypes, rotorTypes, plugCount, includeRings)
+    #ciphertext and crib are strings (normalized as in Enigma.encodeMessage); the crib is the plaintext
+    #expected at cribOffset
+    #the key space is first split into rangeCount ranges, handed out in order
+    #a range is only stolen from if it has at least minStealSize keys left
+    #the coordinator listens on host and port (port 0 picks a free port, see getAddress)
+    def __init__(self, ciphertext, crib, cribOffset = 0, reflectorTypes = None, rotorTypes = None,
+            plugCount = 0, includeRings = True, rangeCount = 64, candidateCount = 10,
+            minStealSize = 1024, host = 'localhost', port = 0):
+
+        self.keyspace = Keyspace(reflectorTypes, rotorTypes, plugCount, includeRings)
+        self.job = {
+            'type': 'job',
+            'ciphertext': ciphertext,
+            'crib': crib,
+            'cribOffset': cribOffset,
+            'reflectorTypes': list(self.keyspace.reflectorTypes),
+            'rotorTypes': sorted(set(rotorType for rotorOrder in self.keyspace.rotorOrders for rotorType in rotorOrder)),
+            'plugCount': plugCount,
+            'includeRings': includeRings,
+            'candidateCount': candidateCount
+        }
+
+        #validates the ciphertext and crib
+        if len(messageToIndices(ciphertext)) < cribOffset + len(messageToIndices(crib)):
+            raise ValueError("The crib must fit within the ciphertext")
+
+        self.candidateCount = candidateCount
+        self.minStealSize = minStealSize
+
+        #everything below is shared between connection threads, and guarded by _lock
+        self._lock = threading.Lock()
+        self._pendingRanges = [list(self.keyspace.getShard(index, rangeCount)) for index in range(rangeCount)]
+        #the range each worker is searching, as [position, stop]
+        self._activeRanges = {}
+        #per-worker statistics: batch size, keys searched, time of the first and latest report, ranges stolen
+        self._workerStats = {}
+        self._remainingKeys = self.keyspace.getSize()
+        self._candidates = []
+        self._finished = threading.Event()
+
+        self._server = _CoordinatorServer((host, port), _CoordinatorHandler)
+        self._server.coordinator = self
+
+    #returns the (host, port) the coordinator is listening on
+    def getAddress(self):
+        return self._server.server_address
+
+    #serve workers until the whole key space has been searched (or timeout seconds have passed)
+    #returns the best candidates as a list of (score, record) tuples, best first
+    def run(self, timeout = None):
+
+        serverThread = threading.Thread(target = self._server.serve_forever, daemon = True)
+        serverThread.start()
+        try:
+            self._finished.wait(timeout)
+        finally:
+            #tell workers that are waiting for work that the search is over
+            self._finished.set()
+            self._server.shutdown()
+            self._server.server_close()
+
+        return self.getCandidates()
+
+    #returns the best candidates found so far (see run)
+    def getCandidates(self):
+        with self._lock:
+            candidates = sorted(self._candidates, reverse = True)
+        return [(score, self.keyspace.unrank(-negativeRank)) for score, negativeRank in candidates]
+
+    #returns a report of each worker's throughput, one line per worker
+    def getThroughputReport(self):
+
+        lines = []
+        with self._lock:
+            for worker, stats in sorted(self._workerStats.items()):
+                elapsed = stats['lastTime'] - stats['firstTime']
+                rate = stats['keys'] / elapsed if elapsed > 0 else 0
+                lines.append(f"{worker}: {stats['keys']} keys in {elapsed:.2f}s "
+                    f"({rate:.0f} keys/s, {stats['steals']} ranges stolen)")
+        return '\n'.join(lines)
+
+    def _handleConnection(self, sock):
+
+        connection = _Connection(sock)
+        worker = None
+
+        try:
+            while True:
+                message = connection.receive()
+                if message == None:
+                    break
+
+                if message['type'] == 'hello':
+                    worker = message['worker']
+                    with self._lock:
+                        now = time.monotonic()
+                        self._workerStats[worker] = {'batchSize': message['batchSize'], 'keys': 0,
+                            'firstTime': now, 'lastTime': now, 'steals': 0}
+                    connection.send(self.job)
+
+                #anything else from a worker that has not said hello is rejected by closing the connection
+                elif worker == None:
+                    break
+
+                elif message['type'] == 'request':
+                    connection.send(self._assignRange(worker))
+
+                elif message['type'] == 'progress':
+                    reply = self._recordProgress(worker, message)
+                    if reply == None:
+                        break
+                    connection.send(reply)
+
+                #unknown messages are rejected by closing the connection
+                else:
+                    break
+
+        finally:
+            #if the worker went away in the middle of a range, put the rest of it back
+            #(including the batch it was busy with, which was never reported)
+            with self._lock:
+                activeRange = self._activeRanges.pop(worker, None)
+                if activeRange != None and activeRange[0] < activeRange[1]:
+                    self._pendingRanges.append(activeRange)
+
+    #give an idle worker a range, stealing one if needed
+    def _assignRange(self, worker):
+
+        with self._lock:
+            self._activeRanges.pop(worker, None)
+
+            if self._finished.is_set():
+                return {'type': 'done'}
+
+            if len(self._pendingRanges):
+                start, stop = self._pendingRanges.pop(0)
+
+            else:
+                #steal the second half of the range with the most keys left
+                #the batch the worker is busy with (starting at its last reported position) is left alone
+                def getStealableRange(name):
+                    position, stop = self._activeRanges[name]
+                    return (min(position + self._workerStats[name]['batchSize'], stop), stop)
+
+                #if there is nothing worth stealing, the remaining keys are in batches other workers
+                #are busy with; if one of them disconnects, its range is put back, so wait for that
+                victim = max(self._activeRanges,
+                    key = lambda name: getStealableRange(name)[1] - getStealableRange(name)[0], default = None)
+                if victim == None:
+                    return {'type': 'wait', 'seconds': WAIT_SECONDS}
+
+                position, stop = getStealableRange(victim)
+                if stop - position < self.minStealSize:
+                    return {'type': 'wait', 'seconds': WAIT_SECONDS}
+
+                start = position + (stop - position) // 2
+                self._activeRanges[victim][1] = start
+                self._workerStats[worker]['steals'] += 1
+
+            self._activeRanges[worker] = [start, stop]
+            return {'type': 'work', 'start': start, 'stop': stop}
+
+    #record a worker's progress and candidates, and tell it where its range now ends
+    #returns None if the worker has no range (it did not ask for one), so it cannot be making progress
+    def _recordProgress(self, worker, message):
+
+        with self._lock:
+            activeRange = self._activeRanges.get(worker)
+            if activeRange == None:
+                return None
+            activeRange[0] = message['position']
+
+            stats = self._workerStats[worker]
+            stats['keys'] += message['keys']
+            stats['lastTime'] = time.monotonic()
+
+            for score, rank in message['candidates']:
+                candidate = (score, -rank)
+                if len(self._candidates) < self.candidateCount:
+                    heapq.heappush(self._candidates, candidate)
+                elif candidate > self._candidates[0]:
+                    heapq.heapreplace(self._candidates, candidate)
+
+            self._remainingKeys -= message['keys']
+            if self._remainingKeys == 0:
+                self._finished.set()
+
+            return {'type': 'continue', 'stop': activeRange[1]}
+
+
+#connect to a coordinator and search ranges until it says the search is done
+#keys are searched batchSize at a time, with a progress report after each batch
+#returns the number of keys searched
+def runWorker(host, port, worker, batchSize = 2048):
+
+    with socket.create_connection((host, port)) as sock:
+        connection = _Connection(sock)
+
+        connection.send({'type': 'hello', 'worker': worker, 'batchSize': batchSize})
+        job = connection.receive()
+
+        keyspace = Keyspace(job['reflectorTypes'], job['rotorTypes'], job['plugCount'], job['includeRings'])
+        ciphertext = messageToIndices(job['ciphertext'])
+        crib = messageToIndices(job['crib'])
+
+        keyCount = 0
+        while True:
+            connection.send({'type': 'request'})
+            reply = connection.receive()
+            if reply == None or reply['type'] == 'done':
+                return keyCount
+            if reply['type'] == 'wait':
+                time.sleep(reply['seconds'])
+                continue
+
+            position, stop = reply['start'], reply['stop']
+            while position < stop:
+                batchStop = min(position + batchSize, stop)
+                candidates = searchRange(keyspace, position, batchStop, ciphertext, crib,
+                    job['cribOffset'], job['candidateCount'])
+                batchKeys = batchStop - position
+                keyCount += batchKeys
+                position = batchStop
+
+                connection.send({'type': 'progress', 'position': position, 'keys': batchKeys,
+                    'candidates': candidates})
+                reply = connection.receive()
+                if reply == None:
+                    return keyCount
+                stop = reply['stop']
+
+
+if __name__ == '__main__':
+
+    #search a small key space (reflector B, rotors I - III, no plugs or ring settings) with 3 worker processes
+
+    from multiprocessing import Process
+    from enigma import Enigma
+
+    key = Enigma.getDefaultEnigma()
+    key.setRotorPositions(('q', 'e', 'v'))
+    ciphertext = key.encodeMessage('wetterberichtfuerdiedeutschebucht')
+
+    coordinator = SearchCoordinator(ciphertext, 'wetterbericht', reflectorTypes = (0,), rotorTypes = (0, 1, 2),
+        includeRings = False, rangeCount = 3, candidateCount = 3)
+    host, port = coordinator.getAddress()
+
+    workers = [Process(target = runWorker, args = (host, port, f'worker{index}')) for index in range(3)]
+    for worker in workers:
+        worker.start()
+
+    candidates = coordinator.run()
+    for worker in workers:
+        worker.join()
+
+    print(coordinator.getThroughputReport())
+    score, record = candidates[0]
+    print(score, Enigma.fromBytes(record).getRotorPositions(), "(expected 13 ('q', 'e', 'v'))")
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+
+#maps every key in a key space to an integer (its rank) and back,
+#so exhaustive searches can be split into contiguous, independent ranges of integers
+#(i.e. one worker takes keys 0 to 10^9, the next takes 10^9 to 2 x 10^9, and so on)
+#without building any Enigma objects or coordinating with each other
+#
+#keys are represented as packed state records (see packedstate)
+
+from itertools import permutations, product
+
+from rotor import Rotor
+from reflector import Reflector
+import packedstate
+
+
+#returns the number of ways to place exactly plugCount plugs among letterCount letters
+#(each plug joins two distinct letters, and a letter can only have one plug)
+#results are cached in _plugCombinationCounts
+_plugCombinationCounts = {}
+def countPlugCombinations(letterCount, plugCount):
+
+    if plugCount == 0:
+        return 1
+    if 2 * plugCount > letterCount:
+        return 0
+
+    key = (letterCount, plugCount)
+    if key not in _plugCombinationCounts:
+        #either the first letter has no plug,
+        #or it is plugged to one of the other (letterCount - 1) letters
+        _plugCombinationCounts[key] = (countPlugCombinations(letterCount - 1, plugCount)
+            + (letterCount - 1) * countPlugCombinations(letterCount - 2, plugCount - 1))
+
+    return _plugCombinationCounts[key]
+
+
+#returns the plugboard wiring (see Plugboard.getWiring) with the specified rank
+#among all wirings with exactly plugCount plugs
+#ranks go from 0 to countPlugCombinations(26, plugCount) - 1
+def unrankPlugs(rank, plugCount):
+
+    wiring = bytearray(range(26))
+    letters = list(range(26))
+
+    while plugCount > 0:
+        first = letters[0]
+        letterCount = len(letters)
+
+        #wirings where the first remaining letter has no plug come first
+        unpluggedCount = countPlugCombinations(letterCount - 1, plugCount)
+        if rank < unpluggedCount:
+            letters.pop(0)
+            continue
+        rank -= unpluggedCount
+
+        #then wirings where it is plugged to the 1st, 2nd, ... of the other remaining letters
+        partnerIndex, rank = divmod(rank, countPlugCombinations(letterCount - 2, plugCount - 1))
+        partner = letters[partnerIndex + 1]
+
+        wiring[first] = partner
+        wiring[partner] = first
+        letters.pop(partnerIndex + 1)
+        letters.pop(0)
+        plugCount -= 1
+
+    return bytes(wiring)
+
+
+#returns the rank of a plugboard wiring (the inverse of unrankPlugs)
+#plugCount is the number of plugs in the wiring
+def rankPlugs(wiring, plugCount):
+
+    rank = 0
+    letters = list(range(26))
+
+    while plugCount > 0:
+        first = letters[0]
+        letterCount = len(letters)
+        partner = wiring[first]
+
+        if partner == first:
+            letters.pop(0)
+            continue
+
+        rank += countPlugCombinations(letterCount - 1, plugCount)
+        partnerIndex = letters.index(partner) - 1
+        rank += partnerIndex * countPlugCombinations(letterCount - 2, plugCount - 1)
+
+        letters.pop(partnerIndex + 1)
+        letters.pop(0)
+        plugCount -= 1
+
+    return rank
+
+
+#a key space: every combination of reflector, rotor order, plugboard wiring,
+#ring settings and rotor positions allowed by the constructor arguments
+#
+#keys are ordered by (reflector, rotor order, plugboard, ring settings, rotor positions),
+#with the rotor positions changing fastest; ring settings and positions are ordered as
+#(left, middle, right), like the rest of this project
+class Keyspace():
+
+    #reflectorTypes and rotorTypes limit the key space to the specified types
+    #(ReflectorType/RotorType or integers; defaults to every supported type)
+    #plugCount is the exact number of plugs in every key (0 to 13)
+    #if includeRings is False, every ring setting is fixed at A-01
+    def __init__(self, reflectorTypes = None, rotorTypes = None, plugCount = 0, includeRings = True):
+
+        if reflectorTypes == None:
+            reflectorTypes = range(len(Reflector._reflectorWirings))
+        if rotorTypes == None:
+            rotorTypes = range(len(Rotor._rotorWirings))
+
+        self.reflectorTypes = tuple(sorted(set(Reflector.validateReflectorType(reflectorType)
+            for reflectorType in reflectorTypes)))
+        rotorTypes = tuple(sorted(set(Rotor.validateRotorType(rotorType) for rotorType in rotorTypes)))
+
+        if not (isinstance(plugCount, int) and 0 <= plugCount <= 13):
+            raise ValueError("plugCount must be an integer from 0 to 13")
+
+        #every ordered choice of 3 different rotors, as (left, middle, right)
+        self.rotorOrders = tuple(permutations(rotorTypes, 3))
+        if len(self.rotorOrders) == 0:
+            raise ValueError("At least 3 rotor types are needed")
+
+        self.plugCount = plugCount
+        self.includeRings = includeRings
+
+        ringCount = 26 if includeRings else 1
+
+        #the radix of each digit of a rank, most significant first:
+        #reflector, rotor order, plugboard, 3 ring settings, 3 rotor positions
+        self.radices = (
+            len(self.reflectorTypes),
+            len(self.rotorOrders),
+            countPlugCombinations(26, plugCount),
+            ringCount, ringCount, ringCount,
+            26, 26, 26
+        )
+
+        self.size = 1
+        for radix in self.radices:
+            self.size *= radix
+
+        #used by rank to find reflector and rotor order digits
+        self._reflectorIndices = {reflectorType: index for index, reflectorType in enumerate(self.reflectorTypes)}
+        self._rotorOrderIndices = {rotorOrder: index for index, rotorOrder in enumerate(self.rotorOrders)}
+
+    #returns the number of keys in this key space
+    #(this is a method rather than __len__ because the size can be larger than len() allows)
+    def getSize(self):
+        return self.size
+
+    #split a rank into its digits (see radices)
+    def _getDigits(self, rank):
+
+        if not (isinstance(rank, int) and 0 <= rank < self.size):
+            raise ValueError(f"rank must be an integer from 0 to {self.size - 1}")
+
+        digits = []
+        for radix in reversed(self.radices):
+            rank, digit = divmod(rank, radix)
+            digits.append(digit)
+        digits.reverse()
+        return digits
+
+    #returns the key with the specified rank as a packed state record
+    def unrank(self, rank):
+
+        (reflectorIndex, rotorOrderIndex, plugRank,
+            leftRing, middleRing, rightRing,
+            leftPos, middlePos, rightPos) = self._getDigits(rank)
+
+        return packedstate.packRecord(
+            self.reflectorTypes[reflectorIndex],
+            self.rotorOrders[rotorOrderIndex],
+            (leftRing, middleRing, rightRing),
+            (leftPos, middlePos, rightPos),
+            unrankPlugs(plugRank, self.plugCount))
+
+    #returns the rank of a key given as a packed state record (the inverse of unrank)
+    #raises a ValueError if the key is not part of this key space
+    def rank(self, record):
+
+        (reflectorType, rotorTypes, ringSettings,
+            rotorPositions, plugboardWiring) = packedstate.unpackRecord(record)
+
+        if reflectorType not in self._reflectorIndices or rotorTypes not in self._rotorOrderIndices:
+            raise ValueError("Key uses a reflector or rotor order that is not part of this key space")
+
+        plugCount = sum(1 for index, pluggedIndex in enumerate(plugboardWiring) if pluggedIndex > index)
+        if plugCount != self.plugCount:
+            raise ValueError(f"Key has {plugCount} plugs, but this key space has {self.plugCount}")
+
+        if not self.includeRings and any(ringSettings):
+            raise ValueError("Key has ring settings, but this key space does not include them")
+
+        digits = (
+            self._reflectorIndices[reflectorType],
+            self._rotorOrderIndices[rotorTypes],
+            rankPlugs(plugboardWiring, self.plugCount),
+            *ringSettings,
+            *rotorPositions
+        )
+
+        rank = 0
+        for radix, digit in zip(self.radices, digits):
+            rank = rank * radix + digit
+        return rank
+
+    #iterate over the keys with ranks from start up to (but not including) stop
+    #yields packed state records, in rank order
+    #no Enigma objects are created, and each key costs a single bytes concatenation
+    def iterRange(self, start = 0, stop = None):
+
+        if stop == None:
+            stop = self.size
+        if start >= stop:
+            return
+        #validates start and stop
+        self._getDigits(stop - 1)
+        digits = self._getDigits(start)
+
+        remaining = stop - start
+        ringRadix = self.radices[3]
+
+        #the key space is walked like an odometer: every loop below restarts at 0
+        #except on the first pass, where it starts at the digit of start
+        for reflectorIndex in range(digits[0], self.radices[0]):
+            reflectorType = self.reflectorTypes[reflectorIndex]
+
+            for rotorOrderIndex in range(digits[1], self.radices[1]):
+                rotorOrder = self.rotorOrders[rotorOrderIndex]
+
+                for plugRank in range(digits[2], self.radices[2]):
+                    plugboardWiring = unrankPlugs(plugRank, self.plugCount)
+
+                    for ringIndex in range(digits[3] * ringRadix * ringRadix + digits[4] * ringRadix + digits[5], ringRadix ** 3):
+                        #the first 7 bytes of every record in this loop are the same
+                        leftRing, rest = divmod(ringIndex, ringRadix * ringRadix)
+                        middleRing, rightRing = divmod(rest, ringRadix)
+                        prefix = bytes((reflectorType, *rotorOrder, leftRing, middleRing, rightRing))
+
+                        for positionIndex in range(digits[6] * 676 + digits[7] * 26 + digits[8], 17576):
+                            yield prefix + _positionBytes[positionIndex] + plugboardWiring
+
+                            remaining -= 1
+                            if remaining == 0:
+                                return
+
+                        digits[6] = digits[7] = digits[8] = 0
+                    digits[3] = digits[4] = digits[5] = 0
+                digits[2] = 0
+            digits[1] = 0
+
+    #iterate over the keys with ranks from start up to (but not including) stop in batches
+    #yields bytes objects holding up to batchSize records each (in the packedstate.joinRecords format),
+    #which can be read with packedstate.iterRecordFields
+    def iterBatches(self, start = 0, stop = None, batchSize = 4096):
+
+        batch = []
+        for record in self.iterRange(start, stop):
+            batch.append(record)
+            if len(batch) == batchSize:
+                yield packedstate.joinRecords(batch)
+                batch = []
+
+        if len(batch):
+            yield packedstate.joinRecords(batch)
+
+    #returns the (start, stop) range of ranks for one of shardCount equal shards of the key space
+    #shards are contiguous, cover the whole key space, and differ in size by at most one key
+    def getShard(self, shardIndex, shardCount):
+
+        if not (isinstance(shardCount, int) and shardCount > 0 and 0 <= shardIndex < shardCount):
+            raise ValueError("shardIndex must be an integer from 0 to shardCount - 1")
+
+        start = self.size * shardIndex // shardCount
+        stop = self.size * (shardIndex + 1) // shardCount
+        return (start, stop)
+
+
+#the 3 rotor position bytes for every position index (left * 676 + middle * 26 + right)
+#precomputed so iterRange does not need to build them for every key
+_positionBytes = tuple(bytes(positions) for positions in product(range(26), repeat = 3))
+
+
+if __name__ == '__main__':
+
+    #test Keyspace
+
+    keyspace = Keyspace(plugCount = 10)
+    print('key space size:', keyspace.getSize())
+
+    rank = 123456789012345678901
+    record = keyspace.unrank(rank)
+    print('rank round trip (expected True):', keyspace.rank(record) == rank)
+
+    start, stop = keyspace.getShard(7, 1000)
+    records = list(keyspace.iterRange(start, start + 5))
+    print('iterRange matches unrank (expected True):',
+        records == [keyspace.unrank(start + offset) for offset in range(5)])
+
+    print('number of plugboard settings with 10 plugs (expected 150738274937250):',
+        countPlugCombinations(26, 10))
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+from permutation import Permutation
 
 #an exception type to raise if a lettermap is invalid
 #or if a LetterSwitcher is used without a lettermap
@@ -13,6 +14,10 @@ class LetterSwitcher():
     from string import ascii_lowercase
     
     alphabet = tuple(ascii_lowercase)
+
+    #maps each letter to its index in the alphabet
+    #(a dict lookup is much cheaper than alphabet.index on every switch)
+    _letterIndices = {letter: index for index, letter in enumerate(alphabet)}
     
     #lettermaps are used to specify the specific letter switching
     #that a given LetterSwitcher should apply
@@ -46,7 +51,8 @@ class LetterSwitcher():
         #init encounteredValues
         #this will be used to track which letters
         #have been encountered (so we can check for repeats)
-        encounteredValues = []
+        #a set is used so each repeat check is a single hash lookup
+        encounteredValues = set()
         
         for key, val in lettermap.items():
             
@@ -62,7 +68,7 @@ class LetterSwitcher():
                 if val in encounteredValues:
                     return False
                 else:
-                    encounteredValues.append(val)
+                    encounteredValues.add(val)
         
         #if we got to this point, all keys and values must be valid
         #and there are no repeats
@@ -85,6 +91,18 @@ class LetterSwitcher():
         else:
             raise LettermapException("Provided lettermap is invalid: {}".format(repr(lettermap)))
 
+    #sets the lettermap var of this instance WITHOUT validating it
+    #this is only for lettermaps that are already known to be valid,
+    #such as the built-in rotor and reflector wirings (which are validated once, at import)
+    #user-supplied lettermaps should always go through setLettermap instead
+    #still throws LettermapException if a lettermap is already defined
+    def _setTrustedLettermap(self, lettermap):
+
+        if self.lettermap != None:
+            raise LettermapException('Attempted to set lettermap, but this instance already had a defined lettermap')
+
+        self.lettermap = lettermap
+
 
     #init method, required by all classes
     def __init__(self, lettermap = None):
@@ -138,11 +156,22 @@ class LetterSwitcher():
         
     
     #returns a copy of the internal lettermap
+    #(always a plain dict, even if the internal lettermap is a read-only shared table)
     def getLettermap(self):
-        from copy import copy
-        return copy(self.lettermap)
+        return dict(self.lettermap)
         
     
+    #returns the lettermap as a Permutation (see permutation.py)
+    #letters that are not in the lettermap are switched to themselves
+    def getPermutation(self):
+
+        #raise exception if no lettermap is set
+        if self.lettermap == None:
+            raise LettermapException("A permutation cannot be created as there is no lettermap set")
+
+        return Permutation.fromLettermap(self.lettermap)
+
+
     #returns a lettermap that performs the exact opposite
     #switches as the current internal lettermap
     #(i.e. a decoder lettermap)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+#a search index for logs encrypted with EnigmaFile, so they can be searched without decrypting
+#the whole log
+#
+#the log is split into blocks of whole lines (each at least blockSize bytes long, apart from the
+#last); newlines are not encrypted by EnigmaFile, so the blocks can be found without the key
+#for each block, a sidecar index file records its offset, its length, the rotor positions at its
+#start (a checkpoint, so the block can be decrypted on its own) and a Bloom filter of the
+#three-letter sequences (trigrams) of its lowercased plaintext
+#a search only decrypts the blocks whose Bloom filter has every trigram of the search term, so it
+#costs roughly the size of the matching blocks plus a small false positive rate
+#(search terms of fewer than 3 bytes have no trigrams, so every block has to be decrypted for them)
+#blocks are decrypted by a pool of processes, both to build the index and to search
+#
+#the index reveals some information about the plaintext (which trigrams each block may contain),
+#so it should be kept as safe as the plaintext would be
+#
+#the index is stored in the following format (all integers unsigned and little-endian):
+#   8 bytes     MAGIC
+#   INDEX_HEADER        block count, Bloom filter size (in bytes), number of hash functions
+#   for each block, in order of offset:
+#       BLOCK_HEADER    offset, length, rotor positions (left, middle, right) at the start of the block
+#       Bloom filter
+
+import io
+import struct
+import zlib
+
+from enigma import Enigma
+from enigma_file import EnigmaFile
+from rotor_trace import RotorTrace
+from scrambler_table import ScramblerTable
+import packedstate
+
+MAGIC = b'ENIGLOG1'
+INDEX_HEADER = struct.Struct('<III')
+BLOCK_HEADER = struct.Struct('<QI3s')
+
+#the second Bloom filter hash is a CRC-32 started from this value instead of 0
+_secondHashStart = 0x9e3779b9
+
+
+#returns the Bloom filter bit numbers for a trigram (bytes)
+#(double hashing: the i-th bit is first + i * second, modulo the number of bits)
+def _getBloomBits(trigram, bitCount, hashCount):
+    first = zlib.crc32(trigram)
+    second = zlib.crc32(trigram, _secondHashStart) | 1
+    return [(first + index * second) % bitCount for index in range(hashCount)]
+
+
+#returns the set of trigrams in some data (lowercased)
+def _getTrigrams(data):
+    data = bytes(data).lower()
+    return {data[index:index + 3] for index in range(len(data) - 2)}
+
+
+#returns the Bloom filter (bloomSize bytes) of the trigrams in some data
+def _getBloomFilter(data, bloomSize, hashCount):
+
+    bloom = bytearray(bloomSize)
+    bitCount = 8 * bloomSize
+    for trigram in _getTrigrams(data):
+        for bit in _getBloomBits(trigram, bitCount, hashCount):
+            bloom[bit >> 3] |= 1 << (bit & 7)
+    return bytes(bloom)
+
+
+#returns the blocks of an encrypted log (a bytes-like object) as a list of (offset, length) tuples
+#each block ends at the first newline at least blockSize bytes after it starts (or at the end)
+def _getBlocks(data, blockSize):
+
+    blocks = []
+    offset = 0
+    while offset < len(data):
+        end = data.find(b'\n', offset + max(blockSize, 1) - 1)
+        end = len(data) if end == -1 else end + 1
+        blocks.append((offset, end - offset))
+        offset = end
+    return blocks
+
+
+#returns the rotor positions after steps steps of a RotorTrace, as 3 bytes (left, middle, right)
+#(EnigmaFile encrypts the byte at offset n at the positions after n + 1 steps, so these are the
+#positions to start from to decrypt a block at offset steps)
+def _getCheckpoint(trace, steps):
+
+    if steps == 0:
+        return bytes(trace.rotorPositions)
+
+    position, = trace.getPositionIndexRange(steps - 1, steps)
+    left, rest = divmod(position, 676)
+    middle, right = divmod(rest, 26)
+    return bytes((left, middle, right))
+
+
+#the open log and compiled key used by each worker process in buildLogIndex and searchLog
+_workerLog = None
+_workerKey = None
+_workerScramblerTable = None
+
+def _initWorker(logPath, keyRecord):
+    global _workerLog, _workerKey, _workerScramblerTable
+    _workerLog = open(logPath, 'rb')
+    _workerKey = keyRecord
+    _workerScramblerTable = ScramblerTable(Enigma.fromBytes(keyRecord))
+
+#returns the plaintext of a block, decrypted from its checkpoint
+def _decryptBlock(offset, length, rotorPositions):
+
+    _workerLog.seek(offset)
+    ciphertext = _workerLog.read(length)
+
+    positionsStart = packedstate.ROTOR_POSITIONS_OFFSET
+    positionsEnd = packedstate.PLUGBOARD_OFFSET
+    blockKey = Enigma.fromBytes(_workerKey[:positionsStart] + rotorPositions + _workerKey[positionsEnd:])
+    with EnigmaFile(io.BytesIO(ciphertext), blockKey, _workerScramblerTable) as blockFile:
+        return blockFile.read()
+
+def _getBloomFilterInWorker(block, bloomSize, hashCount):
+    return _getBloomFilter(_decryptBlock(*block), bloomSize, hashCount)
+
+#returns the lines of a block that contain term, as (offset, line) tuples
+def _searchBlockInWorker(block, term, ignoreCase):
+
+    offset = block[0]
+    matches = []
+    for line in io.BytesIO(_decryptBlock(*block)):
+        if term in (line.lower() if ignoreCase else line):
+            matches.append((offset, line))
+        offset += len(line)
+    return matches
+
+
+#run a function on blocks in a pool of processes (or in this process if processes is 1)
+#returns the results in order
+def _mapBlocks(function, blocks, logPath, keyRecord, processes):
+
+    if processes == 1:
+        _initWorker(logPath, keyRecord)
+        try:
+            return list(map(function, blocks))
+        finally:
+            _workerLog.close()
+
+    from multiprocessing import Pool
+    with Pool(processes, initializer = _initWorker, initargs = (logPath, keyRecord)) as pool:
+        return pool.map(function, blocks)
+
+
+#build the index for a log encrypted with EnigmaFile and write it to indexPath
+#enigma is the key the log was written with (with its rotors at the starting positions)
+#blockSize is the least number of bytes per block; smaller blocks make searches decrypt less, but
+#make the index bigger (a blockSize of 1 gives a block per line)
+#bloomSize is the size of each block's Bloom filter in bytes, and hashCount the number of bits
+#set for each trigram; they should grow with blockSize to keep false positives rare
+#blocks are decrypted by a pool of processes (processes defaults to the number of CPUs)
+#returns the number of blocks
+def buildLogIndex(logPath, indexPath, enigma, blockSize = 1 << 16, bloomSize = 4096, hashCount = 4, processes = None):
+
+    import mmap
+    from functools import partial
+
+    with open(logPath, 'rb') as logFile:
+        if logFile.seek(0, io.SEEK_END) == 0:
+            blocks = []
+        else:
+            with mmap.mmap(logFile.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                blocks = _getBlocks(data, blockSize)
+
+    #the rotor positions at the start of each block
+    trace = RotorTrace.fromEnigma(enigma)
+    blocks = [(offset, length, _getCheckpoint(trace, offset)) for offset, length in blocks]
+
+    bloomFilters = _mapBlocks(partial(_getBloomFilterInWorker, bloomSize = bloomSize, hashCount = hashCount),
+        blocks, logPath, enigma.toBytes(), processes)
+
+    with open(indexPath, 'wb') as indexFile:
+        indexFile.write(MAGIC)
+        indexFile.write(INDEX_HEADER.pack(len(blocks), bloomSize, hashCount))
+        for block, bloomFilter in zip(blocks, bloomFilters):
+            indexFile.write(BLOCK_HEADER.pack(*block))
+            indexFile.write(bloomFilter)
+
+    return len(blocks)
+
+
+#an index written by buildLogIndex
+#the file is memory-mapped, so it is read from disk as it is searched rather than all at once
+class LogIndex():
+
+    def __init__(self, path):
+        import mmap
+
+        with open(path, 'rb') as indexFile:
+            self._map = mmap.mmap(indexFile.fileno(), 0, access = mmap.ACCESS_READ)
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a log index")
+
+        self.blockCount, self.bloomSize, self.hashCount = INDEX_HEADER.unpack_from(self._map, len(MAGIC))
+        self._blocksStart = len(MAGIC) + INDEX_HEADER.size
+        self._entrySize = BLOCK_HEADER.size + self.bloomSize
+
+        if len(self._map) != self._blocksStart + self.blockCount * self._entrySize:
+            raise ValueError(f"{path} is not a complete log index")
+
+    #returns a block as a tuple (offset, length, rotorPositions), where rotorPositions is 3 bytes
+    def getBlock(self, index):
+        return BLOCK_HEADER.unpack_from(self._map, self._blocksStart + index * self._entrySize)
+
+    #returns the blocks that may contain term (bytes), in order of offset
+    def getCandidateBlocks(self, term):
+
+        bitCount = 8 * self.bloomSize
+        bits = [bit for trigram in _getTrigrams(term) for bit in _getBloomBits(trigram, bitCount, self.hashCount)]
+
+        #the byte of each bit, and the mask of the bit in that byte
+        checks = [(BLOCK_HEADER.size + (bit >> 3), 1 << (bit & 7)) for bit in bits]
+
+        data = self._map
+        candidates = []
+        for index in range(self.blockCount):
+            entryStart = self._blocksStart + index * self._entrySize
+            if all(data[entryStart + byte] & mask for byte, mask in checks):
+                candidates.append(self.getBlock(index))
+        return candidates
+
+    #release the memory map
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+
+#search a log encrypted with EnigmaFile for lines containing term (bytes), using its index
+#enigma is the key the log was written with (with its rotors at the starting positions)
+#if ignoreCase is True, lines match regardless of the case of (ascii) letters
+#only the candidate blocks (see LogIndex.getCandidateBlocks) are decrypted, by a pool of processes
+#(processes defaults to the number of CPUs)
+#returns the matching lines as a list of (offset, line) tuples, in order of offset
+def searchLog(logPath, indexPath, enigma, term, ignoreCase = False, processes = None):
+
+    from functools import partial
+
+    term = bytes(term)
+    if ignoreCase:
+        term = term.lower()
+
+    with LogIndex(indexPath) as index:
+        blocks = index.getCandidateBlocks(term)
+    if len(blocks) == 0:
+        return []
+
+    results = _mapBlocks(partial(_searchBlockInWorker, term = term, ignoreCase = ignoreCase),
+        blocks, logPath, enigma.toBytes(), processes)
+    return [match for matches in results for match in matches]
+
+
+if __name__ == '__main__':
+
+    #write an encrypted log, index it and search it
+
+    import os
+    import tempfile
+
+    key = Enigma.getDefaultEnigma()
+    key.setRingSettings(('b', 'u', 'l'))
+    key.plugboard.addPlug('a', 'q')
+    key.setRotorPositions(('w', 'z', 'a'))
+
+    directory = tempfile.mkdtemp()
+    logPath = os.path.join(directory, 'app.log')
+    indexPath = os.path.join(directory, 'app.log.idx')
+
+    with open(logPath, 'wb') as logFile, EnigmaFile(logFile, key) as encryptedLog:
+        for number in range(20000):
+            level = 'ERROR' if number % 4999 == 0 else 'INFO'
+            encryptedLog.write(f'{number:06d} {level} request handled for user{number % 97}\n'.encode('ascii'))
+
+    print(buildLogIndex(logPath, indexPath, key, blockSize = 8192, processes = 2), 'blocks')
+
+    with LogIndex(indexPath) as index:
+        print(len(index.getCandidateBlocks(b'ERROR')), 'of', index.blockCount, 'blocks may contain ERROR (expected 5 or a few more)')
+
+    for offset, line in searchLog(logPath, indexPath, key, b'error', ignoreCase = True, processes = 2):
+        print(offset, line)
+    #expected output: the lines numbered 000000, 004999, 009998, 014997 and 019996
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+#an Enigma split into two parts:
+#   MachineConfig   the static configuration (reflector, rotor order, ring settings, plugboard),
+#                   compiled once into lookup tables; it is immutable and hashable
+#   MachineState    the rotor positions, which is all that changes while encoding
+#
+#the encode functions in this module take one of each; since a MachineConfig is never modified,
+#any number of threads can share a single one without locks or copies, as long as each thread
+#uses its own MachineState
+#
+#rotor positions in a MachineState are the letters seen in the window, as indices (0 - 25)
+
+import packedstate
+from rotor import Rotor
+from reflector import Reflector
+from scrambler_table import messageToIndices, indicesToMessage
+
+
+#returns the 26 versions of a rotor wiring for every window position, as integer tables
+#(see Rotor.switchLetter: the wiring is shifted by the window position minus the ring setting)
+def _getWindowWirings(wiring, ringSetting):
+    tables = []
+    for window in range(26):
+        offset = (window - ringSetting) % 26
+        tables.append(tuple((wiring[(letter + offset) % 26] - offset) % 26 for letter in range(26)))
+    return tuple(tables)
+
+
+class MachineConfig():
+
+    __slots__ = (
+        'reflectorType', 'rotorTypes', 'ringSettings', 'plugboardWiring',
+        'notchPositions', '_key',
+        '_plugboard', '_reflector',
+        '_leftForward', '_leftReverse', '_middleForward', '_middleReverse',
+        '_rightForward', '_rightReverse'
+    )
+
+    #reflectorType is a ReflectorType or integer
+    #rotorTypes is a 3-tuple of RotorTypes or integers (left, middle, right)
+    #ringSettings is a 3-tuple of letters or integers (left, middle, right)
+    #plugboardWiring is 26 bytes, as returned by Plugboard.getWiring (defaults to no plugs)
+    #raises a ValueError if any of these are invalid
+    def __init__(self, reflectorType, rotorTypes, ringSettings = (0, 0, 0), plugboardWiring = packedstate.NO_PLUGS):
+
+        if (not isinstance(rotorTypes, tuple)) or len(rotorTypes) != 3:
+            raise ValueError('Rotor types must be a 3-tuple of the form (left, middle, right)')
+        if (not isinstance(ringSettings, tuple)) or len(ringSettings) != 3:
+            raise ValueError('Ring settings must be a 3-tuple of the form (left, middle, right)')
+
+        reflectorType = Reflector.validateReflectorType(reflectorType)
+        rotorTypes = tuple(Rotor.validateRotorType(rotorType) for rotorType in rotorTypes)
+        ringSettings = tuple(Rotor.validateRingSetting(ringSetting) for ringSetting in ringSettings)
+        plugboardWiring = bytes(plugboardWiring)
+
+        #validates the plugboard wiring
+        record = packedstate.packRecord(reflectorType, rotorTypes, ringSettings, (0, 0, 0), plugboardWiring)
+        packedstate.validateRecord(record)
+
+        #attributes are set with object.__setattr__, as __setattr__ is disabled
+        setAttribute = object.__setattr__
+        setAttribute(self, 'reflectorType', reflectorType)
+        setAttribute(self, 'rotorTypes', rotorTypes)
+        setAttribute(self, 'ringSettings', ringSettings)
+        setAttribute(self, 'plugboardWiring', plugboardWiring)
+        setAttribute(self, 'notchPositions', tuple(Rotor.getRotorNotchPos(rotorType) for rotorType in rotorTypes))
+
+        #the packed record (with rotor positions AAA) identifies the configuration
+        #and is used for equality and hashing
+        setAttribute(self, '_key', record)
+
+        #compile the lookup tables used by the encode functions
+        setAttribute(self, '_plugboard', tuple(plugboardWiring))
+        setAttribute(self, '_reflector', Reflector.getReflectorWiring(reflectorType))
+        for name, rotorType, ringSetting in zip(('_left', '_middle', '_right'), rotorTypes, ringSettings):
+            setAttribute(self, name + 'Forward', _getWindowWirings(Rotor.getRotorWiring(rotorType), ringSetting))
+            setAttribute(self, name + 'Reverse', _getWindowWirings(Rotor.getRotorReverseWiring(rotorType), ringSetting))
+
+    #returns the MachineConfig for an Enigma's current configuration
+    #the Enigma is not referenced after this, so changing it does not affect the config
+    @staticmethod
+    def fromEnigma(enigma):
+        enigma.validateEnigmaSetup()
+        return MachineConfig.fromBytes(enigma.toBytes())
+
+    #returns the MachineConfig for a packed state record (see packedstate)
+    #the rotor positions in the record are ignored (see MachineState.fromBytes)
+    @staticmethod
+    def fromBytes(record):
+        (reflectorType, rotorTypes, ringSettings,
+            _, plugboardWiring) = packedstate.unpackRecord(record)
+        return MachineConfig(reflectorType, rotorTypes, ringSettings, plugboardWiring)
+
+    #returns the configuration as a packed state record, with the specified rotor positions
+    #(a MachineState, or None for AAA)
+    def toBytes(self, state = None):
+        if state == None:
+            return self._key
+        return packedstate.packRecord(self.reflectorType, self.rotorTypes, self.ringSettings,
+            (state.left, state.middle, state.right), self.plugboardWiring)
+
+    #MachineConfig is immutable
+    def __setattr__(self, name, value):
+        raise AttributeError("MachineConfig is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("MachineConfig is immutable")
+
+    #configs are pickled (and copied) as their packed record, and rebuilt with fromBytes,
+    #as the default way of restoring the slots goes through __setattr__
+    def __reduce__(self):
+        return (MachineConfig.fromBytes, (self._key,))
+
+    def __eq__(self, other):
+        if not isinstance(other, MachineConfig):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return (f'MachineConfig({self.reflectorType}, {self.rotorTypes}, '
+            f'{self.ringSettings}, {repr(self.plugboardWiring)})')
+
+
+#the rotor positions of a machine, as window letter indices (0 - 25)
+class MachineState():
+
+    __slots__ = ('left', 'middle', 'right')
+
+    def __init__(self, left = 0, middle = 0, right = 0):
+        self.left = left
+        self.middle = middle
+        self.right = right
+
+    #returns a MachineState for a 3-tuple of rotor positions (left, middle, right)
+    #positions may be letters or integers, as with Enigma.setRotorPositions
+    @staticmethod
+    def fromRotorPositions(rotorPositions):
+
+        if (not isinstance(rotorPositions, tuple)) or len(rotorPositions) != 3:
+            raise ValueError('Rotor positions must be a 3-tuple of the form (left, middle, right)')
+
+        return MachineState(*(Rotor.validateRotorPosition(position) for position in rotorPositions))
+
+    #returns a MachineState for the rotor positions in a packed state record
+    #raises a ValueError if the record is invalid (as with MachineConfig.fromBytes, so a corrupt
+    #record is caught here rather than failing later in a table lookup)
+    @staticmethod
+    def fromBytes(record):
+        packedstate.validateRecord(record)
+        return MachineState(*record[packedstate.ROTOR_POSITIONS_OFFSET:packedstate.PLUGBOARD_OFFSET])
+
+    #returns the MachineState for an Enigma's current rotor positions
+    @staticmethod
+    def fromEnigma(enigma):
+        return MachineState.fromRotorPositions(enigma.getRotorPositions())
+
+    #returns the rotor positions as a 3-tuple of letters (as with Enigma.getRotorPositions)
+    def getRotorPositions(self):
+        alphabet = Rotor.alphabet
+        return (alphabet[self.left], alphabet[self.middle], alphabet[self.right])
+
+    def copy(self):
+        return MachineState(self.left, self.middle, self.right)
+
+    def __eq__(self, other):
+        if not isinstance(other, MachineState):
+            return NotImplemented
+        return (self.left, self.middle, self.right) == (other.left, other.middle, other.right)
+
+    def __repr__(self):
+        return f'MachineState({self.left}, {self.middle}, {self.right})'
+
+
+#step the rotors of state (using config's notches), following the same rules as Enigma.incrementRotors
+def incrementRotors(config, state):
+
+    _, middleNotch, rightNotch = config.notchPositions
+
+    middleRotates = state.right == rightNotch
+    state.right = (state.right + 1) % 26
+
+    if state.middle == middleNotch:
+        state.left = (state.left + 1) % 26
+        state.middle = (state.middle + 1) % 26
+    elif middleRotates:
+        state.middle = (state.middle + 1) % 26
+
+
+#encode a bytes-like object of letter indices (0 - 25), stepping state as it goes
+#returns the encoded letter indices as bytes
+def encodeIndices(config, state, indices):
+
+    plugboard = config._plugboard
+    reflector = config._reflector
+    leftForward = config._leftForward
+    leftReverse = config._leftReverse
+    middleForward = config._middleForward
+    middleReverse = config._middleReverse
+    rightForward = config._rightForward
+    rightReverse = config._rightReverse
+    _, middleNotch, rightNotch = config.notchPositions
+
+    #work on local copies of the positions, and write them back at the end
+    left = state.left
+    middle = state.middle
+    right = state.right
+
+    encoded = bytearray(len(indices))
+    for offset, letter in enumerate(indices):
+
+        #step the rotors (see incrementRotors)
+        middleRotates = right == rightNotch
+        right = (right + 1) % 26
+        if middle == middleNotch:
+            left = (left + 1) % 26
+            middle = (middle + 1) % 26
+        elif middleRotates:
+            middle = (middle + 1) % 26
+
+        letter = plugboard[letter]
+        letter = rightForward[right][letter]
+        letter = middleForward[middle][letter]
+        letter = leftForward[left][letter]
+        letter = reflector[letter]
+        letter = leftReverse[left][letter]
+        letter = middleReverse[middle][letter]
+        letter = rightReverse[right][letter]
+        encoded[offset] = plugboard[letter]
+
+    state.left = left
+    state.middle = middle
+    state.right = right
+
+    return bytes(encoded)
+
+
+#encode a single letter, stepping state first (as with Enigma.encodeLetter)
+#raises a ValueError if letter is not a single lowercase letter
+def encodeLetter(config, state, letter):
+    Rotor.validateLetter(letter)
+    return Rotor.alphabet[encodeIndices(config, state, (Rotor._letterIndices[letter],))[0]]
+
+
+#encode a message, stepping state as it goes (as with Enigma.encodeMessage)
+#spaces are removed and letters are converted to lowercase
+#raises a ValueError if the message contains anything else
+def encodeMessage(config, state, message):
+    return indicesToMessage(encodeIndices(config, state, messageToIndices(message)))
+
+
+if __name__ == '__main__':
+
+    #test MachineConfig and MachineState against the double-step test Enigma (see enigma.py),
+    #sharing a single config between several threads
+
+    from concurrent.futures import ThreadPoolExecutor
+    from enigma import Enigma
+
+    enigma = Enigma.getDoubleStepEnigma()
+    enigma.plugboard.addPlug('h', 'z')
+    enigma.setRingSettings(('a', 'a', 'z'))
+
+    config = MachineConfig.fromEnigma(enigma)
+    startState = MachineState.fromEnigma(enigma)
+
+    def encodeInThread(message):
+        #each thread gets its own state, but they all share config
+        return encodeMessage(config, startState.copy(), message)
+
+    with ThreadPoolExecutor(4) as executor:
+        print(list(executor.map(encodeInThread, ['hello world'] * 4)))
+    #expected output: ['dqhheprgzu', 'dqhheprgzu', 'dqhheprgzu', 'dqhheprgzu']
+
+    print('hashable (expected True):', hash(config) == hash(MachineConfig.fromBytes(config.toBytes())))
+
+    #configs can be pickled and copied, so they can be passed to worker processes
+    import copy
+    import pickle
+    print('picklable (expected True True):', pickle.loads(pickle.dumps(config)) == config, copy.copy(config) == config)
+
+    #corrupt records are rejected with a ValueError
+    corrupt = bytearray(config.toBytes())
+    corrupt[packedstate.ROTOR_POSITIONS_OFFSET] = 26
+    try:
+        MachineState.fromBytes(corrupt)
+    except ValueError as error:
+        print(error, '(expected a ValueError)')
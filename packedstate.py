@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+#a compact, fixed-width binary format for an Enigma's complete state
+#this is much smaller and faster to create than the dictionary returned by
+#Enigma.getMachineState, which makes it suitable for storing large numbers of
+#states (i.e. in searches and logs)
+#
+#each state is a record of RECORD_SIZE bytes:
+#   byte 0          reflector type (ReflectorType value)
+#   bytes 1 - 3     rotor types (RotorType values), as (left, middle, right)
+#   bytes 4 - 6     ring settings (0 - 25), as (left, middle, right)
+#   bytes 7 - 9     rotor positions as seen in the window (0 - 25), as (left, middle, right)
+#   bytes 10 - 35   plugboard wiring: byte 10 + i is the letter that letter i is plugged to
+#                   (unplugged letters map to themselves, see Plugboard.getWiring)
+#
+#Enigma.toBytes and Enigma.fromBytes convert single machines to and from this format;
+#the functions in this module work on the records themselves
+
+import struct
+
+RECORD_STRUCT = struct.Struct('10B26s')
+RECORD_SIZE = RECORD_STRUCT.size
+
+#offsets of each field within a record
+REFLECTOR_OFFSET = 0
+ROTOR_TYPES_OFFSET = 1
+RING_SETTINGS_OFFSET = 4
+ROTOR_POSITIONS_OFFSET = 7
+PLUGBOARD_OFFSET = 10
+
+#plugboard wiring with no plugs
+NO_PLUGS = bytes(range(26))
+
+
+#build a record from its fields
+#rotorTypes, ringSettings and rotorPositions are 3-tuples of integers (left, middle, right)
+#plugboardWiring is 26 bytes (defaults to no plugs)
+#fields are not validated; use validateRecord if the input is untrusted
+def packRecord(reflectorType, rotorTypes, ringSettings, rotorPositions, plugboardWiring = NO_PLUGS):
+    return bytes((reflectorType, *rotorTypes, *ringSettings, *rotorPositions)) + bytes(plugboardWiring)
+
+
+#split a record into its fields
+#returns a tuple (reflectorType, rotorTypes, ringSettings, rotorPositions, plugboardWiring)
+#in the same format accepted by packRecord
+def unpackRecord(record):
+    return (
+        record[REFLECTOR_OFFSET],
+        tuple(record[ROTOR_TYPES_OFFSET:RING_SETTINGS_OFFSET]),
+        tuple(record[RING_SETTINGS_OFFSET:ROTOR_POSITIONS_OFFSET]),
+        tuple(record[ROTOR_POSITIONS_OFFSET:PLUGBOARD_OFFSET]),
+        bytes(record[PLUGBOARD_OFFSET:RECORD_SIZE])
+    )
+
+
+#raise a ValueError if a record is not a valid machine state
+#(wrong size, unknown reflector or rotor types, out of range settings or invalid plugs)
+def validateRecord(record):
+
+    if len(record) != RECORD_SIZE:
+        raise ValueError(f"Packed state must be exactly {RECORD_SIZE} bytes")
+
+    #these limits match ReflectorType and RotorType
+    if record[REFLECTOR_OFFSET] > 1:
+        raise ValueError("Packed state has an invalid reflector type")
+
+    rotorTypes = record[ROTOR_TYPES_OFFSET:RING_SETTINGS_OFFSET]
+    if max(rotorTypes) > 4:
+        raise ValueError("Packed state has an invalid rotor type")
+
+    if max(record[RING_SETTINGS_OFFSET:PLUGBOARD_OFFSET]) > 25:
+        raise ValueError("Packed state has an invalid ring setting or rotor position")
+
+    wiring = record[PLUGBOARD_OFFSET:RECORD_SIZE]
+    for index, pluggedIndex in enumerate(wiring):
+        if pluggedIndex > 25 or wiring[pluggedIndex] != index:
+            raise ValueError("Packed state has an invalid plugboard wiring")
+
+
+#join many records into a single bytes object
+def joinRecords(records):
+    return b''.join(records)
+
+
+#split a bytes object made by joinRecords back into a list of records
+#returns memoryview slices (no copies are made); use bytes(record) if a copy is needed
+def splitRecords(data):
+
+    if len(data) % RECORD_SIZE != 0:
+        raise ValueError(f"Packed state data must be a multiple of {RECORD_SIZE} bytes")
+
+    view = memoryview(data)
+    return [view[offset:offset + RECORD_SIZE] for offset in range(0, len(data), RECORD_SIZE)]
+
+
+#iterate over the records in a bytes object made by joinRecords,
+#yielding each one as a flat tuple of fields:
+#(reflector, leftType, middleType, rightType, leftRing, middleRing, rightRing,
+# leftPosition, middlePosition, rightPosition, plugboardWiring)
+#this does not create any intermediate objects and is the fastest way to read records in bulk
+def iterRecordFields(data):
+    return RECORD_STRUCT.iter_unpack(data)
+
+
+if __name__ == '__main__':
+
+    #test packed states
+
+    record = packRecord(0, (2, 1, 0), (0, 0, 25), (10, 3, 14))
+    validateRecord(record)
+    print(len(record), 'bytes (expected 36)')
+    print(unpackRecord(record)[:4], '(expected (0, (2, 1, 0), (0, 0, 25), (10, 3, 14)))')
+
+    data = joinRecords([record] * 3)
+    print(len(splitRecords(data)), 'records (expected 3)')
+    print(next(iterRecordFields(data))[:10])
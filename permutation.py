@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+#a permutation of the 26 letters, stored as 26 bytes
+#byte i is the index of the letter that letter i is switched to
+#
+#every part of an Enigma (plugboard, rotors at a given position, reflector) and the machine as
+#a whole at a given position is a permutation, so wirings can be composed, inverted and analysed
+#without going through lettermaps
+#operations are done with bytes.translate where possible, so they are a few C-level array ops
+#
+#permutations are immutable and hashable
+
+from math import lcm
+from string import ascii_lowercase
+
+_alphabet = ascii_lowercase
+_identityBytes = bytes(range(26))
+
+#translation tables padded to 256 bytes (as required by bytes.translate)
+#_shiftTables[k] adds k (mod 26) to every letter index
+_padding = bytes(range(26, 256))
+_shiftTables = tuple(bytes((index + shift) % 26 for index in range(26)) + _padding for shift in range(26))
+
+
+class Permutation():
+
+    __slots__ = ('_table', '_translation')
+
+    #table is a sequence of 26 letter indices (bytes, a list of ints, etc.),
+    #where table[i] is the index that letter i is switched to
+    #defaults to the identity permutation
+    #raises a ValueError if table is not a permutation of 0 - 25
+    def __init__(self, table = _identityBytes):
+
+        table = bytes(table)
+        if len(table) != 26 or set(table) != set(range(26)):
+            raise ValueError("Permutation must contain every letter index (0 - 25) exactly once: {}".format(repr(table)))
+
+        self._setTable(table)
+
+    def _setTable(self, table):
+        self._table = table
+        self._translation = table + _padding
+
+    #like the constructor, but does not validate the table
+    #only for tables that are already known to be valid (e.g. the compiled built-in wirings)
+    @staticmethod
+    def _fromTrustedTable(table):
+        permutation = Permutation.__new__(Permutation)
+        permutation._setTable(bytes(table))
+        return permutation
+
+    #returns the permutation of a lettermap (see LetterSwitcher)
+    #letters that are not in the lettermap are switched to themselves
+    #raises a ValueError if the lettermap does not describe a permutation
+    @staticmethod
+    def fromLettermap(lettermap):
+
+        table = bytearray(_identityBytes)
+        for key, val in lettermap.items():
+            if key not in _alphabet or val not in _alphabet or len(key) != 1 or len(val) != 1:
+                raise ValueError("Lettermap must only contain single lowercase letters: {}".format(repr(lettermap)))
+            table[_alphabet.index(key)] = _alphabet.index(val)
+        return Permutation(table)
+
+    #returns the permutation given as a 26 letter string, where letter i is the output for letter i
+    #(the usual way of writing a wiring, e.g. 'ekmflgdqvzntowyhxuspaibrcj' for rotor I)
+    @staticmethod
+    def fromLetters(letters):
+
+        if len(letters) != 26 or any(letter not in _alphabet for letter in letters):
+            raise ValueError("Permutation must be given as a string of 26 lowercase letters")
+        return Permutation(_alphabet.index(letter) for letter in letters)
+
+    #returns the permutation as 26 bytes
+    def toBytes(self):
+        return self._table
+
+    #returns the permutation as a 26 letter string (see fromLetters)
+    def toLetters(self):
+        return ''.join(_alphabet[index] for index in self._table)
+
+    #returns the permutation as a full lettermap (with an entry for every letter)
+    def toLettermap(self):
+        return {_alphabet[index]: _alphabet[switched] for index, switched in enumerate(self._table)}
+
+    #returns the index that letter index i is switched to
+    def __getitem__(self, index):
+        return self._table[index]
+
+    def __len__(self):
+        return 26
+
+    #switch a single letter
+    def switchLetter(self, letter):
+        return _alphabet[self._table[_alphabet.index(letter)]]
+
+    #switch every letter index in a bytes-like object, returning bytes
+    def permuteIndices(self, indices):
+        return bytes(indices).translate(self._translation)
+
+    #returns the permutation that applies this permutation, then other
+    #(so that parts can be composed in the order the signal passes through them)
+    def compose(self, other):
+        return Permutation._fromTrustedTable(self._table.translate(other._translation))
+
+    #returns the permutation that undoes this one
+    def inverse(self):
+
+        table = bytearray(26)
+        for index, switched in enumerate(self._table):
+            table[switched] = index
+        return Permutation._fromTrustedTable(table)
+
+    #returns this permutation applied exponent times in a row
+    #(negative exponents apply the inverse)
+    def power(self, exponent):
+
+        if exponent < 0:
+            return self.inverse().power(-exponent)
+
+        #square and multiply
+        result = _identityBytes + _padding
+        square = self._translation
+        while exponent:
+            if exponent & 1:
+                result = result.translate(square)
+            square = square.translate(square)
+            exponent >>= 1
+        return Permutation._fromTrustedTable(result[:26])
+
+    #returns this permutation conjugated by a rotation of offset letters:
+    #letters are shifted up by offset on the way in and back down by offset on the way out
+    #this is what a rotor's wiring does when the rotor is turned offset steps from its starting point
+    #(see Rotor.switchLetter)
+    def rotate(self, offset):
+
+        offset %= 26
+        rotated = self._table[offset:] + self._table[:offset]
+        return Permutation._fromTrustedTable(rotated.translate(_shiftTables[-offset]))
+
+    #returns the cycles of this permutation as a list of tuples of letter indices
+    #each cycle starts at its lowest letter and cycles are ordered by their first letter
+    #(fixed points are included as cycles of length 1)
+    def getCycles(self):
+
+        table = self._table
+        visited = bytearray(26)
+        cycles = []
+
+        for start in range(26):
+            if visited[start]:
+                continue
+            cycle = []
+            letter = start
+            while not visited[letter]:
+                visited[letter] = 1
+                cycle.append(letter)
+                letter = table[letter]
+            cycles.append(tuple(cycle))
+
+        return cycles
+
+    #returns the lengths of the cycles, sorted from longest to shortest
+    #two permutations have the same cycle structure exactly when they are conjugates
+    def getCycleStructure(self):
+        return tuple(sorted((len(cycle) for cycle in self.getCycles()), reverse = True))
+
+    #returns the number of times this permutation must be applied to get back to the identity
+    def getOrder(self):
+        return lcm(*(len(cycle) for cycle in self.getCycles()))
+
+    #returns the letter indices that are switched to themselves
+    def getFixedPoints(self):
+        return tuple(index for index, switched in enumerate(self._table) if index == switched)
+
+    #returns True if this permutation is its own inverse
+    #(true of the plugboard, the reflector and the whole machine at any position)
+    def isInvolution(self):
+        return self._table.translate(self._translation) == _identityBytes
+
+    def __eq__(self, other):
+        if not isinstance(other, Permutation):
+            return NotImplemented
+        return self._table == other._table
+
+    def __hash__(self):
+        return hash(self._table)
+
+    def __repr__(self):
+        return "Permutation.fromLetters('{}')".format(self.toLetters())
+
+
+#the permutation that switches every letter to itself
+IDENTITY = Permutation()
+
+
+if __name__ == '__main__':
+
+    #test Permutation
+
+    rotorI = Permutation.fromLetters('ekmflgdqvzntowyhxuspaibrcj')
+
+    print(rotorI.compose(rotorI.inverse()) == IDENTITY, '(expected True)')
+    print(rotorI.power(rotorI.getOrder()) == IDENTITY, '(expected True)')
+    print(rotorI.power(-3) == rotorI.inverse().compose(rotorI.inverse()).compose(rotorI.inverse()), '(expected True)')
+    print(rotorI.getCycleStructure(), '(expected (10, 4, 4, 3, 2, 2, 1))')
+    print(rotorI.rotate(1).toLetters(), '(expected jlekfcpuymsnvxgwtrozhaqbid)')
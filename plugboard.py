@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 from letterswitcher import LetterSwitcher, LettermapException
+from permutation import Permutation
 
 class Plugboard(LetterSwitcher):
 
@@ -26,6 +27,32 @@ class Plugboard(LetterSwitcher):
         lettermap = {}
         super().__init__(lettermap)
 
+        #the plugboard's wiring in integer form, kept in sync with the lettermap
+        #index i holds the index of the letter that letter i is plugged to
+        #(or i itself, if letter i has no plug)
+        self._wiring = bytearray(range(26))
+
+        #True if the lettermap and wiring may be shared with a clone (see clone),
+        #in which case they are copied before they are next changed
+        self._shared = False
+
+    #returns a copy of this plugboard, with the same plugs
+    #the copy shares this plugboard's lettermap and wiring until either of them changes its plugs
+    #(copy-on-write), so cloning is cheap even when the clone is never changed
+    def clone(self):
+        plugboard = Plugboard.__new__(Plugboard)
+        plugboard.lettermap = self.lettermap
+        plugboard._wiring = self._wiring
+        plugboard._shared = self._shared = True
+        return plugboard
+
+    #give this plugboard its own copy of its lettermap and wiring if they may be shared
+    #must be called before changing either of them
+    def _unshare(self):
+        if self._shared:
+            self.lettermap = dict(self.lettermap)
+            self._wiring = bytearray(self._wiring)
+            self._shared = False
 
     #'plug' a letter into another letter; this will swap the 
     #two letters out for each other on both input and output of the enigma
@@ -43,9 +70,15 @@ class Plugboard(LetterSwitcher):
         
         #create plug by adding two entries to the lettermap,
         #so that each letter is associated both ways
+        self._unshare()
         self.lettermap[plugA] = plugB
         self.lettermap[plugB] = plugA
 
+        indexA = self._letterIndices[plugA]
+        indexB = self._letterIndices[plugB]
+        self._wiring[indexA] = indexB
+        self._wiring[indexB] = indexA
+
     #remove a plug that already exists in the lettermap
     #plugLetter can be either of the two letters
     def removePlug(self, pluggedLetter):
@@ -57,9 +90,55 @@ class Plugboard(LetterSwitcher):
         assocLetter = self.lettermap[pluggedLetter]
 
         #remove both entries related to this plug
+        self._unshare()
         del self.lettermap[pluggedLetter]
         del self.lettermap[assocLetter]
 
+        self._wiring[self._letterIndices[pluggedLetter]] = self._letterIndices[pluggedLetter]
+        self._wiring[self._letterIndices[assocLetter]] = self._letterIndices[assocLetter]
+
+    #remove every plug from the plugboard
+    def clearPlugs(self):
+        self._unshare()
+        self.lettermap.clear()
+        self._wiring[:] = range(26)
+
+    #returns the plugboard's wiring as 26 bytes
+    #byte i is the index of the letter that letter i is plugged to
+    #(unplugged letters map to themselves)
+    def getWiring(self):
+        return bytes(self._wiring)
+
+    #returns the plugboard's wiring as a Permutation
+    def getPermutation(self):
+        return Permutation._fromTrustedTable(self._wiring)
+
+    #replace all plugs with the ones described by wiring (in the format returned by getWiring)
+    #raises a ValueError if the wiring does not describe a valid set of plugs
+    def setWiring(self, wiring):
+
+        if len(wiring) != 26:
+            raise ValueError("Plugboard wiring must contain exactly 26 entries")
+
+        #every entry must be a letter index, and plugs must pair letters both ways
+        for index, pluggedIndex in enumerate(wiring):
+            if not 0 <= pluggedIndex < 26 or wiring[pluggedIndex] != index:
+                raise ValueError("Plugboard wiring is invalid: {}".format(repr(wiring)))
+
+        self._setTrustedWiring(wiring)
+
+    #like setWiring, but does not validate the wiring
+    #only for wiring that is already known to be valid
+    def _setTrustedWiring(self, wiring):
+
+        self._unshare()
+        alphabet = self.alphabet
+        self.lettermap.clear()
+        for index, pluggedIndex in enumerate(wiring):
+            if index != pluggedIndex:
+                self.lettermap[alphabet[index]] = alphabet[pluggedIndex]
+        self._wiring[:] = wiring
+
     #method to return all the plugs in this plugboard as a dictionary
     #this is different from getLettermap because it only includes each plug 
     #once (where the lettermap contains mappings for both directions)
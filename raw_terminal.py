@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+#a context manager that keeps the terminal in non-canonical, no-echo mode
+#for as long as it is active (rather than switching modes for every character)
+#input is read in bursts: everything the user has typed (or pasted) so far is
+#returned by a single call to readBurst
+#the terminal is restored when the with block exits, including on Ctrl-C
+#
+#usage:
+#   with RawTerminal() as terminal:
+#       burst = terminal.readBurst()
+class RawTerminal():
+
+    #maximum number of bytes requested from the OS per read
+    readSize = 65536
+
+    def __init__(self, stream = None):
+
+        #the input stream to read from (defaults to stdin)
+        self.stream = stream if stream != None else sys.stdin
+
+        self.fileDescriptor = None
+        self._oldConfig = None
+
+    def __enter__(self):
+
+        #nothing to set up on windows, msvcrt reads keys without echo already
+        if os.name == 'nt':
+            return self
+
+        import termios
+
+        self.fileDescriptor = self.stream.fileno()
+
+        #save a copy of the stream config so we can reset it later
+        self._oldConfig = termios.tcgetattr(self.fileDescriptor)
+
+        #get a copy of the stream config to modify
+        newConfig = termios.tcgetattr(self.fileDescriptor)
+
+        #disable canonical mode (ICANON) and echo (ECHO), as getSingleLetter does
+        #signals (ISIG) are left enabled, so Ctrl-C still raises KeyboardInterrupt
+        #output processing is also left alone, so printed newlines still work normally
+        newConfig[3] = newConfig[3] & ~termios.ICANON & ~termios.ECHO
+
+        #make reads return as soon as at least one byte is available
+        newConfig[6][termios.VMIN] = 1
+        newConfig[6][termios.VTIME] = 0
+
+        termios.tcsetattr(self.fileDescriptor, termios.TCSANOW, newConfig)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.restore()
+        #do not suppress exceptions (i.e. KeyboardInterrupt)
+        return False
+
+    #restore the terminal to the config it had before entering raw mode
+    #safe to call more than once
+    def restore(self):
+        if self._oldConfig != None:
+            import termios
+
+            #TCSAFLUSH also discards any input that was typed but not read
+            termios.tcsetattr(self.fileDescriptor, termios.TCSAFLUSH, self._oldConfig)
+            self._oldConfig = None
+
+    #returns True if there is input waiting to be read
+    #if timeout is given, waits up to that many seconds for input
+    def inputAvailable(self, timeout = 0):
+
+        if os.name == 'nt':
+            import msvcrt
+            return msvcrt.kbhit()
+
+        import select
+        readable, _, _ = select.select([self.fileDescriptor], [], [], timeout)
+        return len(readable) > 0
+
+    #wait for input, then return everything that is available as a single string
+    #a pasted block of text is returned all at once instead of one character at a time
+    #raises KeyboardInterrupt if Ctrl-C is typed
+    def readBurst(self):
+
+        #use windows library if applicable
+        if os.name == 'nt':
+            import msvcrt
+            chars = [msvcrt.getwch()]
+            while msvcrt.kbhit():
+                chars.append(msvcrt.getwch())
+            burst = ''.join(chars)
+
+            #msvcrt does not raise KeyboardInterrupt on its own (see getSingleLetter)
+            if '\x03' in burst:
+                raise KeyboardInterrupt
+            return burst
+
+        #block until at least one byte has been typed,
+        #then keep reading until nothing more is immediately available
+        chunks = [os.read(self.fileDescriptor, self.readSize)]
+        while self.inputAvailable():
+            chunk = os.read(self.fileDescriptor, self.readSize)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        return b''.join(chunks).decode('utf-8', errors = 'replace')
+
+
+if __name__ == '__main__':
+
+    #test RawTerminal by echoing bursts until Ctrl-C is typed
+
+    print("Type or paste something (Ctrl-C to quit)")
+    with RawTerminal() as terminal:
+        try:
+            while True:
+                burst = terminal.readBurst()
+                print(f"read {len(burst)} chars: {repr(burst[:40])}")
+        except KeyboardInterrupt:
+            pass
+    print("terminal restored")
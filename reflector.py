@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
-from letterswitcher import LetterSwitcher
+from letterswitcher import LetterSwitcher, LettermapException
+from permutation import Permutation
 from enum import Enum
+from types import MappingProxyType
 
 #define an enumeration for the different types of Reflector 
 #that are currently supported 
@@ -43,13 +45,51 @@ class Reflector(LetterSwitcher):
 
     
     #return the lettermap for a specified ReflectorType
+    #a copy is returned, as the built-in lettermaps are shared by every Reflector instance
     @classmethod
     def getReflectorLettermap(cls, reflectorType):
 
         #get reflector type as an int (and validate)
         reflectorType = cls.validateReflectorType(reflectorType)
 
-        return cls._reflectorLettermaps[reflectorType]
+        return dict(cls._reflectorLettermaps[reflectorType])
+
+    #return the compiled wiring for a specified ReflectorType
+    #as a tuple of 26 integers (see Rotor.getRotorWiring)
+    #a reflector's wiring is its own inverse, so there is no reverse wiring
+    @classmethod
+    def getReflectorWiring(cls, reflectorType):
+
+        #get reflector type as an int (and validate)
+        reflectorType = cls.validateReflectorType(reflectorType)
+
+        return cls._reflectorWirings[reflectorType]
+
+    #validates the built-in lettermaps and compiles them into immutable shared tables
+    #this is called exactly once, when this module is imported (see below the class definition)
+    #raises LettermapException if a built-in lettermap is invalid
+    @classmethod
+    def _compileBuiltinWirings(cls):
+
+        wirings = []
+
+        for lettermap in cls._reflectorLettermaps:
+
+            #reflector lettermaps must cover every letter, swap letters in pairs,
+            #and never map a letter to itself
+            isValid = (cls.lettermapIsValid(lettermap)
+                and len(lettermap) == 26
+                and all(lettermap[val] == key and val != key for key, val in lettermap.items()))
+
+            if not isValid:
+                raise LettermapException("Built-in reflector lettermap is invalid: {}".format(repr(lettermap)))
+
+            wirings.append(tuple(cls._letterIndices[lettermap[letter]] for letter in cls.alphabet))
+
+        cls._reflectorWirings = tuple(wirings)
+
+        #replace the lettermaps with read-only views, as they are shared by every instance
+        cls._reflectorLettermaps = tuple(MappingProxyType(lettermap) for lettermap in cls._reflectorLettermaps)
 
     #override constructor to require a reflectorType and automatically
     #set the correct lettermap
@@ -59,9 +99,24 @@ class Reflector(LetterSwitcher):
         #this is done so creation of identical reflectors is easy
         self.reflectorType = self.validateReflectorType(reflectorType)
 
-        lettermap = self.getReflectorLettermap(reflectorType)
+        #keep a reference to the shared compiled wiring for this reflector type
+        self._wiring = self._reflectorWirings[self.reflectorType]
+
+        #the built-in lettermaps were validated at import, so validation is skipped here
+        super().__init__()
+        self._setTrustedLettermap(self._reflectorLettermaps[self.reflectorType])
+
+    #override switchLetter to use the compiled wiring
+    def switchLetter(self, letter):
+
+        #raise exception if letter is not a single lowercase letter
+        self.validateLetter(letter)
 
-        super().__init__(lettermap)
+        return self.alphabet[self._wiring[self._letterIndices[letter]]]
+
+    #returns the reflector's wiring as a Permutation
+    def getPermutation(self):
+        return Permutation._fromTrustedTable(self._wiring)
 
     
     #override methods related to the 'decoder' lettermap (a.k.a. reverse lettermap)
@@ -77,6 +132,15 @@ class Reflector(LetterSwitcher):
     def switchLetterReverse(self, letter):
         return self.switchLetter(letter)
 
+    #reflectors are pickled (and deep-copied) by their type, as the shared built-in lettermaps
+    #are read-only views, which cannot be pickled
+    def __reduce__(self):
+        return (Reflector, (self.reflectorType,))
+
+
+#validate and compile the built-in wirings once, at import
+Reflector._compileBuiltinWirings()
+
 
 if __name__ == '__main__':
 
@@ -85,4 +149,10 @@ if __name__ == '__main__':
     encoder = Reflector(ReflectorType.B)
 
     print(encoder.switchLetter('a'))
-    print(encoder.switchLetter('y'))
\ No newline at end of file
+    print(encoder.switchLetter('y'))
+
+    #reflectors can be pickled and copied
+    import copy
+    import pickle
+    print(copy.deepcopy(encoder).switchLetter('a'), pickle.loads(pickle.dumps(encoder)).switchLetter('a'))
+    #expected output: y y
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+#a catalog of the "characteristics" used by Marian Rejewski's characteristic method
+#
+#with doubled indicators, the 1st and 4th letters of every indicator are the same message key
+#letter encrypted at the 1st and 4th positions after the ground setting
+#so if A1 to A6 are the machine's permutations at those 6 positions, the 4th indicator letter
+#is always A4(A1(1st letter)); this product is called AD (and likewise BE = A5.A2, CF = A6.A3)
+#the cycle structure of AD, BE and CF (the characteristic) does not depend on the plugboard,
+#so it can be cataloged for every rotor order and ground setting ahead of time
+#given a day's characteristic, the catalog then returns the few keys that produce it
+#
+#the catalog assumes ring settings of A-01 (so positions are rotor core positions),
+#and uses this project's exact stepping (including middle rotor turnovers)
+#
+#the catalog is stored on disk in the following format (all integers unsigned, 4 bytes, native order):
+#   8 bytes     MAGIC
+#   4 bytes     byte order check (BYTE_ORDER_CHECK)
+#   4 bytes     number of reflector types (r)
+#   4 bytes     number of rotor orders (o)
+#   r bytes     reflector types, followed by 3 * o bytes of rotor orders, padded to 4 bytes
+#   offsets     CHARACTERISTIC_COUNT + 1 integers; the keys with characteristic c are
+#               entries[offsets[c]:offsets[c + 1]]
+#   entries     key numbers: (reflectorIndex * o + rotorOrderIndex) * 17576 + position index
+
+import os
+from array import array
+from itertools import permutations
+
+from enigma import Enigma
+from scrambler_table import ScramblerTable, POSITION_COUNT, getRotorPositions, messageToIndices
+
+MAGIC = b'ENIGREJ1'
+BYTE_ORDER_CHECK = 0x01020304
+
+
+#returns every partition of n as a tuple of tuples (each sorted from largest to smallest)
+def getPartitions(n, largest = None):
+
+    if largest == None:
+        largest = n
+    if n == 0:
+        return ((),)
+
+    partitions = []
+    for first in range(min(n, largest), 0, -1):
+        for rest in getPartitions(n - first, first):
+            partitions.append((first,) + rest)
+    return tuple(partitions)
+
+
+#AD, BE and CF are products of two fixed-point-free involutions (reflections), so their cycles
+#always come in pairs of the same length; a cycle structure is therefore stored as the
+#partition of 13 made of the lengths of each pair
+PARTITIONS = getPartitions(13)
+_partitionIndices = {partition: index for index, partition in enumerate(PARTITIONS)}
+
+#number of possible characteristics (3 cycle structures)
+CHARACTERISTIC_COUNT = len(PARTITIONS) ** 3
+
+
+#returns the cycle lengths of a permutation of 26 letter indices, from largest to smallest
+def getCycleStructure(permutation):
+
+    visited = bytearray(26)
+    lengths = []
+
+    for start in range(26):
+        if visited[start]:
+            continue
+        length = 0
+        letter = start
+        while not visited[letter]:
+            visited[letter] = 1
+            letter = permutation[letter]
+            length += 1
+        lengths.append(length)
+
+    lengths.sort(reverse = True)
+    return tuple(lengths)
+
+
+#returns the index of a cycle structure (as returned by getCycleStructure, or as a partition of 13)
+#raises a ValueError if it is not a possible cycle structure for AD, BE or CF
+def getCycleStructureIndex(cycleStructure):
+
+    if not isinstance(cycleStructure, (tuple, list)):
+        raise ValueError("A cycle structure must be a tuple of cycle lengths")
+
+    cycleStructure = tuple(sorted(cycleStructure, reverse = True))
+
+    #convert the full cycle structure to a partition of 13 by taking every other cycle
+    if sum(cycleStructure) == 26:
+        if cycleStructure[0::2] != cycleStructure[1::2]:
+            raise ValueError("Cycles of a characteristic must come in pairs of the same length")
+        cycleStructure = cycleStructure[0::2]
+
+    if cycleStructure not in _partitionIndices:
+        raise ValueError(f"{repr(cycleStructure)} is not a valid cycle structure")
+    return _partitionIndices[cycleStructure]
+
+
+#returns the index of a characteristic, given as 3 cycle structures (AD, BE, CF)
+#raises a ValueError if it is not a valid characteristic (including None, which
+#getCharacteristicFromIndicators returns when there are too few indicators)
+def getCharacteristicIndex(characteristic):
+
+    if not isinstance(characteristic, (tuple, list)) or len(characteristic) != 3:
+        raise ValueError("A characteristic must have 3 cycle structures (AD, BE, CF)")
+
+    index = 0
+    for cycleStructure in characteristic:
+        index = index * len(PARTITIONS) + getCycleStructureIndex(cycleStructure)
+    return index
+
+
+#returns the characteristic of a day's traffic from its doubled (6-letter) indicators
+#as a tuple of 3 cycle structures (AD, BE, CF)
+#returns None if there are not enough different indicators to fully determine it
+#(usually around 60 to 80 are needed)
+def getCharacteristicFromIndicators(indicators):
+
+    products = [bytearray(b'\xff' * 26) for _ in range(3)]
+
+    for indicator in indicators:
+        indices = messageToIndices(indicator)
+        if len(indices) != 6:
+            raise ValueError("Indicators must be 6 letters long")
+        for product, first, second in zip(products, indices[0:3], indices[3:6]):
+            product[first] = second
+
+    if any(0xff in product for product in products):
+        return None
+    return tuple(getCycleStructure(product) for product in products)
+
+
+#returns the characteristic index of every ground setting for one reflector type and rotor order
+#(rotorOrder is a 3-tuple of rotor types as (left, middle, right))
+#as an array indexed by position index
+def computeCharacteristics(reflectorType, rotorOrder):
+
+    enigma = Enigma()
+    enigma.setReflector(reflectorType)
+    enigma.setLeftRotor(rotorOrder[0])
+    enigma.setMiddleRotor(rotorOrder[1])
+    enigma.setRightRotor(rotorOrder[2])
+    table = ScramblerTable(enigma)
+
+    permutations = table.permutations
+    nextPositions = table.nextPositions
+    padding = bytes(256 - 26)
+
+    #the cycle structure index of the product A4.A1 for every position the first
+    #indicator letter can be encrypted at
+    #BE and CF for a ground setting are just AD for the next two positions, so AD
+    #is all that has to be computed
+    adStructures = array('B', bytes(POSITION_COUNT))
+    for position in range(POSITION_COUNT):
+        fourthPosition = nextPositions[nextPositions[nextPositions[position]]]
+        first = permutations[position * 26:position * 26 + 26]
+        fourth = permutations[fourthPosition * 26:fourthPosition * 26 + 26]
+
+        #bytes.translate composes the two permutations in a single C call
+        product = first.translate(fourth + padding)
+        adStructures[position] = getCycleStructureIndex(getCycleStructure(product))
+
+    partitionCount = len(PARTITIONS)
+    characteristics = array('I', bytes(4 * POSITION_COUNT))
+    for groundSetting in range(POSITION_COUNT):
+        first = nextPositions[groundSetting]
+        second = nextPositions[first]
+        third = nextPositions[second]
+        characteristics[groundSetting] = ((adStructures[first] * partitionCount
+            + adStructures[second]) * partitionCount + adStructures[third])
+
+    return characteristics
+
+
+#used by buildCatalog to run computeCharacteristics in worker processes
+def _computeCharacteristicsInWorker(arguments):
+    return computeCharacteristics(*arguments)
+
+
+#compute the characteristic of every reflector type, rotor order and ground setting,
+#and write the catalog to the file at path
+#reflectorTypes and rotorTypes limit the catalog to the specified types
+#(defaults to reflector B and every supported rotor)
+#rotor orders are computed in parallel by a pool of processes (processes defaults to the number of CPUs)
+def buildCatalog(path, reflectorTypes = (0,), rotorTypes = None, processes = None):
+
+    from rotor import Rotor
+    from reflector import Reflector
+
+    if rotorTypes == None:
+        rotorTypes = range(len(Rotor._rotorWirings))
+
+    reflectorTypes = tuple(Reflector.validateReflectorType(reflectorType) for reflectorType in reflectorTypes)
+    rotorOrders = tuple(permutations((Rotor.validateRotorType(rotorType) for rotorType in rotorTypes), 3))
+
+    jobs = [(reflectorType, rotorOrder) for reflectorType in reflectorTypes for rotorOrder in rotorOrders]
+
+    if processes == 1:
+        results = [_computeCharacteristicsInWorker(job) for job in jobs]
+    else:
+        from multiprocessing import Pool
+        with Pool(processes) as pool:
+            results = pool.map(_computeCharacteristicsInWorker, jobs)
+
+    #group the keys by characteristic with a counting sort
+    counts = array('I', bytes(4 * (CHARACTERISTIC_COUNT + 1)))
+    for characteristics in results:
+        for characteristic in characteristics:
+            counts[characteristic + 1] += 1
+
+    offsets = counts
+    for index in range(1, CHARACTERISTIC_COUNT + 1):
+        offsets[index] += offsets[index - 1]
+
+    nextSlot = array('I', offsets)
+    entries = array('I', bytes(4 * offsets[-1]))
+    for jobIndex, characteristics in enumerate(results):
+        keyBase = jobIndex * POSITION_COUNT
+        for position, characteristic in enumerate(characteristics):
+            entries[nextSlot[characteristic]] = keyBase + position
+            nextSlot[characteristic] += 1
+
+    #write the catalog
+    typeBytes = bytes(reflectorTypes) + bytes(rotorType for rotorOrder in rotorOrders for rotorType in rotorOrder)
+    typeBytes += bytes(-len(typeBytes) % 4)
+
+    with open(path, 'wb') as catalogFile:
+        catalogFile.write(MAGIC)
+        catalogFile.write(array('I', (BYTE_ORDER_CHECK, len(reflectorTypes), len(rotorOrders))).tobytes())
+        catalogFile.write(typeBytes)
+        catalogFile.write(offsets.tobytes())
+        catalogFile.write(entries.tobytes())
+
+
+#a catalog written by buildCatalog
+#the file is memory-mapped, so only the parts that are looked up are ever read from disk
+class CharacteristicCatalog():
+
+    def __init__(self, path):
+        import mmap
+
+        with open(path, 'rb') as catalogFile:
+            self._map = mmap.mmap(catalogFile.fileno(), 0, access = mmap.ACCESS_READ)
+
+        view = memoryview(self._map)
+        if bytes(view[0:8]) != MAGIC:
+            raise ValueError(f"{path} is not a characteristic catalog")
+
+        byteOrderCheck, reflectorCount, rotorOrderCount = view[8:20].cast('I')
+        if byteOrderCheck != BYTE_ORDER_CHECK:
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+
+        offset = 20
+        self.reflectorTypes = tuple(view[offset:offset + reflectorCount])
+        offset += reflectorCount
+        rotorOrderBytes = view[offset:offset + 3 * rotorOrderCount]
+        self.rotorOrders = tuple(tuple(rotorOrderBytes[index:index + 3]) for index in range(0, len(rotorOrderBytes), 3))
+        offset += 3 * rotorOrderCount
+        offset += -offset % 4
+
+        offsetsSize = 4 * (CHARACTERISTIC_COUNT + 1)
+        self._offsets = view[offset:offset + offsetsSize].cast('I')
+        self._entries = view[offset + offsetsSize:].cast('I')
+
+    #returns the number of keys in the catalog
+    def getSize(self):
+        return len(self._entries)
+
+    #returns every key with the specified characteristic
+    #(3 cycle structures (AD, BE, CF), as returned by getCharacteristicFromIndicators)
+    #raises a ValueError if the characteristic is not valid (see getCharacteristicIndex)
+    #as a list of tuples (reflectorType, rotorOrder, groundSetting), where groundSetting
+    #is a 3-tuple of letters (as returned by Enigma.getRotorPositions)
+    def lookup(self, characteristic):
+
+        characteristicIndex = getCharacteristicIndex(characteristic)
+        start = self._offsets[characteristicIndex]
+        stop = self._offsets[characteristicIndex + 1]
+
+        rotorOrderCount = len(self.rotorOrders)
+        keys = []
+        for key in self._entries[start:stop]:
+            job, position = divmod(key, POSITION_COUNT)
+            reflectorIndex, rotorOrderIndex = divmod(job, rotorOrderCount)
+            keys.append((self.reflectorTypes[reflectorIndex], self.rotorOrders[rotorOrderIndex],
+                getRotorPositions(position)))
+        return keys
+
+    #release the memory map
+    def close(self):
+        self._offsets.release()
+        self._entries.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+
+if __name__ == '__main__':
+
+    #test the catalog with a small set of rotors
+
+    import tempfile
+    from rotor import Rotor
+
+    path = os.path.join(tempfile.mkdtemp(), 'catalog.bin')
+    buildCatalog(path, rotorTypes = (0, 1, 2), processes = 1)
+
+    #generate a day's indicators with a known key, and message keys that start with every letter
+    #in every position (so the characteristic is fully determined)
+    dailyKey = Enigma()
+    dailyKey.setReflector(0)
+    dailyKey.setLeftRotor(1)
+    dailyKey.setMiddleRotor(2)
+    dailyKey.setRightRotor(0)
+    dailyKey.plugboard.addPlug('a', 'k')
+    dailyKey.plugboard.addPlug('f', 'x')
+
+    indicators = []
+    for index, letter in enumerate(Rotor.alphabet):
+        dailyKey.setRotorPositions(('q', 'd', 'c'))
+        messageKey = letter + Rotor.alphabet[(index * 7) % 26] + Rotor.alphabet[(index * 11 + 5) % 26]
+        indicators.append(dailyKey.encodeMessage(messageKey * 2))
+
+    characteristic = getCharacteristicFromIndicators(indicators)
+    if characteristic == None:
+        raise SystemExit('not enough indicators to determine the characteristic')
+    print('characteristic:', characteristic)
+
+    with CharacteristicCatalog(path) as catalog:
+        print(catalog.getSize(), 'keys in catalog')
+        print('candidates:', catalog.lookup(characteristic))
+        #expected output includes (0, (1, 2, 0), ('q', 'd', 'c'))
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
 from letterswitcher import LetterSwitcher, LettermapException
+from permutation import Permutation
 
 from enum import Enum
+from types import MappingProxyType
 
 #define an enumeration for the 
 #different types of rotors supported
@@ -66,13 +68,65 @@ class Rotor(LetterSwitcher):
     
         
     #returns the pre-defined rotor lettermaps for the different supported rotors
+    #a copy is returned, as the built-in lettermaps are shared by every Rotor instance
     @classmethod
     def getRotorLettermap(cls, rotorType):
     
         #get rotor type as an integer (and validate)
         rotorType = cls.validateRotorType(rotorType)
         
-        return cls.__rotorLetterMaps[rotorType]
+        return dict(cls.__rotorLetterMaps[rotorType])
+
+    #returns the compiled wiring for the specified rotor type
+    #as a tuple of 26 integers; index i holds the index of the letter that
+    #letter i is switched to (this is the lettermap in integer form)
+    @classmethod
+    def getRotorWiring(cls, rotorType):
+
+        #get rotor type as an integer (and validate)
+        rotorType = cls.validateRotorType(rotorType)
+
+        return cls._rotorWirings[rotorType]
+
+    #like getRotorWiring, but returns the compiled reverse wiring
+    #(the integer form of the decoder lettermap)
+    @classmethod
+    def getRotorReverseWiring(cls, rotorType):
+
+        #get rotor type as an integer (and validate)
+        rotorType = cls.validateRotorType(rotorType)
+
+        return cls._rotorReverseWirings[rotorType]
+
+    #validates the built-in lettermaps and compiles them into immutable shared tables
+    #this is called exactly once, when this module is imported (see below the class definition)
+    #because the built-in wirings are validated here, creating a Rotor does not validate again
+    #raises LettermapException if a built-in lettermap is invalid
+    @classmethod
+    def _compileBuiltinWirings(cls):
+
+        wirings = []
+        reverseWirings = []
+
+        for lettermap in cls.__rotorLetterMaps:
+
+            if not cls.lettermapIsValid(lettermap):
+                raise LettermapException("Built-in rotor lettermap is invalid: {}".format(repr(lettermap)))
+
+            #convert the lettermap to a tuple of integers (and build its inverse)
+            wiring = tuple(cls._letterIndices[lettermap[letter]] for letter in cls.alphabet)
+            reverseWiring = [0] * 26
+            for srcIndex, dstIndex in enumerate(wiring):
+                reverseWiring[dstIndex] = srcIndex
+
+            wirings.append(wiring)
+            reverseWirings.append(tuple(reverseWiring))
+
+        cls._rotorWirings = tuple(wirings)
+        cls._rotorReverseWirings = tuple(reverseWirings)
+
+        #replace the lettermaps with read-only views, as they are shared by every instance
+        cls.__rotorLetterMaps = tuple(MappingProxyType(lettermap) for lettermap in cls.__rotorLetterMaps)
     
                 
     #returns the pre-defined rotor notch positions for the
@@ -103,15 +157,13 @@ class Rotor(LetterSwitcher):
         #useful for debugging
         self.rotorType = rotorType
         
-        #set the lettermap var to be passed to the
-        #super constructor method
-        #calling getRotorLettermap will throw a ValueError
-        #if rotorType is invalid
-        lettermap = self.getRotorLettermap(rotorType)
+        #get rotor type as an integer
+        #this will throw a ValueError if rotorType is invalid
+        rotorTypeIndex = self.validateRotorType(rotorType)
         
         #set the notch position of this rotor to the predefined notch position 
         #for this particular rotor type
-        self.notchPosition = self.getRotorNotchPos(rotorType)
+        self.notchPosition = self.__rotorNotchPositions[rotorTypeIndex]
         #note: notch position being stored as a single value disallows
         #the use of rotors with multiple notches
         #multi-notched rotors were created, but are not supported at this time
@@ -127,9 +179,20 @@ class Rotor(LetterSwitcher):
         #initialize ring setting (sometimes called ringstellung)
         #this affects the 
         self.ringSetting = 0
+
+        #keep the rotor type as an integer as well,
+        #as rotorType may be either a RotorType or an integer
+        self.rotorTypeIndex = rotorTypeIndex
+
+        #keep references to the shared compiled wirings for this rotor type
+        #these are used by switchLetter and switchLetterReverse
+        self._wiring = self._rotorWirings[rotorTypeIndex]
+        self._reverseWiring = self._rotorReverseWirings[rotorTypeIndex]
         
-        #run super constructor (this sets the lettermap)
-        super().__init__(lettermap)
+        #run super constructor, then set the shared built-in lettermap
+        #the built-in lettermaps were validated at import, so validation is skipped here
+        super().__init__()
+        self._setTrustedLettermap(self.__rotorLetterMaps[rotorTypeIndex])
 
 
     #given a letter, uses the rotorPosition instance var
@@ -175,6 +238,28 @@ class Rotor(LetterSwitcher):
         if self.rotorPosition == 26:
             self.rotorPosition = 0
 
+    #returns a copy of this rotor, with the same type, ring setting and position
+    #the wiring tables and lettermap are shared, as they are never modified
+    #(this skips __init__, so it is much cheaper than creating a new rotor)
+    def clone(self):
+        rotor = Rotor.__new__(Rotor)
+        rotor.__dict__ = self.__dict__.copy()
+        return rotor
+
+    #rotors are pickled (and deep-copied) by their type, ring setting and position, as the shared
+    #built-in lettermaps are read-only views, which cannot be pickled
+    def __reduce__(self):
+        return (Rotor._fromState, (self.rotorType, self.ringSetting, self.rotorPosition))
+
+    #creates a rotor from the state saved by __reduce__
+    #(rotorPosition is the internal position, without the ring setting)
+    @staticmethod
+    def _fromState(rotorType, ringSetting, rotorPosition):
+        rotor = Rotor(rotorType)
+        rotor.ringSetting = ringSetting
+        rotor.rotorPosition = rotorPosition
+        return rotor
+
     #like incrementRotor, but the value goes down
     #keeps it within the range 0 - 25 inclusive (see above)
     def decementRotor(self):
@@ -252,7 +337,7 @@ class Rotor(LetterSwitcher):
     #returns true if the notch is in a position one click AFTER it would've incremented the next rotor
     #useful for decrementing rotors
     def notchInReversePosition(self):
-        return (self.rotorPosition + self.ringSetting) % 26 == (self.notchPosition + 1)
+        return (self.rotorPosition + self.ringSetting) % 26 == (self.notchPosition + 1) % 26
     
     #applies ring setting to a letter
     #given the letter coming out of the rotor's internal wiring,
@@ -270,44 +355,57 @@ class Rotor(LetterSwitcher):
 
     
     #override switchLetter to include rotation
+    #this is equivalent to running the letter through getRotatedLetter,
+    #the internal wiring, applyRing and then _getOutputLetter, but uses the compiled wiring
+    #(note that the ring setting cancels out: applyRing adds it and _getOutputLetter subtracts it)
     def switchLetter(self, letter):
         
-        #apply rotation to input
-        letter = self.getRotatedLetter(letter)
-        
-        #swap letter according to internal wiring
-        letter = super().switchLetter(letter)
-        
-        #apply ring setting rotation to output
-        letter = self.applyRing(letter)
+        #raise exception if letter is not valid
+        self.validateLetter(letter)
+
+        #apply rotation to input and swap letter according to internal wiring
+        rotatedIndex = (self._letterIndices[letter] + self.rotorPosition) % 26
+        switchedIndex = self._wiring[rotatedIndex]
 
         #apply full rotor rotation to output and return
-        return self._getOutputLetter(letter)
+        return self.alphabet[(switchedIndex - self.rotorPosition) % 26]
 
     #override switchLetterReverse to include rotation
     #this is important as signals travel through all 3 rotors forward AND back
     #on each keypress
+    #uses the compiled reverse wiring, so no decoder lettermap is built on each call
     def switchLetterReverse(self, letter):
 
-        
-        letter = self.getRotatedLetter(letter)
-
-        letter = super().switchLetterReverse(letter)
-
-        letter = self._getOutputLetter(letter)
+        #raise exception if letter is not valid
+        self.validateLetter(letter)
 
-        letter = self.applyRing(letter)
+        rotatedIndex = (self._letterIndices[letter] + self.rotorPosition) % 26
+        switchedIndex = self._reverseWiring[rotatedIndex]
 
-        return letter
+        return self.alphabet[(switchedIndex - self.rotorPosition) % 26]
         
         
     
+    #returns the rotor's switching at its current rotation as a Permutation
+    #(the wiring conjugated by the rotation, matching switchLetter)
+    def getPermutation(self):
+        return Permutation._fromTrustedTable(self._wiring).rotate(self.rotorPosition)
+
+    #returns the rotor's reverse switching at its current rotation as a Permutation
+    #(matching switchLetterReverse; the inverse of getPermutation)
+    def getReversePermutation(self):
+        return Permutation._fromTrustedTable(self._reverseWiring).rotate(self.rotorPosition)
+
     #disable the switchSeqence method for rotors, 
     # as it shouldn't be used due to an inability
     # to check when the next rotor should turn
     #TODO: fix Rotor.switchSequence so that it can be used
     def switchSequence(self):
         raise NotImplementedError("Rotor.switchSequence is not implemented")
+
+
+#validate and compile the built-in wirings once, at import
+Rotor._compileBuiltinWirings()
     
 
 if __name__ == '__main__':
@@ -340,4 +438,9 @@ if __name__ == '__main__':
     
     switchedLetter = encode.switchLetterReverse('w')
     print('switch letter reverse (expected a):', switchedLetter)
-    
\ No newline at end of file
+
+    #rotors can be pickled and copied
+    import copy
+    import pickle
+    for copied in (copy.deepcopy(encode), pickle.loads(pickle.dumps(encode))):
+        print('copied rotor (expected w a):', copied.switchLetter('a'), copied.switchLetterReverse('w'))
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+#bulk generation of the sequence of rotor positions an Enigma steps through
+#
+#the trace for n steps is the rotor positions after each of the first n steps, i.e. the positions
+#at which each letter of an n letter message is encoded (the rotors step before every letter)
+#
+#the left and middle rotors rarely turn, so the trace is made of runs in which only the right
+#rotor moves; each run is worked out directly from the notch positions rather than step by step
+#the rotor positions also repeat with a period of at most 26 * 25 * 26 = 16,900 steps
+#(after at most a few steps, if the machine starts in a position the double step skips),
+#so full traces are built from one period of runs and then repeated
+#
+#traces are bytes objects and arrays rather than NumPy arrays, to keep to the standard library
+
+from array import array
+
+from rotor import Rotor
+
+#the right rotor positions from 0 to 25, twice, so any run of up to 26 positions is a slice
+_rightPattern = bytes(range(26)) * 2
+
+
+class RotorTrace():
+
+    #notchPositions is a 3-tuple of the window letter indices (left, middle, right)
+    #at which each rotor turns the next one (see Rotor.notchPosition)
+    #rotorPositions is a 3-tuple of the starting rotor positions (left, middle, right),
+    #as accepted by Enigma.setRotorPositions
+    def __init__(self, notchPositions, rotorPositions):
+
+        if (not isinstance(rotorPositions, tuple)) or len(rotorPositions) != 3:
+            raise ValueError('Rotor positions must be a 3-tuple of the form (left, middle, right)')
+
+        self.notchPositions = tuple(notchPositions)
+        self.rotorPositions = tuple(Rotor.validateRotorPosition(position) for position in rotorPositions)
+
+        #the runs up to the end of the first period, and the steps at which the period
+        #starts and ends (see _findPeriod); only computed when a full trace is first needed
+        self._periodRuns = None
+        self._periodPositionIndices = None
+        self._periodStart = None
+        self._periodEnd = None
+
+    #returns the RotorTrace for an Enigma, starting from its current rotor positions
+    @staticmethod
+    def fromEnigma(enigma):
+        enigma.validateEnigmaSetup()
+        return RotorTrace(
+            tuple(rotor.notchPosition for rotor in enigma.getRotors()),
+            tuple(Rotor.alphabet.index(position) for position in enigma.getRotorPositions()))
+
+    #returns the positions after a single step from (left, middle, right),
+    #using the same rules as Enigma.incrementRotors (including the double step)
+    def _step(self, left, middle, right):
+
+        _, middleNotch, rightNotch = self.notchPositions
+
+        middleRotates = right == rightNotch
+        right = (right + 1) % 26
+
+        if middle == middleNotch:
+            left = (left + 1) % 26
+            middle = (middle + 1) % 26
+        elif middleRotates:
+            middle = (middle + 1) % 26
+
+        return (left, middle, right)
+
+    #yields the trace for steps steps (or forever, if steps is None) in run-length form
+    #each run is a tuple (length, left, middle, right): the left and middle rotors stay at left and
+    #middle for length steps, while the right rotor goes through right, right + 1, ... (mod 26)
+    def iterRuns(self, steps = None):
+
+        _, middleNotch, rightNotch = self.notchPositions
+        left, middle, right = self._step(*self.rotorPositions)
+
+        remaining = steps
+        while remaining != 0:
+
+            #the middle rotor turns on the step after the right rotor shows its notch,
+            #or straight away if the middle rotor shows its own notch (the double step)
+            if middle == middleNotch:
+                length = 1
+            else:
+                length = (rightNotch - right) % 26 + 1
+
+            if remaining != None:
+                length = min(length, remaining)
+                remaining -= length
+
+            yield (length, left, middle, right)
+
+            #step to the first positions of the next run
+            left, middle, right = self._step(left, middle, (right + length - 1) % 26)
+
+    #find where the trace starts repeating
+    #the trace is periodic once a run starts at the same positions as an earlier one
+    def _findPeriod(self):
+
+        runs = []
+        runStarts = {}
+        step = 0
+
+        for run in self.iterRuns():
+            positions = run[1:]
+            if positions in runStarts:
+                self._periodStart = runStarts[positions]
+                break
+            runStarts[positions] = step
+            runs.append(run)
+            step += run[0]
+
+        self._periodRuns = runs
+        self._periodEnd = step
+
+    #extends a trace covering everything up to the end of the first period to steps steps,
+    #by repeating the period
+    #trace is a bytes object or array (anything that supports slicing, + and *)
+    def _repeatPeriod(self, trace, steps):
+
+        if steps <= len(trace):
+            return trace[:steps]
+
+        period = trace[self._periodStart:]
+        repeats, remainder = divmod(steps - len(trace), len(period))
+        return trace + period * repeats + period[:remainder]
+
+    #returns the trace for steps steps as a tuple of 3 bytes objects (left, middle, right),
+    #each holding the window letter index of one rotor at every step
+    def getRotorPositions(self, steps):
+
+        if self._periodRuns == None:
+            self._findPeriod()
+
+        lefts = []
+        middles = []
+        rights = []
+        for length, left, middle, right in self._periodRuns:
+            lefts.append(bytes((left,)) * length)
+            middles.append(bytes((middle,)) * length)
+            rights.append(_rightPattern[right:right + length])
+
+        return tuple(self._repeatPeriod(b''.join(trace), steps) for trace in (lefts, middles, rights))
+
+    #returns the position index trace up to the end of the first period (see getPositionIndices)
+    def _getPeriodPositionIndices(self):
+
+        if self._periodRuns == None:
+            self._findPeriod()
+
+        if self._periodPositionIndices == None:
+            trace = array('H')
+            for length, left, middle, right in self._periodRuns:
+                base = left * 676 + middle * 26
+                trace.extend(base + position for position in _rightPattern[right:right + length])
+            self._periodPositionIndices = trace
+
+        return self._periodPositionIndices
+
+    #returns the trace for steps steps as an array of position indices
+    #(left * 676 + middle * 26 + right, as used by ScramblerTable)
+    def getPositionIndices(self, steps):
+        return self._repeatPeriod(self._getPeriodPositionIndices(), steps)
+
+    #returns the part of the trace from step start up to (not including) step stop,
+    #as an array of position indices
+    #this gives the same result as getPositionIndices(stop)[start:],
+    #but the steps before start are skipped over using the period
+    def getPositionIndexRange(self, start, stop):
+
+        trace = self._getPeriodPositionIndices()
+        length = max(stop - start, 0)
+
+        #move start back by whole periods, to the first period
+        if start >= self._periodEnd:
+            start = self._periodStart + (start - self._periodStart) % self.getPeriod()
+
+        return self._repeatPeriod(trace, start + length)[start:]
+
+    #returns the number of steps after which the trace repeats
+    def getPeriod(self):
+
+        if self._periodRuns == None:
+            self._findPeriod()
+
+        return self._periodEnd - self._periodStart
+
+
+if __name__ == '__main__':
+
+    #test RotorTrace against the double-step test Enigma (see enigma.py)
+
+    from enigma import Enigma
+
+    enigma = Enigma.getDoubleStepEnigma()
+    trace = RotorTrace.fromEnigma(enigma)
+
+    print(list(trace.iterRuns(4)))
+    #expected output: [(2, 10, 3, 15), (1, 10, 4, 17), (1, 11, 5, 18)]
+
+    print(trace.getPeriod(), '(expected 16900)')
+
+    left, middle, right = trace.getRotorPositions(10 ** 6)
+    for step in range(10 ** 6):
+        enigma.incrementRotors()
+        if enigma.getRotorPositions() != (Rotor.alphabet[left[step]], Rotor.alphabet[middle[step]], Rotor.alphabet[right[step]]):
+            print('mismatch at step', step)
+            break
+    else:
+        print('1000000 steps match (expected)')
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+#a bounded table of the scores of keys already tried, for searches that keep coming back to the
+#same keys (such as hill-climbing over plugboards and ring settings, where every restart climbs
+#through many of the keys the earlier restarts did)
+#this is a transposition table, as used in game tree searches: keys are packed state records
+#(see packedstate), and each score is stored as a float
+#
+#the table is kept in shared memory, so every worker process of a search can use it: pass the
+#ScoreCache to the workers (as a Pool initializer argument or a Process argument), and each one
+#attaches to the same table
+#every lookup and store holds a lock shared by the processes, so scores are never read half written
+#
+#the table is set-associative: each key can only go in the ways slots of one set (picked by a
+#hash of the key), and when the set is full, one of its keys is evicted to make room
+#   LRU         the key in the set that was least recently looked up or stored is evicted
+#   CLOCK       the slots of each set are visited in turn from a hand, clearing the referenced bit
+#               of each key until one without it is found, which is evicted (keys get the
+#               referenced bit when they are looked up); this is cheaper to keep up than LRU, and
+#               almost as good
+#so the eviction policy only applies within each set, but a set is small enough to search on every
+#lookup, and the table never needs rebuilding
+#
+#the shared memory is laid out as follows (all integers unsigned and little-endian):
+#   HEADER          set count, ways, eviction policy, entry count, hits, misses, evictions, LRU clock
+#   for each set:
+#       1 byte      the position of the CLOCK hand within the set
+#       ways slots  SLOT: key record, score, stamp (0 for an empty slot; otherwise for LRU the
+#                   value of the LRU clock when the key was last used, and for CLOCK 2 if the
+#                   key is referenced and 1 if it is not)
+
+import struct
+import zlib
+from enum import Enum
+
+import packedstate
+
+HEADER = struct.Struct('<IIIQQQQQ')
+SLOT = struct.Struct(f'<{packedstate.RECORD_SIZE}sdQ')
+
+#offsets of the counters within the header
+_entriesOffset = 12
+_hitsOffset = 20
+_missesOffset = 28
+_evictionsOffset = 36
+_clockOffset = 44
+
+_counter = struct.Struct('<Q')
+
+#offset of the stamp within a slot
+_stampOffset = SLOT.size - _counter.size
+
+#CLOCK stamps
+_unreferenced = 1
+_referenced = 2
+
+
+class EvictionPolicy(Enum):
+    LRU = 0
+    CLOCK = 1
+
+
+#returns a key record as bytes
+#raises a ValueError if it is not the size of a packed state record
+def _validateKey(record):
+    record = bytes(record)
+    if len(record) != packedstate.RECORD_SIZE:
+        raise ValueError(f"Keys must be packed state records of {packedstate.RECORD_SIZE} bytes")
+    return record
+
+
+#returns a deterministic hash of a key record (the built-in hash of bytes changes between
+#processes, so it cannot be used to pick the set)
+def _getKeyHash(record):
+    return zlib.crc32(record)
+
+
+class ScoreCache():
+
+    #capacity is the most keys the table can hold (rounded up to a whole number of sets)
+    #ways is the number of slots in each set; larger sets evict better, but make each lookup slower
+    #policy is an EvictionPolicy
+    def __init__(self, capacity = 1 << 16, ways = 8, policy = EvictionPolicy.LRU):
+        from multiprocessing import Lock
+        from multiprocessing.shared_memory import SharedMemory
+
+        if capacity < 1 or not 1 <= ways <= 255:
+            raise ValueError("capacity must be at least 1, and ways from 1 to 255")
+        policy = EvictionPolicy(policy)
+
+        setCount = -(-capacity // ways)
+        size = HEADER.size + setCount * (1 + ways * SLOT.size)
+
+        #new shared memory is filled with zeros, so every slot starts empty
+        self._memory = SharedMemory(create = True, size = size)
+        self._lock = Lock()
+        self._owner = True
+        HEADER.pack_into(self._memory.buf, 0, setCount, ways, policy.value, 0, 0, 0, 0, 0)
+        self._setLayout()
+
+    #attach to the table of another ScoreCache (in another process)
+    #this is how a ScoreCache is unpickled, see __reduce__
+    @staticmethod
+    def _attach(name, lock):
+        from multiprocessing.shared_memory import SharedMemory
+
+        cache = ScoreCache.__new__(ScoreCache)
+        cache._memory = SharedMemory(name = name)
+        cache._lock = lock
+        cache._owner = False
+        cache._setLayout()
+        return cache
+
+    #a ScoreCache is passed to other processes by name, and attaches to the same shared memory
+    #(like the lock, this only works when the processes are started)
+    def __reduce__(self):
+        return (ScoreCache._attach, (self._memory.name, self._lock))
+
+    #read the layout of the table from the header
+    def _setLayout(self):
+        self.setCount, self.ways, policy = struct.unpack_from('<III', self._memory.buf, 0)
+        self.policy = EvictionPolicy(policy)
+        self.capacity = self.setCount * self.ways
+        self._setSize = 1 + self.ways * SLOT.size
+
+    #returns the offset of the first slot of the set for a key record
+    #(the CLOCK hand is the byte before it)
+    def _getSetOffset(self, record):
+        return HEADER.size + (_getKeyHash(record) % self.setCount) * self._setSize + 1
+
+    #returns the offset of the slot holding a key record in the set at setOffset, or None
+    def _findSlot(self, buffer, setOffset, record):
+
+        for way in range(self.ways):
+            slotOffset = setOffset + way * SLOT.size
+            key, _, stamp = SLOT.unpack_from(buffer, slotOffset)
+            if stamp and key == record:
+                return slotOffset
+        return None
+
+    #add one to a counter in the header, returning its new value
+    def _increment(self, buffer, offset):
+        value, = _counter.unpack_from(buffer, offset)
+        _counter.pack_into(buffer, offset, value + 1)
+        return value + 1
+
+    #returns the stamp for a key that is being used now
+    def _getUseStamp(self, buffer):
+        if self.policy == EvictionPolicy.LRU:
+            return self._increment(buffer, _clockOffset)
+        return _referenced
+
+    #returns the score stored for a key record (bytes), or None if there is none
+    #raises a ValueError if the key is the wrong size (rather than counting it as a miss)
+    def get(self, record):
+
+        record = _validateKey(record)
+        buffer = self._memory.buf
+        setOffset = self._getSetOffset(record)
+
+        with self._lock:
+            slotOffset = self._findSlot(buffer, setOffset, record)
+            if slotOffset == None:
+                self._increment(buffer, _missesOffset)
+                return None
+
+            self._increment(buffer, _hitsOffset)
+            _, score, _ = SLOT.unpack_from(buffer, slotOffset)
+            SLOT.pack_into(buffer, slotOffset, record, score, self._getUseStamp(buffer))
+            return score
+
+    #store the score for a key record (bytes), evicting another key from its set if it is full
+    #(see the top of this file)
+    def put(self, record, score):
+
+        record = _validateKey(record)
+        buffer = self._memory.buf
+        setOffset = self._getSetOffset(record)
+
+        with self._lock:
+            slotOffset = self._findSlot(buffer, setOffset, record)
+            if slotOffset == None:
+                slotOffset = self._getFreeSlot(buffer, setOffset)
+            SLOT.pack_into(buffer, slotOffset, record, score, self._getUseStamp(buffer))
+
+    #returns the offset of a slot in the set at setOffset to store a new key in
+    #(an empty slot if there is one, otherwise the slot of the key to evict)
+    def _getFreeSlot(self, buffer, setOffset):
+
+        stamps = [SLOT.unpack_from(buffer, setOffset + way * SLOT.size)[2] for way in range(self.ways)]
+
+        if 0 in stamps:
+            self._increment(buffer, _entriesOffset)
+            return setOffset + stamps.index(0) * SLOT.size
+
+        self._increment(buffer, _evictionsOffset)
+
+        if self.policy == EvictionPolicy.LRU:
+            return setOffset + stamps.index(min(stamps)) * SLOT.size
+
+        #CLOCK: clear referenced bits from the hand until an unreferenced key is found
+        #(this takes at most one full turn, after which every bit is clear)
+        way = buffer[setOffset - 1]
+        while stamps[way] == _referenced:
+            stamps[way] = _unreferenced
+            _counter.pack_into(buffer, setOffset + way * SLOT.size + _stampOffset, _unreferenced)
+            way = (way + 1) % self.ways
+
+        buffer[setOffset - 1] = (way + 1) % self.ways
+        return setOffset + way * SLOT.size
+
+    #returns the score for a key record, calling scoreFunction(record) to work it out (and storing
+    #the result) if it is not in the table
+    #the lock is not held while scoreFunction runs, so two processes may both score the same key
+    def getScore(self, record, scoreFunction):
+
+        record = _validateKey(record)
+        score = self.get(record)
+        if score == None:
+            score = scoreFunction(record)
+            self.put(record, score)
+        return score
+
+    #remove every key from the table, and reset the statistics
+    def clear(self):
+        with self._lock:
+            buffer = self._memory.buf
+            buffer[_entriesOffset:] = bytes(len(buffer) - _entriesOffset)
+
+    #returns the table's statistics as a dictionary:
+    #capacity and entries (keys), hits, misses, hitRate (hits per lookup, 0 before any lookup),
+    #evictions, and memoryUsage (bytes of shared memory)
+    #the statistics cover every process using the table
+    def getStatistics(self):
+
+        with self._lock:
+            _, _, _, entries, hits, misses, evictions, _ = HEADER.unpack_from(self._memory.buf, 0)
+
+        lookups = hits + misses
+        return {
+            'capacity': self.capacity,
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hitRate': hits / lookups if lookups else 0,
+            'evictions': evictions,
+            'memoryUsage': self._memory.size
+            }
+
+    #returns a one line report of the statistics (see getStatistics)
+    def getReport(self):
+        stats = self.getStatistics()
+        return (f"{stats['entries']} of {stats['capacity']} keys, {stats['hitRate']:.1%} hit rate "
+            f"({stats['hits']} hits, {stats['misses']} misses), {stats['evictions']} evictions, "
+            f"{stats['memoryUsage'] / 1024:.0f} KiB")
+
+    #detach from the shared memory; the process that created the table also frees it,
+    #so it should close the table last
+    def close(self):
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+        return False
+
+
+#the table and ciphertext used by each worker process in the demo below
+_workerCache = None
+_workerCiphertext = None
+
+def _initWorker(cache, ciphertext):
+    global _workerCache, _workerCiphertext
+    _workerCache = cache
+    _workerCiphertext = ciphertext
+
+#score a key by how many letters of its decrypt are an 'e' (a stand-in for a real fitness function)
+def _scoreKey(record):
+    from enigma import Enigma
+    return Enigma.fromBytes(record).encodeMessage(_workerCiphertext).count('e')
+
+def _getScoreInWorker(record):
+    return _workerCache.getScore(record, _scoreKey)
+
+
+if __name__ == '__main__':
+
+    #score the neighbours of a key (every way to add one plug) in this process, then again in a
+    #pool of worker processes, which should find them all in the table
+
+    from itertools import combinations
+    from multiprocessing import Pool
+    from enigma import Enigma
+    from rotor import Rotor
+
+    key = Enigma.getDefaultEnigma()
+    key.setRingSettings(('b', 'u', 'l'))
+    ciphertext = key.encodeMessage('keinebesonderenvorkommnisse' * 4)
+    key.setRotorPositions(('a', 'a', 'a'))
+
+    neighbours = []
+    for first, second in combinations(range(26), 2):
+        neighbour = key.clone()
+        neighbour.plugboard.addPlug(Rotor.alphabet[first], Rotor.alphabet[second])
+        neighbours.append(neighbour.toBytes())
+
+    with ScoreCache(capacity = 1024, policy = EvictionPolicy.CLOCK) as cache:
+
+        _initWorker(cache, ciphertext)
+        scores = [_getScoreInWorker(record) for record in neighbours]
+
+        with Pool(2, initializer = _initWorker, initargs = (cache, ciphertext)) as pool:
+            print(pool.map(_getScoreInWorker, neighbours) == scores, '(expected True)')
+
+        print(cache.getReport())
+        #expected output: 325 of 1024 keys, 50.0% hit rate (325 hits, 325 misses), 0 evictions, 52 KiB
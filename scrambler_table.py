@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+#a precomputed, table-driven version of an Enigma's letter switching and stepping
+#
+#for a fixed configuration (reflector, rotor order, ring settings and plugboard),
+#the permutation the machine applies to a letter only depends on the 3 rotor positions
+#there are only 26^3 = 17,576 of those, so the full permutation for every position
+#(plugboard, rotors, reflector and back) is computed once and stored in a table
+#the stepping from each position to the next is precomputed as well
+#encoding a letter is then one lookup to step and one lookup to switch the letter
+#
+#positions are stored as a single index: left * 676 + middle * 26 + right,
+#where each of left, middle and right is the letter seen in the window (0 - 25)
+
+from array import array
+
+from rotor import Rotor
+from enigma import Enigma
+
+#number of possible rotor positions
+POSITION_COUNT = 26 ** 3
+
+#bytes.translate tables between lowercase letters and letter indices (0 - 25)
+_lettersToIndices = bytes.maketrans(b'abcdefghijklmnopqrstuvwxyz', bytes(range(26)))
+_indicesToLetters = bytes.maketrans(bytes(range(26)), b'abcdefghijklmnopqrstuvwxyz')
+_letterBytes = b'abcdefghijklmnopqrstuvwxyz'
+
+#every byte that is not a letter in either case (see messageToIndices)
+_nonLetterBytes = bytes(byte for byte in range(256) if byte not in _letterBytes + _letterBytes.upper())
+
+
+#returns a message (a str, or bytes of ascii text) as a bytes object of letter indices (0 - 25)
+#the message is normalized the same way Enigma.encodeMessage does it:
+#spaces are removed and letters are converted to lowercase
+#raises a ValueError if the message contains anything else, unless dropNonLetters is True,
+#in which case everything other than letters (punctuation, digits, non-ascii characters) is removed
+def messageToIndices(message, dropNonLetters = False):
+
+    if dropNonLetters:
+        if isinstance(message, str):
+            message = message.encode('ascii', 'ignore')
+        return message.translate(None, _nonLetterBytes).lower().translate(_lettersToIndices)
+
+    if isinstance(message, str):
+        #encode raises UnicodeEncodeError (a ValueError) for non-ascii characters
+        data = message.replace(' ', '').lower().encode('ascii')
+    else:
+        data = message.replace(b' ', b'').lower()
+
+    if len(data.translate(None, _letterBytes)):
+        raise ValueError('Message must only contain letters and spaces')
+
+    return data.translate(_lettersToIndices)
+
+
+#the inverse of messageToIndices (without the normalization)
+def indicesToMessage(indices):
+    return bytes(indices).translate(_indicesToLetters).decode('ascii')
+
+
+#returns the position index for a 3-tuple of rotor positions (left, middle, right)
+#positions may be letters or integers, as with Enigma.setRotorPositions
+def getPositionIndex(rotorPositions):
+
+    if (not isinstance(rotorPositions, tuple)) or len(rotorPositions) != 3:
+        raise ValueError('Rotor positions must be a 3-tuple of the form (left, middle, right)')
+
+    left, middle, right = (Rotor.validateRotorPosition(position) for position in rotorPositions)
+    return left * 676 + middle * 26 + right
+
+
+#returns the rotor positions for a position index as a 3-tuple of letters (left, middle, right)
+#(the same format as Enigma.getRotorPositions)
+def getRotorPositions(positionIndex):
+    left, rest = divmod(positionIndex, 676)
+    middle, right = divmod(rest, 26)
+    return (Rotor.alphabet[left], Rotor.alphabet[middle], Rotor.alphabet[right])
+
+
+#returns the 26 shifted versions of a rotor wiring, one for each internal rotor offset
+#(the offset is the window position minus the ring setting)
+#shifted[offset][letter] is the result of Rotor.switchLetter at that offset, as an index
+def _getShiftedWirings(wiring):
+    return tuple(
+        tuple((wiring[(letter + offset) % 26] - offset) % 26 for letter in range(26))
+        for offset in range(26)
+    )
+
+
+#returns the position index that follows each position index, as an array
+#this uses the same stepping rules as Enigma.incrementRotors (including the double step)
+#notchPositions is a 3-tuple of window letter indices (left, middle, right)
+def getNextPositions(notchPositions):
+
+    _, middleNotch, rightNotch = notchPositions
+    nextPositions = array('H', bytes(2 * POSITION_COUNT))
+
+    for position in range(POSITION_COUNT):
+        left, rest = divmod(position, 676)
+        middle, right = divmod(rest, 26)
+
+        middleRotates = right == rightNotch
+        right = (right + 1) % 26
+
+        if middle == middleNotch:
+            left = (left + 1) % 26
+            middle = (middle + 1) % 26
+        elif middleRotates:
+            middle = (middle + 1) % 26
+
+        nextPositions[position] = left * 676 + middle * 26 + right
+
+    return nextPositions
+
+
+class ScramblerTable():
+
+    #build the tables for the configuration of an Enigma
+    #(its reflector, rotors, ring settings and plugboard; the rotor positions are not used)
+    #the Enigma is not referenced after this, so changing it does not affect the table
+    def __init__(self, enigma):
+
+        enigma.validateEnigmaSetup()
+
+        #keep the configuration as a packed record, with the rotor positions set to AAA
+        #this is used to check which configuration the table was built for
+        record = bytearray(enigma.toBytes())
+        record[7:10] = bytes(3)
+        self.configRecord = bytes(record)
+
+        rotors = enigma.getRotors()
+
+        #the window letter at which each rotor turns the next one
+        self.notchPositions = tuple(rotor.notchPosition for rotor in rotors)
+        self.ringSettings = tuple(rotor.ringSetting for rotor in rotors)
+
+        self.nextPositions = getNextPositions(self.notchPositions)
+        self.permutations = self._buildPermutations(enigma)
+
+    #compute the full permutation for every position
+    #returns a bytes object where byte (position * 26 + letter) is the encoded letter
+    def _buildPermutations(self, enigma):
+
+        leftRotor, middleRotor, rightRotor = enigma.getRotors()
+        leftRing, middleRing, rightRing = self.ringSettings
+
+        leftForward = _getShiftedWirings(leftRotor._wiring)
+        leftReverse = _getShiftedWirings(leftRotor._reverseWiring)
+        middleForward = _getShiftedWirings(middleRotor._wiring)
+        middleReverse = _getShiftedWirings(middleRotor._reverseWiring)
+        rightForward = _getShiftedWirings(rightRotor._wiring)
+        rightReverse = _getShiftedWirings(rightRotor._reverseWiring)
+        reflector = enigma.reflector._wiring
+        plugboard = enigma.plugboard.getWiring()
+
+        permutations = []
+        letters = range(26)
+
+        for left in range(26):
+            leftF = leftForward[(left - leftRing) % 26]
+            leftR = leftReverse[(left - leftRing) % 26]
+
+            for middle in range(26):
+                middleF = middleForward[(middle - middleRing) % 26]
+                middleR = middleReverse[(middle - middleRing) % 26]
+
+                #the path through the middle and left rotors, the reflector and back
+                #is the same for every right rotor position, so it is only computed once
+                inner = [middleR[leftR[reflector[leftF[middleF[letter]]]]] for letter in letters]
+
+                for right in range(26):
+                    rightF = rightForward[(right - rightRing) % 26]
+                    rightR = rightReverse[(right - rightRing) % 26]
+
+                    permutations.append(bytes(
+                        plugboard[rightR[inner[rightF[plugboard[letter]]]]] for letter in letters))
+
+        return b''.join(permutations)
+
+    #returns the permutation applied at a position index, as 26 bytes
+    def getPermutation(self, positionIndex):
+        return self.permutations[positionIndex * 26:positionIndex * 26 + 26]
+
+    #encode a bytes-like object of letter indices, starting from a position index
+    #as with Enigma.encodeLetter, the rotors step before each letter is encoded
+    #returns a tuple (encoded letter indices as bytes, position index after the last letter)
+    def encodeIndices(self, indices, positionIndex):
+
+        permutations = self.permutations
+        nextPositions = self.nextPositions
+        encoded = bytearray(len(indices))
+
+        for offset, letter in enumerate(indices):
+            positionIndex = nextPositions[positionIndex]
+            encoded[offset] = permutations[positionIndex * 26 + letter]
+
+        return (bytes(encoded), positionIndex)
+
+    #encode a message, starting from the specified rotor positions
+    #(a 3-tuple as accepted by Enigma.setRotorPositions, or a position index)
+    #the message is normalized the same way as Enigma.encodeMessage
+    #gives the same result as setting an Enigma with this configuration to rotorPositions
+    #and calling encodeMessage
+    def encodeMessage(self, message, rotorPositions = ('a', 'a', 'a')):
+
+        if isinstance(rotorPositions, int):
+            positionIndex = rotorPositions
+        else:
+            positionIndex = getPositionIndex(rotorPositions)
+
+        encoded, _ = self.encodeIndices(messageToIndices(message), positionIndex)
+        return indicesToMessage(encoded)
+
+
+if __name__ == '__main__':
+
+    #test ScramblerTable against the double-step test Enigma (see enigma.py)
+
+    enigma = Enigma.getDoubleStepEnigma()
+    enigma.plugboard.addPlug('h', 'z')
+    enigma.setRingSettings(('a', 'a', 'z'))
+
+    table = ScramblerTable(enigma)
+
+    encMsg = table.encodeMessage('hello world', enigma.getRotorPositions())
+    print(encMsg, '(expected dqhheprgzu)')
+    print(table.encodeMessage(encMsg, enigma.getRotorPositions()), '(expected helloworld)')
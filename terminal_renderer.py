@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+import sys
+from time import perf_counter
+
+#ANSI escape sequences used by the renderer
+#these are understood by practically every modern terminal (including over SSH),
+#so no 'clear' subprocess is needed to redraw the screen
+CLEAR_SCREEN = '\x1b[2J\x1b[H'
+CLEAR_LINE = '\x1b[2K'
+HIDE_CURSOR = '\x1b[?25l'
+SHOW_CURSOR = '\x1b[?25h'
+
+
+#returns the escape sequence that moves the cursor to the specified row and column
+#rows and columns start at 1 (the top left corner of the screen)
+def moveCursor(row, col):
+    return f'\x1b[{row};{col}H'
+
+
+#a class that draws an InteractiveEnigma to a terminal
+#the whole frame is drawn once, and after that only the regions that
+#changed since the last draw are redrawn (rotor positions, the end of the message and the lamp)
+#it also keeps track of the time between a keypress and the end of the resulting redraw
+class TerminalRenderer():
+
+    #row numbers of each region of the frame
+    #(see getFrameLines for the full layout)
+    _rotorRow = 3
+    _messageRow = 6
+    _connectingRow = 7
+    _encodedRow = 8
+    _lampRow = 11
+    _statusRow = 12
+    _latencyRow = 13
+
+    #the message starts in the third column (after the border char and a space)
+    _messageCol = 3
+
+    def __init__(self, enigma, stream = None, boxWidth = 25, boxChar = '#'):
+
+        #the InteractiveEnigma being drawn
+        self.enigma = enigma
+
+        #the stream to draw to (defaults to stdout)
+        self.stream = stream if stream != None else sys.stdout
+
+        self.boxWidth = boxWidth
+        self.boxChar = boxChar
+
+        #what is currently on the screen
+        #these are compared against the enigma to determine what needs to be redrawn
+        self._drawnRotorPositions = None
+        self._drawnMessageLength = 0
+        self._drawnLamp = None
+        self._drawnStatus = ''
+
+        #index of the first message letter shown in the box
+        #only a window of the message is shown, so long sessions do not slow down rendering
+        self.windowStart = 0
+
+        #keypress-to-render latencies, in seconds
+        self.lastLatency = None
+        self.totalLatency = 0.0
+        self.maxLatency = 0.0
+        self.renderCount = 0
+
+    #returns the number of message characters that fit inside the box
+    def getMessageCapacity(self):
+        return self.boxWidth - 4
+
+    #returns the column of the first rotor position letter's 3-char cell
+    def _getRotorCol(self):
+        #the rotor display is centered in the box, the same way getBoxStr centers it
+        rotorPosStrOffset = (int(self.boxWidth/2)) - 5
+        return rotorPosStrOffset + 2
+
+    #moves the message window so that the end of the message is visible
+    #the window jumps by half a box width at a time, so most keypresses
+    #can still be drawn incrementally
+    #returns True if the window moved
+    def _scrollWindow(self):
+
+        messageLength = self.enigma.getMessageLength()
+        capacity = self.getMessageCapacity()
+
+        #scroll forward if the message has run past the end of the box,
+        #or back if backspace has emptied the visible part of the message
+        scrollForward = messageLength > self.windowStart + capacity
+        scrollBack = self.windowStart > 0 and messageLength <= self.windowStart
+
+        if scrollForward or scrollBack:
+            self.windowStart = max(0, messageLength - capacity // 2)
+            return True
+        else:
+            return False
+
+    #returns the visible part of the message rows as a tuple
+    #(message, connectingLines, encodedMessage)
+    def _getWindowRows(self):
+        end = self.windowStart + self.getMessageCapacity()
+        message, encodedMessage = self.enigma.getMessageWindow(self.windowStart, end)
+        return (message, '|' * len(message), encodedMessage)
+
+    #returns the lines of the complete frame as a list of strings
+    #the layout is similar to InteractiveEnigma.getBoxStr, except the message is
+    #left-aligned so that typing a letter only changes the end of each message row
+    def getFrameLines(self):
+
+        boxChar = self.boxChar
+        innerWidth = self.boxWidth - 2
+
+        rotorPosStr = self.enigma.getPrettyRotorPositions((int(self.boxWidth/2)) - 5, boxChar)
+
+        horizontalBorder = boxChar * self.boxWidth
+        verticalBorder = f'{boxChar}{boxChar:>{innerWidth + 1}}'
+
+        lines = [horizontalBorder]
+        lines.extend(rotorPosStr.split('\n'))
+        lines.append(verticalBorder)
+        for row in self._getWindowRows():
+            lines.append(f'{boxChar} {row:<{innerWidth - 1}}{boxChar}')
+        lines.append(verticalBorder)
+        lines.append(horizontalBorder)
+        lines.append(self._getLampStr())
+        return lines
+
+    #returns the lamp line, which lights up the most recently encoded letter
+    def _getLampStr(self):
+        lamp = self.enigma.getLastEncodedLetter()
+        lamp = lamp.upper() if lamp != None else ' '
+        return f'LAMP: [{lamp}]'
+
+    #clears the screen and draws the whole frame
+    def drawFull(self):
+
+        self._scrollWindow()
+
+        output = [HIDE_CURSOR, CLEAR_SCREEN, '\n'.join(self.getFrameLines())]
+        output.append(moveCursor(self._statusRow, 1) + self._drawnStatus)
+
+        self._drawnRotorPositions = self.enigma.getRotorPositions()
+        self._drawnMessageLength = self.enigma.getMessageLength()
+        self._drawnLamp = self._getLampStr()
+
+        self.stream.write(''.join(output))
+        self.stream.flush()
+
+    #redraws only the regions of the frame that have changed since the last draw
+    #status is an optional line of text (i.e. an error message) to show below the frame
+    #if keypressTime (from time.perf_counter) is given, the latency is recorded and displayed
+    def update(self, status = '', keypressTime = None):
+
+        output = []
+
+        #redraw the rotor positions if they have changed
+        rotorPositions = self.enigma.getRotorPositions()
+        if rotorPositions != self._drawnRotorPositions:
+            leftPos, midPos, rightPos = (pos.upper() for pos in rotorPositions)
+            output.append(moveCursor(self._rotorRow, self._getRotorCol()))
+            output.append(f'{leftPos:^3}{midPos:^3}{rightPos:^3}')
+            self._drawnRotorPositions = rotorPositions
+
+        messageLength = self.enigma.getMessageLength()
+        rows = (self._messageRow, self._connectingRow, self._encodedRow)
+
+        if self._scrollWindow():
+            #if the window moved, every visible letter changed, so redraw the whole rows
+            capacity = self.getMessageCapacity()
+            for row, text in zip(rows, self._getWindowRows()):
+                output.append(moveCursor(row, self._messageCol) + f'{text:<{capacity}}')
+            self._drawnMessageLength = messageLength
+
+        elif messageLength != self._drawnMessageLength:
+            #otherwise, only letters that were added (or removed, by backspace)
+            #since the last draw are written
+            start = min(messageLength, self._drawnMessageLength)
+            end = max(messageLength, self._drawnMessageLength)
+            col = self._messageCol + start - self.windowStart
+            padding = ' ' * (end - messageLength)
+
+            message, encodedMessage = self.enigma.getMessageWindow(start, messageLength)
+            texts = (message, '|' * len(message), encodedMessage)
+            for row, text in zip(rows, texts):
+                output.append(moveCursor(row, col) + text + padding)
+            self._drawnMessageLength = messageLength
+
+        #redraw the lamp if it has changed
+        lamp = self._getLampStr()
+        if lamp != self._drawnLamp:
+            output.append(moveCursor(self._lampRow, 1) + lamp)
+            self._drawnLamp = lamp
+
+        #redraw the status line if it has changed
+        if status != self._drawnStatus:
+            output.append(moveCursor(self._statusRow, 1) + CLEAR_LINE + status)
+            self._drawnStatus = status
+
+        if len(output):
+            self.stream.write(''.join(output))
+            self.stream.flush()
+
+        if keypressTime != None:
+            self.recordLatency(perf_counter() - keypressTime)
+
+    #record a keypress-to-render latency (in seconds) and display it below the frame
+    def recordLatency(self, latency):
+
+        self.lastLatency = latency
+        self.totalLatency += latency
+        self.renderCount += 1
+        if latency > self.maxLatency:
+            self.maxLatency = latency
+
+        self.stream.write(moveCursor(self._latencyRow, 1) + CLEAR_LINE
+            + f'render latency: {latency * 1000:.3f} ms')
+        self.stream.flush()
+
+    #returns a summary of the recorded latencies as a string
+    def getLatencyReport(self):
+        if self.renderCount == 0:
+            return 'No keypresses rendered'
+        averageLatency = self.totalLatency / self.renderCount
+        return (f'Rendered {self.renderCount} updates: '
+            f'average latency {averageLatency * 1000:.3f} ms, '
+            f'max latency {self.maxLatency * 1000:.3f} ms')
+
+    #move the cursor below the frame and show it again
+    #this should always be called before anything else is printed
+    def close(self):
+        self.stream.write(moveCursor(self._latencyRow + 1, 1) + SHOW_CURSOR)
+        self.stream.flush()
+
+
+if __name__ == '__main__':
+
+    #test TerminalRenderer by drawing a machine and typing a message into it
+
+    from interactive_enigma import InteractiveEnigma
+
+    enigma = InteractiveEnigma.getDefaultEnigma()
+    renderer = TerminalRenderer(enigma)
+    renderer.drawFull()
+
+    for letter in 'helloworld':
+        keypressTime = perf_counter()
+        enigma.encodeLetter(letter)
+        renderer.update(keypressTime = keypressTime)
+
+    renderer.close()
+    print(renderer.getLatencyReport())
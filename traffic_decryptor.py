@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+#bulk decryption of traffic that uses the message key indicator procedure
+#
+#each day, every operator sets up their machine with the same daily key
+#(rotor order, ring settings, plugboard and a ground setting for the rotor positions)
+#for each message, the operator picks a 3-letter message key, encrypts it at the ground setting
+#to get the indicator (before 1940 the key was typed twice, giving a 6-letter indicator),
+#then sets the rotors to the message key and encrypts the message itself
+#
+#under a single daily key, the indicator for each message key never changes, so the
+#message key for every one of the 17,576 possible indicators is computed once (IndicatorTable)
+#every message is then decrypted through a ScramblerTable built once for the daily key
+
+from array import array
+
+from scrambler_table import (ScramblerTable, POSITION_COUNT, getPositionIndex,
+    getRotorPositions, messageToIndices, indicesToMessage)
+
+
+#maps every possible indicator to its message key under a single daily key
+class IndicatorTable():
+
+    #scramblerTable is the ScramblerTable for the daily key
+    #groundSetting is the position index of the ground setting (see scrambler_table.getPositionIndex)
+    #if doubled is True, indicators are 6 letters (the message key, typed twice)
+    def __init__(self, scramblerTable, groundSetting, doubled = True):
+
+        self.doubled = doubled
+
+        permutations = scramblerTable.permutations
+        nextPositions = scramblerTable.nextPositions
+
+        #the positions at which each indicator letter is encrypted
+        positions = []
+        positionIndex = groundSetting
+        for _ in range(6 if doubled else 3):
+            positionIndex = nextPositions[positionIndex]
+            positions.append(positionIndex * 26)
+
+        #messageKeys[indicator] is the position index of the message key for
+        #the first 3 letters of an indicator (as a position index as well)
+        self.messageKeys = array('H', bytes(2 * POSITION_COUNT))
+
+        #for doubled indicators, repeatedIndicators[messageKey] holds the last 3 letters
+        #of the indicator (as a position index) that the message key should have produced
+        #this is used to detect garbled indicators
+        self.repeatedIndicators = array('H', bytes(2 * POSITION_COUNT)) if doubled else None
+
+        #the encryption of each indicator letter is its own inverse (as with any Enigma
+        #letter), so decrypting the indicator letters uses the same permutations
+        first, second, third = (permutations[position:position + 26] for position in positions[:3])
+        for indicator in range(POSITION_COUNT):
+            a, rest = divmod(indicator, 676)
+            b, c = divmod(rest, 26)
+            self.messageKeys[indicator] = first[a] * 676 + second[b] * 26 + third[c]
+
+        if doubled:
+            fourth, fifth, sixth = (permutations[position:position + 26] for position in positions[3:])
+            for messageKey in range(POSITION_COUNT):
+                a, rest = divmod(messageKey, 676)
+                b, c = divmod(rest, 26)
+                self.repeatedIndicators[messageKey] = fourth[a] * 676 + fifth[b] * 26 + sixth[c]
+
+    #returns the message key for an indicator as a tuple (messageKey, isConsistent)
+    #messageKey is a position index
+    #isConsistent is False if the indicator is doubled and its two halves do not agree
+    #(i.e. it was garbled in transmission); the key from the first half is still returned
+    #raises a ValueError if the indicator is the wrong length or contains non-letters
+    def lookup(self, indicator):
+
+        indices = messageToIndices(indicator)
+        if len(indices) != (6 if self.doubled else 3):
+            raise ValueError(f"Indicator must be {6 if self.doubled else 3} letters long")
+
+        messageKey = self.messageKeys[indices[0] * 676 + indices[1] * 26 + indices[2]]
+
+        isConsistent = True
+        if self.doubled:
+            repeatedIndicator = indices[3] * 676 + indices[4] * 26 + indices[5]
+            isConsistent = self.repeatedIndicators[messageKey] == repeatedIndicator
+
+        return (messageKey, isConsistent)
+
+
+#decrypts (and encrypts) messages sent under a single daily key
+class TrafficDecryptor():
+
+    #dailyKey is an Enigma set up with the daily key, with its rotors set to the ground setting
+    #if doubled is True, indicators are 6 letters (the message key, typed twice)
+    def __init__(self, dailyKey, doubled = True):
+
+        self.scramblerTable = ScramblerTable(dailyKey)
+        self.groundSetting = getPositionIndex(dailyKey.getRotorPositions())
+        self.indicatorTable = IndicatorTable(self.scramblerTable, self.groundSetting, doubled)
+
+    #decrypt a single message
+    #returns a tuple (messageKey, plaintext, isConsistent)
+    #messageKey is a 3-tuple of letters (as returned by Enigma.getRotorPositions)
+    #isConsistent is False if the indicator was garbled (see IndicatorTable.lookup)
+    def decryptMessage(self, indicator, ciphertext):
+
+        messageKey, isConsistent = self.indicatorTable.lookup(indicator)
+        plaintext, _ = self.scramblerTable.encodeIndices(messageToIndices(ciphertext), messageKey)
+
+        return (getRotorPositions(messageKey), indicesToMessage(plaintext), isConsistent)
+
+    #encrypt a single message with the specified message key
+    #(a 3-tuple, as accepted by Enigma.setRotorPositions)
+    #returns a tuple (indicator, ciphertext), which decryptMessage will accept
+    def encryptMessage(self, messageKey, plaintext):
+
+        messageKey = getPositionIndex(messageKey)
+        keyLetters = ''.join(getRotorPositions(messageKey))
+        if self.indicatorTable.doubled:
+            keyLetters *= 2
+
+        indicator = self.scramblerTable.encodeMessage(keyLetters, self.groundSetting)
+        ciphertext = self.scramblerTable.encodeMessage(plaintext, messageKey)
+        return (indicator, ciphertext)
+
+    #decrypt many messages
+    #messages is an iterable of (indicator, ciphertext) pairs
+    #returns a list of results in the same order, in the format returned by decryptMessage
+    #if processes is not 1, messages are decrypted in parallel by a pool of worker processes
+    #(processes defaults to the number of CPUs); the tables are sent to each worker only once
+    def decryptTraffic(self, messages, processes = None, chunkSize = 256):
+
+        if processes == 1:
+            return [self.decryptMessage(indicator, ciphertext) for indicator, ciphertext in messages]
+
+        from multiprocessing import Pool
+
+        with Pool(processes, initializer = _initWorker, initargs = (self,)) as pool:
+            return pool.starmap(_decryptInWorker, messages, chunkSize)
+
+
+#the TrafficDecryptor used by each worker process in decryptTraffic
+_workerDecryptor = None
+
+def _initWorker(decryptor):
+    global _workerDecryptor
+    _workerDecryptor = decryptor
+
+def _decryptInWorker(indicator, ciphertext):
+    return _workerDecryptor.decryptMessage(indicator, ciphertext)
+
+
+if __name__ == '__main__':
+
+    #test TrafficDecryptor
+
+    from enigma import Enigma
+
+    #set up a daily key, with the rotors at the ground setting
+    dailyKey = Enigma.getDefaultEnigma()
+    dailyKey.setRingSettings(('b', 'u', 'l'))
+    dailyKey.plugboard.addPlug('a', 'q')
+    dailyKey.plugboard.addPlug('e', 'p')
+    dailyKey.setRotorPositions(('w', 'z', 'a'))
+
+    decryptor = TrafficDecryptor(dailyKey)
+
+    indicator, ciphertext = decryptor.encryptMessage(('s', 'x', 't'), 'attack at dawn')
+    print(indicator, ciphertext)
+
+    print(decryptor.decryptTraffic([(indicator, ciphertext)] * 3, processes = 2))
+    #expected output: (('s', 'x', 't'), 'attackatdawn', True) three times
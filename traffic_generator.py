@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+#generation of large amounts of realistic synthetic traffic (and the key sheets to read it),
+#for load testing and for testing attacks
+#
+#each day gets a random daily key (rotor order, ring settings, 10 plugboard pairs and a ground
+#setting); each message gets a random message key, sent as an indicator encrypted at the ground
+#setting (see traffic_decryptor.py), and plaintext drawn from a corpus or a word list
+#
+#everything is generated from a seed: the same seed always gives the same traffic, no matter how
+#many processes generate it, as every day has its own random number generator seeded from the
+#seed and the day number
+#days are generated in parallel by a pool of processes and written out in order
+#
+#output formats:
+#   'jsonl'     traffic: one JSON object per message, with the keys "day", "indicator" and
+#               "ciphertext" (plus "messageKey" and "plaintext", if includePlaintext is True)
+#               key sheet: one JSON object per day, with the keys "day", "record" (the hex
+#               packed state record of the daily key, see packedstate) and the readable
+#               "reflector", "rotors", "rings", "plugs" and "ground"
+#   'binary'    traffic: for each message, the header TRAFFIC_HEADER (day, indicator and
+#               ciphertext length) followed by the ciphertext, all as little-endian / ascii
+#               key sheet: the packed state records of the daily keys, one per day, in order
+#               (see packedstate.splitRecords)
+
+import json
+import random
+import struct
+
+from enigma import Enigma
+from rotor import Rotor, RotorType
+from machine_config import MachineConfig, MachineState, encodeMessage
+
+#the header of each message in binary traffic: day, indicator, ciphertext length
+#(3-letter indicators are padded to 6 bytes with NULs, which iterBinaryTraffic strips)
+TRAFFIC_HEADER = struct.Struct('<I6sH')
+
+#messages can be at most this long, so that their length fits in TRAFFIC_HEADER
+MAX_MESSAGE_LENGTH = 0xffff
+
+#the number of plugboard pairs in a daily key
+PLUG_COUNT = 10
+
+#plaintext words, used when no corpus is given
+_defaultWords = ('an', 'von', 'oberkommando', 'der', 'wehrmacht', 'feind', 'gesichtet',
+    'bei', 'planquadrat', 'stop', 'meldung', 'angriff', 'morgen', 'frueh', 'uhr',
+    'wetter', 'klar', 'wind', 'nordwest', 'staerke', 'drei', 'vier', 'fuenf', 'keine',
+    'besonderen', 'vorkommnisse', 'division', 'regiment', 'bataillon', 'stellung',
+    'gehalten', 'verstaerkung', 'erbeten', 'munition', 'treibstoff', 'nachschub',
+    'eingetroffen', 'hafen', 'konvoi', 'kurs', 'sued', 'ost', 'null', 'eins', 'zwei')
+
+
+#returns a random daily key as an Enigma, with its rotors at the ground setting
+#rng is a random.Random
+def generateDailyKey(rng, reflectorTypes = (0,), plugCount = PLUG_COUNT):
+
+    dailyKey = Enigma()
+    dailyKey.setReflector(rng.choice(reflectorTypes))
+
+    leftRotor, middleRotor, rightRotor = rng.sample(range(len(RotorType)), 3)
+    dailyKey.setLeftRotor(leftRotor)
+    dailyKey.setMiddleRotor(middleRotor)
+    dailyKey.setRightRotor(rightRotor)
+
+    dailyKey.setRingSettings(tuple(rng.choice(Rotor.alphabet) for _ in range(3)))
+
+    letters = rng.sample(Rotor.alphabet, 2 * plugCount)
+    for plug in range(plugCount):
+        dailyKey.plugboard.addPlug(letters[2 * plug], letters[2 * plug + 1])
+
+    dailyKey.setRotorPositions(tuple(rng.choice(Rotor.alphabet) for _ in range(3)))
+    return dailyKey
+
+
+class TrafficGenerator():
+
+    #seed is any value accepted by random.seed (other than None)
+    #corpus is a string of plaintext to draw messages from (normalized as in Enigma.encodeMessage
+    #after removing everything but letters); if it is None, messages are random word sequences
+    #message lengths (in letters) are picked uniformly between minLength and maxLength
+    #if doubled is True, indicators are 6 letters (the message key, typed twice)
+    def __init__(self, seed, messagesPerDay = 100, minLength = 50, maxLength = 250,
+            corpus = None, doubled = True, reflectorTypes = (0,)):
+
+        if seed == None:
+            raise ValueError("A seed is required, so that traffic can be generated again")
+        if not 0 < minLength <= maxLength:
+            raise ValueError("Message lengths must satisfy 0 < minLength <= maxLength")
+        if maxLength > MAX_MESSAGE_LENGTH:
+            raise ValueError(f"Messages can be at most {MAX_MESSAGE_LENGTH} letters long")
+
+        self.seed = seed
+        self.messagesPerDay = messagesPerDay
+        self.minLength = minLength
+        self.maxLength = maxLength
+        self.doubled = doubled
+        self.reflectorTypes = tuple(reflectorTypes)
+
+        self.corpus = None
+        if corpus != None:
+            self.corpus = ''.join(letter for letter in corpus.lower() if letter in Rotor._letterIndices)
+            if len(self.corpus) < maxLength:
+                raise ValueError("The corpus must contain at least maxLength letters")
+
+    #returns the random number generator for a day
+    def _getDayRng(self, day):
+        return random.Random(f'{self.seed}/{day}')
+
+    #returns a random plaintext of a given length
+    def _generatePlaintext(self, rng, length):
+
+        if self.corpus != None:
+            start = rng.randrange(len(self.corpus) - length + 1)
+            return self.corpus[start:start + length]
+
+        #every word has at least 2 letters, so this many words is always enough
+        return ''.join(rng.choices(_defaultWords, k = length // 2 + 1))[:length]
+
+    #generate a day of traffic
+    #returns a tuple (dailyKey, messages), where dailyKey is the packed state record of the daily key
+    #(with the rotors at the ground setting) and messages is a list of
+    #(messageKey, indicator, plaintext, ciphertext) tuples, where messageKey is 3 letters
+    def generateDay(self, day):
+
+        rng = self._getDayRng(day)
+        dailyKey = generateDailyKey(rng, self.reflectorTypes).toBytes()
+
+        config = MachineConfig.fromBytes(dailyKey)
+        groundSetting = MachineState.fromBytes(dailyKey)
+
+        messages = []
+        for _ in range(self.messagesPerDay):
+
+            messageKey = ''.join(rng.choice(Rotor.alphabet) for _ in range(3))
+            plaintext = self._generatePlaintext(rng, rng.randint(self.minLength, self.maxLength))
+
+            indicator = encodeMessage(config, groundSetting.copy(), messageKey * 2 if self.doubled else messageKey)
+            ciphertext = encodeMessage(config, MachineState.fromRotorPositions(tuple(messageKey)), plaintext)
+            messages.append((messageKey, indicator, plaintext, ciphertext))
+
+        return (dailyKey, messages)
+
+    #generate a day of traffic, already serialized in an output format
+    #returns a tuple (key sheet entry, traffic) of bytes objects
+    def serializeDay(self, day, format = 'jsonl', includePlaintext = False):
+
+        dailyKey, messages = self.generateDay(day)
+
+        if format == 'binary':
+            traffic = b''.join(
+                TRAFFIC_HEADER.pack(day, indicator.encode('ascii'), len(ciphertext)) + ciphertext.encode('ascii')
+                for _, indicator, _, ciphertext in messages)
+            return (dailyKey, traffic)
+
+        elif format == 'jsonl':
+            lines = []
+            for messageKey, indicator, plaintext, ciphertext in messages:
+                message = {'day': day, 'indicator': indicator, 'ciphertext': ciphertext}
+                if includePlaintext:
+                    message['messageKey'] = messageKey
+                    message['plaintext'] = plaintext
+                lines.append(json.dumps(message, separators = (',', ':')))
+
+            enigma = Enigma.fromBytes(dailyKey)
+            keySheetEntry = {
+                'day': day,
+                'record': dailyKey.hex(),
+                'reflector': enigma.reflector.reflectorType,
+                'rotors': [rotor.rotorTypeIndex for rotor in enigma.getRotors()],
+                'rings': ''.join(Rotor.alphabet[rotor.ringSetting] for rotor in enigma.getRotors()),
+                'plugs': ' '.join(key + val for key, val in sorted(enigma.plugboard.getPlugs().items())),
+                'ground': ''.join(enigma.getRotorPositions())
+            }
+            return ((json.dumps(keySheetEntry, separators = (',', ':')) + '\n').encode('ascii'),
+                ''.join(line + '\n' for line in lines).encode('ascii'))
+
+        else:
+            raise ValueError(f"Unknown output format: {repr(format)}")
+
+    #generate days of traffic and write them to binary file objects, in order of day
+    #days is an iterable of day numbers (e.g. range(365))
+    #keySheetFile may be None if the key sheet is not needed
+    #days are generated by a pool of processes (processes defaults to the number of CPUs)
+    #returns the number of messages written
+    def writeTraffic(self, trafficFile, keySheetFile, days, format = 'jsonl',
+            includePlaintext = False, processes = None):
+
+        from functools import partial
+
+        serializeDay = partial(_serializeDayInWorker, format = format, includePlaintext = includePlaintext)
+
+        if processes == 1:
+            _initWorker(self)
+            results = map(serializeDay, days)
+            return self._writeResults(results, trafficFile, keySheetFile)
+
+        from multiprocessing import Pool
+        with Pool(processes, initializer = _initWorker, initargs = (self,)) as pool:
+            return self._writeResults(pool.imap(serializeDay, days), trafficFile, keySheetFile)
+
+    def _writeResults(self, results, trafficFile, keySheetFile):
+
+        dayCount = 0
+        for keySheetEntry, traffic in results:
+            if keySheetFile != None:
+                keySheetFile.write(keySheetEntry)
+            trafficFile.write(traffic)
+            dayCount += 1
+        return dayCount * self.messagesPerDay
+
+
+#the TrafficGenerator used by each worker process in writeTraffic
+_workerGenerator = None
+
+def _initWorker(generator):
+    global _workerGenerator
+    _workerGenerator = generator
+
+def _serializeDayInWorker(day, format, includePlaintext):
+    return _workerGenerator.serializeDay(day, format, includePlaintext)
+
+
+#read binary traffic (as written by writeTraffic) back
+#yields (day, indicator, ciphertext) tuples
+def iterBinaryTraffic(data):
+
+    offset = 0
+    while offset < len(data):
+        day, indicator, length = TRAFFIC_HEADER.unpack_from(data, offset)
+        offset += TRAFFIC_HEADER.size
+        yield (day, indicator.rstrip(b'\0').decode('ascii'), bytes(data[offset:offset + length]).decode('ascii'))
+        offset += length
+
+
+if __name__ == '__main__':
+
+    #generate some traffic and read it back with TrafficDecryptor
+
+    import io
+    import packedstate
+    from traffic_decryptor import TrafficDecryptor
+
+    generator = TrafficGenerator(seed = 1940, messagesPerDay = 3)
+
+    trafficFile = io.BytesIO()
+    keySheetFile = io.BytesIO()
+    print(generator.writeTraffic(trafficFile, keySheetFile, range(2), format = 'binary', processes = 2),
+        'messages written (expected 6)')
+
+    dailyKeys = [Enigma.fromBytes(record) for record in packedstate.splitRecords(keySheetFile.getvalue())]
+    decryptors = [TrafficDecryptor(dailyKey) for dailyKey in dailyKeys]
+
+    for day, indicator, ciphertext in iterBinaryTraffic(trafficFile.getvalue()):
+        messageKey, plaintext, isConsistent = decryptors[day].decryptMessage(indicator, ciphertext)
+        print(day, indicator, plaintext[:30], isConsistent)
+    #expected output: German-looking plaintexts, all consistent
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+#an emulation of Henryk Zygalski's perforated sheets, for traffic with doubled indicators
+#where each message's indicator setting is sent in the clear (the 1938 - 1940 procedure)
+#
+#the operator sets the rotors to a setting of their choice (sent in the clear), then types the
+#message key twice; if the 1st and 4th letters of the resulting indicator are the same, that is
+#called a "female" (likewise for the 2nd and 5th, and 3rd and 6th)
+#a female at the 1st and 4th letters can only happen if the machine's permutations at the 1st and
+#4th positions agree on some letter, which only depends on the rotor order and the rotor core positions
+#(not on the plugboard), so which core positions can produce a female can be computed ahead of time
+#
+#for each rotor order and left rotor core position, the females are stored in a 26 x 26 bitmap (a sheet)
+#over the middle and right core positions; every female intercept then rules out every ring setting
+#that would not put it on a female position, and the ring settings that survive every intercept are
+#found by stacking the (shifted) sheets with a bitwise AND
+#
+#like the paper sheets, this assumes the middle and left rotors do not turn while the indicator
+#is typed, so intercepts where the right rotor passes its notch may rule out the correct key
+
+from enigma import Enigma
+from scrambler_table import ScramblerTable, messageToIndices
+
+#sheets are stored as integers in which bit (row * SHEET_STRIDE + column) is a cell
+#the 26 x 26 pattern is repeated twice in each direction (like the 51 x 51 paper sheets),
+#so a sheet shifted by any amount can be cut out with a single shift and mask
+SHEET_STRIDE = 52
+
+#the cells of a single (unrepeated) 26 x 26 sheet
+SHEET_MASK = sum(((1 << 26) - 1) << (row * SHEET_STRIDE) for row in range(26))
+
+
+#returns a 26 x 26 bitmap (see SHEET_STRIDE) repeated to 52 x 52
+#cells is a function that returns True if the cell at (row, column) is set
+def _buildRepeatedSheet(cells):
+
+    sheet = 0
+    for row in range(SHEET_STRIDE):
+        for column in range(SHEET_STRIDE):
+            if cells(row % 26, column % 26):
+                sheet |= 1 << (row * SHEET_STRIDE + column)
+    return sheet
+
+
+#returns the female intercepts of a list of intercepts
+#intercepts is an iterable of (indicatorSetting, indicator) pairs, where indicatorSetting is
+#the setting sent in the clear (3 letters) and indicator is the encrypted doubled key (6 letters)
+#returns a list of (indicatorSetting, pair) tuples, where indicatorSetting is a 3-tuple of
+#letter indices and pair is 0, 1 or 2 for a female at letters 1 and 4, 2 and 5 or 3 and 6
+def getFemales(intercepts):
+
+    females = []
+    for indicatorSetting, indicator in intercepts:
+
+        setting = messageToIndices(indicatorSetting)
+        indices = messageToIndices(indicator)
+        if len(setting) != 3 or len(indices) != 6:
+            raise ValueError("Indicator settings must be 3 letters and indicators must be 6 letters")
+
+        for pair in range(3):
+            if indices[pair] == indices[pair + 3]:
+                females.append((tuple(setting), pair))
+    return females
+
+
+#the sheets for a single reflector type and rotor order
+class ZygalskiSheets():
+
+    #rotorOrder is a 3-tuple of rotor types (left, middle, right)
+    def __init__(self, reflectorType, rotorOrder):
+
+        self.reflectorType = reflectorType
+        self.rotorOrder = tuple(rotorOrder)
+
+        enigma = Enigma()
+        enigma.setReflector(reflectorType)
+        enigma.setLeftRotor(rotorOrder[0])
+        enigma.setMiddleRotor(rotorOrder[1])
+        enigma.setRightRotor(rotorOrder[2])
+        permutations = ScramblerTable(enigma).permutations
+
+        #canFemale[position] is True if the permutations at a position and 3 right rotor
+        #steps later agree on some letter (so a female is possible between them)
+        #with ring settings of A-01, positions here are rotor core positions
+        canFemale = bytearray(26 ** 3)
+        for position in range(26 ** 3):
+            laterPosition = position - position % 26 + (position + 3) % 26
+            first = permutations[position * 26:position * 26 + 26]
+            later = permutations[laterPosition * 26:laterPosition * 26 + 26]
+            canFemale[position] = any(map(int.__eq__, first, later))
+
+        #sheets[pair][left] is the sheet for females at letters (pair + 1, pair + 4)
+        #with the left rotor core at left
+        #the sheet is stored upside down and backwards (cell (m, r) is core position (-m, -r)),
+        #so that an intercept at indicator setting (M, R) selects ring settings (rM, rR) from the
+        #cell (rM - M, rR - R), and can be cut out of the repeated sheet with a shift
+        self.sheets = tuple(
+            tuple(
+                _buildRepeatedSheet(lambda row, column, left = left, pair = pair:
+                    canFemale[left * 676 + (-row % 26) * 26 + (-column + 1 + pair) % 26])
+                for left in range(26))
+            for pair in range(3))
+
+    #returns the ring settings that are consistent with every female
+    #(see getFemales), as a list of 3-tuples of letter indices (left, middle, right)
+    #an empty list means every ring setting has been ruled out
+    #raises a ValueError if there are no females, as then nothing has been ruled out
+    def findRingSettings(self, females):
+
+        if len(females) == 0:
+            raise ValueError("At least one female is needed to find ring settings")
+
+        ringSettings = []
+        for leftRing in range(26):
+
+            #stack every sheet for this left ring setting
+            stack = SHEET_MASK
+            for (left, middle, right), pair in females:
+                sheet = self.sheets[pair][(left - leftRing) % 26]
+                #cut out the sheet shifted so that cell (rM, rR) lines up with ring settings (rM, rR)
+                shift = ((-middle) % 26) * SHEET_STRIDE + (-right) % 26
+                stack &= sheet >> shift
+                if stack & SHEET_MASK == 0:
+                    break
+
+            stack &= SHEET_MASK
+            while stack:
+                lowestBit = stack & -stack
+                bit = lowestBit.bit_length() - 1
+                middleRing, rightRing = divmod(bit, SHEET_STRIDE)
+                ringSettings.append((leftRing, middleRing, rightRing))
+                stack ^= lowestBit
+
+        return ringSettings
+
+
+#used by findKeys to search one rotor order in a worker process
+def _findRingSettingsInWorker(arguments):
+    reflectorType, rotorOrder, females = arguments
+    return ZygalskiSheets(reflectorType, rotorOrder).findRingSettings(females)
+
+
+#search every rotor order for ring settings consistent with the intercepts
+#(see getFemales for the format of intercepts)
+#rotor orders are searched in parallel by a pool of processes (processes defaults to the number of CPUs)
+#returns a list of (reflectorType, rotorOrder, ringSettings) tuples, where ringSettings is a
+#3-tuple of letter indices (left, middle, right)
+#raises a ValueError if none of the intercepts has a female (see ZygalskiSheets.findRingSettings)
+def findKeys(intercepts, reflectorType = 0, rotorOrders = None, processes = None):
+
+    from itertools import permutations
+    from rotor import Rotor
+
+    if rotorOrders == None:
+        rotorOrders = tuple(permutations(range(len(Rotor._rotorWirings)), 3))
+
+    females = getFemales(intercepts)
+    if len(females) == 0:
+        raise ValueError("None of the intercepts has a female, so no ring settings can be ruled out")
+
+    jobs = [(reflectorType, tuple(rotorOrder), females) for rotorOrder in rotorOrders]
+
+    if processes == 1:
+        results = [_findRingSettingsInWorker(job) for job in jobs]
+    else:
+        from multiprocessing import Pool
+        with Pool(processes) as pool:
+            results = pool.map(_findRingSettingsInWorker, jobs)
+
+    return [(reflectorType, rotorOrder, ringSettings)
+        for (_, rotorOrder, _), ringSettingsList in zip(jobs, results)
+        for ringSettings in ringSettingsList]
+
+
+if __name__ == '__main__':
+
+    #test the sheets with a known key
+
+    import random
+    from rotor import Rotor
+
+    rng = random.Random(1938)
+    alphabet = Rotor.alphabet
+
+    key = Enigma()
+    key.setReflector(0)
+    key.setLeftRotor(2)
+    key.setMiddleRotor(0)
+    key.setRightRotor(1)
+    key.setRingSettings(('k', 'e', 'y'))
+    key.plugboard.addPlug('q', 'p')
+    key.plugboard.addPlug('z', 'l')
+
+    #only keep intercepts with females, and skip settings where the right rotor passes its notch
+    intercepts = []
+    while len(intercepts) < 12:
+        setting = tuple(rng.choice(alphabet) for _ in range(3))
+        key.setRotorPositions(setting)
+        middleBefore = key.getRotorPositions()[1]
+        indicator = key.encodeMessage(''.join(rng.choice(alphabet) for _ in range(3)) * 2)
+        if key.getRotorPositions()[1] != middleBefore:
+            continue
+        if getFemales([(''.join(setting), indicator)]):
+            intercepts.append((''.join(setting), indicator))
+
+    print(findKeys(intercepts, rotorOrders = [(2, 0, 1), (0, 1, 2)], processes = 1))
+    #expected output includes (0, (2, 0, 1), (10, 4, 24))